@@ -6,14 +6,20 @@ import re
 import os
 import sys
 import time
+import mmap
+import codecs
 import logging
-import marshal
 import tempfile
 import threading
 from math import log
+from itertools import islice
+from contextlib import contextmanager
 from hashlib import md5
 from ._compat import *
 from . import finalseg
+from .trie import DoubleArrayTrie
+from .automaton import AhoCorasick
+from ._lru import LRUCache
 
 """
 這個函數的功用是移動（或說重命名）檔案
@@ -45,6 +51,8 @@ default_logger.addHandler(log_console)
 DICT_WRITING = {}
 
 pool = None
+#pool中工作行程的數目
+pool_size = 0
 
 """
 這裡定義了數個正則表達式，它們會在分詞及載入字典時發揮作用
@@ -88,6 +96,36 @@ re_han_cut_all的作用是與一個或多個漢字配對。
 re_han_cut_all = re.compile("([\u4E00-\u9FD5]+)", re.U)
 re_skip_cut_all = re.compile("[^a-zA-Z0-9+#\n]", re.U)
 
+#cut_batch中區塊分詞結果最多保留的數量
+BATCH_MEMO_SIZE = 100000
+#cut_batch每次一起分詞的文檔數，同一組文檔中的未登錄詞緩衝區會一起交給finalseg.cut_batch
+BATCH_CHUNK_SIZE = 1000
+#cut使用HMM時，每累積這麼多個字，就把其中的未登錄詞緩衝區一起交給finalseg.cut_batch，再產生這些詞
+CUT_WINDOW_SIZE = 1 << 13
+
+"""
+re_stream_break及re_stream_break_cut_all分別用來在精確模式及全模式下尋找最後一個區塊邊界(StreamingSegmenter及cut_file)，
+它們都由文字的開頭貪婪地匹配到該邊界為止。
+精確模式下，不屬於re_han_default的字元會被單獨切開(只有\r\n例外)，所以在它們之後都可以切開，
+另外漢字區塊結束的地方也可以切開。
+全模式下，re_skip_cut_all會在非漢字區塊的內部切割，所以只能在漢字區塊的開頭或結尾切開。
+"""
+re_stream_break = re.compile(
+    "(?s).*(?:[^一-鿕a-zA-Z0-9+#&\._%\-\r]|[一-鿕a-zA-Z0-9+#&\._%\-](?=[^一-鿕a-zA-Z0-9+#&\._%\-]))", re.U)
+re_stream_break_cut_all = re.compile(
+    "(?s).*(?:[^一-鿕](?=[一-鿕])|[一-鿕](?=[^一-鿕]))", re.U)
+"""
+全模式下一直沒有漢字的文字(例如純英文的檔案)沒有任何區塊邊界，re_stream_skip_cut_all則在非漢字區塊中
+匹配到最後一個re_skip_cut_all的分隔字元為止(其後還需有一個非漢字的字元)。
+re_skip_cut_all.split會丟棄分隔字元，所以在它之後切開時，前一段只會在結尾多出一個空字串，
+去掉這個空字串後，結果就與不切開時相同。
+"""
+re_stream_skip_cut_all = re.compile("(?s).*[^一-鿕a-zA-Z0-9+#\n](?=[^一-鿕])", re.U)
+#cut_file每次由檔案中讀取的位元組數
+FILE_CHUNK_SIZE = 1 << 20
+#cut_file一直找不到區塊邊界時，最多累積的字數
+FILE_MAX_PENDING = 1 << 22
+
 def setLogLevel(log_level):
     global logger
     default_logger.setLevel(log_level)
@@ -98,7 +136,7 @@ class Tokenizer(object):
     但是__init__函數是比較輕量級的，在該函數中只簡單地定義了幾個屬性。
     分詞所必需的字典載入則延後至initialize函數中完成。
     """
-    def __init__(self, dictionary=DEFAULT_DICT):
+    def __init__(self, dictionary=DEFAULT_DICT, automaton=False):
         """
         當我們希望某一段代碼能完整地被執行而不被打斷時，我們可以使用threading.Lock來達成。
         
@@ -114,12 +152,31 @@ class Tokenizer(object):
             self.dictionary = dictionary
         else:
             self.dictionary = _get_abs_path(dictionary)
-        self.FREQ = {}
-        self.total = 0
+        #FREQ是一個DoubleArrayTrie物件，詳見trie.py
+        #它被當成不可變的快照：分詞時先取得當下的FREQ，之後都只使用它，所以不需要上鎖；
+        #修改字典時則是修改它的複本，完成後再一次換上去，見_update
+        self.FREQ = DoubleArrayTrie()
         self.user_word_tag_tab = {}
         self.initialized = False
         self.tmp_dir = None
         self.cache_file = None
+        #automaton為True時，使用Aho-Corasick自動機來建構DAG，詳見automaton.py
+        self.automaton = automaton
+        self._automaton = None
+        #分詞結果的LRU快取，預設不開啟，詳見enable_cache
+        self.cache = None
+        #當前字典內容的鍵，詳見_get_dict_key
+        self._dict_key = None
+        #batch中尚未發布的字典樹複本，詳見batch
+        self._batch = None
+
+    """
+    total是字典中所有詞的詞頻總和，它與FREQ存在同一個快照裡，
+    所以分詞時看到的FREQ及total總是一致的。
+    """
+    @property
+    def total(self):
+        return self.FREQ.total
 
     """
     這裡覆寫了object類別的__repr__函數。
@@ -129,11 +186,15 @@ class Tokenizer(object):
 
     """
     從一個己開啟的字典file object中，獲取每個詞的出現頻率以及所有詞的出現次數總和。
+    每個詞的出現頻率會被存入一棵雙數組字典樹中，出現次數總和則存在它的total屬性。
+    字典檔案第三欄的詞性也一併存入字典樹，詞性標注(jieba.posseg)時直接由字典樹查詢。
     """
     # gen_pfdict接受的參數是一個以二進制、讀取模式開啟的檔案。
     def gen_pfdict(self, f):
         #記錄每個詞的出現次數
         lfreq = {}
+        #記錄每個詞的詞性
+        ltag = {}
         #所有詞出現次數的總和
         ltotal = 0
         #他們會在函數的最後被回傳
@@ -148,20 +209,16 @@ class Tokenizer(object):
                 # 所以這裡用decode來將它由bytes型別轉成字串型別
                 line = line.strip().decode('utf-8')
                 #更新lfreq及ltotal
-                word, freq = line.split(' ')[:2]
+                parts = line.split(' ')
+                word, freq = parts[:2]
                 freq = int(freq)
                 lfreq[word] = freq
                 ltotal += freq
+                if len(parts) > 2:
+                    ltag[word] = parts[2]
 
-                #把word的前ch+1個字母當成一個出現次數為0的單詞，加入lfreq這個字典中
-                # 我們待會可以在get_DAG函數裡看到這樣做的用意
-
-                #這裡的xragne在Python3也會被認識，這是因為在_compat.py中定義了xrange
-                #，並將它指向Python3裡的range函數
-                for ch in xrange(len(word)):
-                    wfrag = word[:ch + 1]
-                    if wfrag not in lfreq:
-                        lfreq[wfrag] = 0
+                #原本這裡會把word的前ch+1個字母當成一個出現次數為0的單詞，加入lfreq這個字典中
+                #現在改用字典樹儲存，字典樹的每個節點本身就代表一個前綴，所以不必再另外記錄
             #在使用.decode('utf-8')的過程中有可能拋出UnicodeDecodeError錯誤。
             #而我們可以由inspect.getmro(UnicodeDecodeError)這個函數來得知:
             #ValueError是UnicodeDecodeError的parent class。
@@ -172,7 +229,9 @@ class Tokenizer(object):
         #記得參數f是一個己開啟的檔案
         #這裡將這個檔案給關閉
         f.close()
-        return lfreq, ltotal
+        trie = DoubleArrayTrie(lfreq, ltag)
+        trie.total = ltotal
+        return trie, ltotal
     
     """
     initialize函數的功能是載入字典，雖然與__init__函數一樣都是用於初始化。
@@ -180,7 +239,7 @@ class Tokenizer(object):
 
     initialize函數會調用前面介紹的get_dict_file，gen_pfdict，_get_abs_path，DICT_WRITING，default_logger等函數及變數。
 
-    在initialize函數的定義中，使用到了tempfile，marshal套件以及threading中的RLock類別。
+    在initialize函數的定義中，使用到了tempfile套件以及threading中的RLock類別。
     
     在initialize結束後，self.FREQ才會被賦予有意義的值，而self.FREQ在分詞的時候會被用到。
     """
@@ -232,32 +291,37 @@ class Tokenizer(object):
             #將cache_file更新為其絕對路徑
             cache_file = os.path.join(
                 self.tmp_dir or tempfile.gettempdir(), cache_file)
-            #快取檔案的目錄
-            # prevent absolute path in self.cache_file
-            tmpdir = os.path.dirname(cache_file)
 
+            #字典檔案內容的md5，它也是原始字典的鍵，見_get_dict_key
+            source = self._hash_dict_file()
             load_from_cache_fail = True
             """
             載入cache_file
             首先檢查cache_file是否存在，並且是一個檔案
             如果不是的話則略過這部份;
-            如果是的話則接著確認如果使用的是預設的字典DEFAULT_DICT
-            如果不是使用預設的字典，則要確認cache_file的修改時間晚於自訂義字典的修改時間
-            如果都符合條件，則從快取檔案中載入self.FREQ, self.total這兩個值,
-            並將load_from_cache_fail設為False
+            如果是的話則開啟它，並檢查它的標頭：
+            檔案格式的版本由DoubleArrayTrie.open檢查，不符時會拋出ValueError，
+            另外標頭中還記錄了生成它的字典檔案的md5(source)及jieba的版本(jieba)，
+            兩者都與當前的相同時，才從快取檔案中載入self.FREQ(包括total),
+            並將load_from_cache_fail設為False。
+            原本是以修改時間來判斷快取檔案是否過期，並且無條件信任預設字典的快取檔案，
+            但是在修改時間被統一設定的環境(如容器映像)中，這會造成每次都重新生成，或是載入過期的快取檔案；
+            改用內容的md5之後，相同的字典總是得到相同的快取檔案，所以也可以事先生成好再一起部署。
             """
-            if os.path.isfile(cache_file) and (abs_path == DEFAULT_DICT or
-                #os.path.getmtime: 獲取檔案的最後修改時間
-                os.path.getmtime(cache_file) > os.path.getmtime(abs_path)):
+            if os.path.isfile(cache_file):
                 default_logger.debug(
                     "Loading model from cache %s" % cache_file)
                 try:
-                    with open(cache_file, 'rb') as cf:
-                        """
-                        marshal.dump及marshal.load是用來儲存及載入Python物件的工具。
-                        """
-                        self.FREQ, self.total = marshal.load(cf)
-                    load_from_cache_fail = False
+                    """
+                    快取檔案是DoubleArrayTrie.save寫出的二進位檔案，
+                    DoubleArrayTrie.open以mmap的方式開啟它，不需要反序列化。
+                    """
+                    trie, meta = DoubleArrayTrie.open(cache_file)
+                    if meta.get('source') == source and meta.get('jieba') == __version__:
+                        self.FREQ = trie
+                        load_from_cache_fail = False
+                    else:
+                        default_logger.debug("Cache file %s is stale." % cache_file)
                 except Exception:
                     load_from_cache_fail = True
 
@@ -270,40 +334,18 @@ class Tokenizer(object):
                 DICT_WRITING[abs_path] = wlock
                 #在這個程式區塊中，又需要一個lock，用來鎖住寫檔的這一區塊
                 with wlock:
-                    self.FREQ, self.total = self.gen_pfdict(self.get_dict_file())
-                    default_logger.debug(
-                        "Dumping model to file cache %s" % cache_file)
-                    try:
-                        # prevent moving across different filesystems
-                        """
-                        tempfile.mkstemp的作用旨在使用最安全的方式創建一個暫存檔。
-                        它回傳的是一個file descriptor，以及該檔案的絕對路徑。
-                        """
-                        # tmpdir是剛剛決定好的快取檔案的路徑
-                        # prevent moving across different filesystems
-                        fd, fpath = tempfile.mkstemp(dir=tmpdir)
-                        """
-                        os.fdopen:
-                        利用傳入的file descriptor fd，回傳一個開啟的檔案物件。
-                        """
-                        # 使用marshal.dump將剛拿到的
-                        # (self.FREQ, self.total)倒入temp_cache_file
-                        with os.fdopen(fd, 'wb') as temp_cache_file:
-                            """
-                            marshal.dump及marshal.load是用來儲存及載入Python物件的工具。
-                            """
-                            marshal.dump(
-                                (self.FREQ, self.total), temp_cache_file)
-                        #把檔案重命名為cache_file
-                        _replace_file(fpath, cache_file)
-                    except Exception:
-                        default_logger.exception("Dump cache file failed.")
+                    self.FREQ = self.gen_pfdict(self.get_dict_file())[0]
+                    self._dump_cache(self.FREQ, cache_file, source=source, jieba=__version__)
 
                 try:
                     del DICT_WRITING[abs_path]
                 except KeyError:
                     pass
 
+            #換了字典，先前的分詞結果就不再有效
+            self.clear_cache()
+            #當前的字典就是原始的字典
+            self._dict_key = source
             #之後會利用self.initialized這個屬性
             # 來檢查self.FREQ, self.total是否己被設為有意義的值
             self.initialized = True
@@ -311,6 +353,57 @@ class Tokenizer(object):
                 "Loading model cost %.3f seconds." % (time.time() - t1))
             default_logger.debug("Prefix dict has been built successfully.")
 
+    """
+    _dump_cache把字典樹trie寫入快取檔案cache_file，meta會被一起寫進標頭。
+    先寫到同一個目錄下的暫存檔，寫完後再重命名，所以其它行程不會讀到寫到一半的快取檔案。
+    """
+    def _dump_cache(self, trie, cache_file, **meta):
+        default_logger.debug(
+            "Dumping model to file cache %s" % cache_file)
+        try:
+            """
+            tempfile.mkstemp的作用旨在使用最安全的方式創建一個暫存檔。
+            它回傳的是一個file descriptor，以及該檔案的絕對路徑。
+            """
+            # prevent moving across different filesystems
+            fd, fpath = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+            """
+            os.fdopen:
+            利用傳入的file descriptor fd，回傳一個開啟的檔案物件。
+            """
+            # 使用DoubleArrayTrie.save將trie(包括total)寫入temp_cache_file
+            with os.fdopen(fd, 'wb') as temp_cache_file:
+                trie.save(temp_cache_file, **meta)
+            #把檔案重命名為cache_file
+            _replace_file(fpath, cache_file)
+        except Exception:
+            default_logger.exception("Dump cache file failed.")
+
+    """
+    _get_dict_key回傳當前字典內容的鍵(一個md5十六進位字串)。
+    原始字典的鍵是字典檔案內容的md5，在initialize中計算；
+    之後每次經由_update修改字典，都會由修改前的鍵及修改的內容算出新的鍵，
+    所以兩個行程只要由相同的字典開始，做了相同的修改，就會得到相同的鍵。
+    load_userdict用它來找出合併後的快取檔案。
+    """
+    def _get_dict_key(self):
+        if self._dict_key is None:
+            self._dict_key = self._hash_dict_file()
+        return self._dict_key
+
+    """
+    _hash_dict_file回傳字典檔案內容的md5十六進位字串。
+    """
+    def _hash_dict_file(self):
+        f = self.get_dict_file()
+        try:
+            h = md5()
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                h.update(chunk)
+        finally:
+            f.close()
+        return h.hexdigest()
+
     """
     檢查self.FREQ及self.total是否己被設為有意義的值。
     如果還沒，則調用initialize函數從字典導入。
@@ -328,12 +421,35 @@ class Tokenizer(object):
     其中sentece是要分詞的句子，DAG是由get_DAG函數得到的有向無環圖。
     route在被傳入時是一個空的字典。
     在calc這個函數中會利用sentence及DAG來填充route，在函數結束後，route記錄的是句中每個詞的範圍，以及他們的機率對數。
+
+    calc需要DAG中每條邊(即每個詞)的機率對數log(f or 1) - log(total)，
+    它會在字典樹裡由每個詞首逐字往下走，由字典樹的logfreq表取得log(f or 1)，然後交給_calc來做動態規劃。
+    分詞時則是使用_get_DAG，它在建立DAG的同時就記下了每條邊的機率對數，所以可以直接呼叫_calc。
     """
     def calc(self, sentence, DAG, route):
+        trie = self.FREQ
+        logfreq = trie.logfreq
+        #trie.total在gen_pfdict中計算，代表的是字典中所有詞出現次數的總和
+        logtotal = log(trie.total)
+        LOGPROBS = {}
+        for idx, ends in iteritems(DAG):
+            #nodes[x - idx]就是sentence[idx:x + 1]所在的節點，這樣就不必為每個x切出一個新字串再去查字典
+            #如果走到一半就走不下去，表示sentence[idx:x + 1]不存在FREQ中，其詞頻對數為log(1) = 0
+            nodes = trie.prefix_nodes(sentence, idx, ends[-1] + 1)
+            LOGPROBS[idx] = [(logfreq[nodes[x - idx]] if x - idx < len(nodes) else 0.0) - logtotal
+                             for x in ends]
+        self._calc(sentence, DAG, LOGPROBS, route)
+
+    """
+    _calc函數與原本的calc相同，只是多了LOGPROBS這個參數。
+    LOGPROBS與DAG有著相同的鍵，LOGPROBS[idx][j]是DAG[idx][j]這條邊
+    （即sentence[idx:DAG[idx][j] + 1]）的機率對數log(f or 1) - log(total)。
+    log(f or 1)在字典載入時就己算好，並隨著add_word及del_word更新，
+    log(total)則在_get_DAG中與DAG來自同一個快照，所以這裡只需要做加法，也不會用到self.FREQ或self.total。
+    """
+    def _calc(self, sentence, DAG, LOGPROBS, route):
         N = len(sentence)
         route[N] = (0, 0)
-        #self.total在gen_pfdict中計算，代表的是字典中所有詞出現次數的總和
-        logtotal = log(self.total)
 
         """
         由後往前建構route
@@ -357,23 +473,24 @@ class Tokenizer(object):
             """
 		
             """
-            self.FREQ.get(sentence[idx:x + 1]) or 1：
-            表示如果sentence[idx:x + 1]這個字段不存在FREQ中，或者它的詞頻為0，則以1取代，這樣在經過log後的結果便是0。
+            lp：
+            lp是sentence[idx:x + 1]的機率對數log(f or 1) - log(total)，由LOGPROBS[idx]中與x對應的位置取得。
+            f or 1表示如果sentence[idx:x + 1]這個字段不存在FREQ中，或者它的詞頻為0，則以1取代，這樣在經過log後的結果便是0。
+            減去log(total)相當於把詞頻對數正規化，得到的是機率對數。
             """
 	
             """
-            log(self.FREQ.get(sentence[idx:x + 1]) or 1) - logtotal + route[x + 1][0]：
-            第一項是句中第idx個字到第x個字的詞頻對數。
-            將第一項與第二項相加，相當於把第一項正規化，得到的是機率對數。
-            第三項是句中第x+1個字到句尾最大切分組合的機率對數。
-            所以三項總和就是"如果新增x為切分點，這種組合的機率對數"。
+            lp + route[x + 1][0]：
+            第一項是句中第idx個字到第x個字的機率對數。
+            第二項是句中第x+1個字到句尾最大切分組合的機率對數。
+            所以兩項總和就是"如果新增x為切分點，這種組合的機率對數"。
             """
 		
             """
             max會找出sentence[idx:]的最大切分組合的機率對數以及對應的切分點。這也是route[idx]被賦予的值。
             """
-            route[idx] = max((log(self.FREQ.get(sentence[idx:x + 1]) or 1) -
-                              logtotal + route[x + 1][0], x) for x in DAG[idx])
+            route[idx] = max((lp + route[x + 1][0], x)
+                             for x, lp in zip(DAG[idx], LOGPROBS[idx]))
 
     """
     get_DAG這個函數的目的就是利用手上有的字典(self.FREQ)，將句子表示成一個有向無環圖(DAG)。
@@ -383,42 +500,93 @@ class Tokenizer(object):
     因此在__cut_DAG_NO_HMM中，會需要re_eng來對get_DAG的結果進行後處理。
     """
     def get_DAG(self, sentence):
+        return self._get_DAG(sentence)[0]
+
+    """
+    _get_DAG除了DAG之外，還會回傳LOGPROBS，它記錄了DAG中每條邊的機率對數，供_calc使用。
+    trie是分詞所使用的字典快照，沒有給定時使用當下的self.FREQ。
+    """
+    def _get_DAG(self, sentence, trie=None):
         #這段代碼裡會用到self.FREQ，所以需要確保對象己經初始化
         self.check_initialized()
+        #在gen_pfdict中為self.FREQ賦予了值(可以參考https://blog.csdn.net/keineahnung2345/article/details/86977785#gen_pfdict_133)
+        #self.FREQ是一棵雙數組字典樹，詳見trie.py
+        #這裡只讀取一次self.FREQ，之後就算有其它執行緒換上了新的字典，這次分詞也只會看到同一個快照
+        if trie is None:
+            trie = self.FREQ
+        if self.automaton and trie is self.FREQ:
+            return self._get_automaton(trie).dag(sentence)
         DAG = {}
+        LOGPROBS = {}
         N = len(sentence)
+        logtotal = log(trie.total)
+        #以下直接使用它的數組，由sentence[k]開始逐字往下走
+        base, check, freq, logfreq = trie.base, trie.check, trie.freq, trie.logfreq
+        #先找出每個字的轉移編號，字典裡沒有的字為None
+        units = [trie.alphabet.get(ch) for ch in sentence]
         #如果是使用Python3
         #這裡的xrange將指向range(這是在_compat.py裡做的)
         for k in xrange(N):
             #用來儲存詞尾的索引
             tmplist = []
+            #用來儲存各詞尾對應的機率對數
+            freqlist = []
             #當前cursor的位置，用來找出詞尾
             i = k
-            #當前的字段，表示句子的第k個字到第i個字
-            frag = sentence[k]
-            #在gen_pfdict中為self.FREQ賦予了值(可以參考https://blog.csdn.net/keineahnung2345/article/details/86977785#gen_pfdict_133)
-            #self.FREQ中包含的是存在字典裡的詞，他們的詞頻由字典給出，
-            #另外對於self.FREQ中的所有詞，它還把這些詞的前n個字都加入self.FREQ，並將它們的詞頻設為0
-            while i < N and frag in self.FREQ:
-                #因為只有當句子的片段frag在self.FREQ裡面時，才會繼續尋找
-                #為了避免還沒看到詞尾就跳出迴圈，
-                #所以在gen_pfdict裡才會將詞的前n個字都加入self.FREQ的原因
-            
-                #這裡檢查sentence裡的第k到第i個字(即frag)是否成詞（也就是檢查frag這個片段的詞頻是否大於0）
-                if self.FREQ[frag]:
-                    #如果frag成詞的話，就把i加入tmplist裡，表示句中的第k個字到第i個字可以成詞
-                    #實際上的字段frag是sentence[k:i+1]
+            #當前所在的字典樹節點，它代表的是句子的第k個字到第i-1個字，一開始是根節點0
+            s = 0
+            while i < N:
+                #如果字典裡沒有sentence[i]這個字，就不可能再往下走了
+                u = units[i]
+                if u is None:
+                    break
+                #不常用的字需要兩步轉移，先走第一步
+                if u > 0xffff:
+                    t = base[s] + (u >> 16)
+                    if check[t] != s:
+                        break
+                    s = t
+                    u &= 0xffff
+                t = base[s] + u
+                #check[t] != s表示字典裡沒有sentence[k:i+1]這個前綴
+                if check[t] != s:
+                    break
+                s = t
+                #這裡檢查sentence裡的第k到第i個字是否成詞（也就是檢查這個節點的詞頻是否大於0）
+                if freq[s]:
+                    #如果成詞的話，就把i加入tmplist裡，表示句中的第k個字到第i個字可以成詞
                     tmplist.append(i)
+                    freqlist.append(logfreq[s] - logtotal)
                 #繼續看下一個字
                 i += 1
-                frag = sentence[k:i + 1]
             #如果沒有字可與sentence[k]成詞
             if not tmplist:
-                #單字成詞
+                #單字成詞，它不在字典裡，所以詞頻對數為log(1) = 0
                 tmplist.append(k)
+                freqlist.append(-logtotal)
             #DAG記錄的是sentence裡的第k個字可以跟句字裡的哪些字組成詞
             DAG[k] = tmplist
-        return DAG
+            LOGPROBS[k] = freqlist
+        return DAG, LOGPROBS
+
+    """
+    _get_automaton回傳由字典快照trie(預設為當前的self.FREQ)建構的Aho-Corasick自動機。
+    自動機在第一次使用時才建構，字典改變後（add_word或重新載入字典）會在下次使用時重新建構。
+    """
+    def _get_automaton(self, trie=None):
+        self.check_initialized()
+        if trie is None:
+            trie = self.FREQ
+        automaton = self._automaton
+        if automaton is None or automaton.trie is not trie:
+            with self.lock:
+                automaton = self._automaton
+                if automaton is None or automaton.trie is not trie:
+                    automaton = AhoCorasick(trie)
+                    #只有在trie仍是當前的快照時才保存，以免舊的自動機蓋掉新的
+                    if trie is self.FREQ:
+                        self._automaton = automaton
+        return automaton
 
     """
     __cut_all函數會利用get_DAG函數建立的dag來找出句中所有可以成詞的部份。
@@ -427,9 +595,9 @@ class Tokenizer(object):
     要注意的是__cut_all函數並未對非漢字的字元做處理。
     因此在cut及tokenizer函數中才需要一個re_han來過濾出__cut_all能處理的詞。
     """
-    def __cut_all(self, sentence):
+    def __cut_all(self, sentence, trie):
         #dag表示句中的第幾個字到第幾個字可以成詞
-        dag = self.get_DAG(sentence)
+        dag = self._get_DAG(sentence, trie)[0]
         #前一個詞的詞尾，初始值為0-1=-1
         old_j = -1
 
@@ -459,11 +627,11 @@ class Tokenizer(object):
     利用calc函數算出route，因為英數字並不存在字典中，所以route裡的英數字會被切成一個一個的字元。
     在__cut_DAG_NO_HMM中，會由前往後掃描route裡的內容。使用re_eng來找出句中的英數字，如果碰到了，就把它們放到buf裡，碰到下個中文字時再輸出。
     """
-    def __cut_DAG_NO_HMM(self, sentence):
-        DAG = self.get_DAG(sentence)
+    def __cut_DAG_NO_HMM(self, sentence, trie):
+        DAG, LOGPROBS = self._get_DAG(sentence, trie)
         route = {}
         #注意因為字典裡沒有記錄英數字的詞頻，所以會把它們切成一個一個的字元
-        self.calc(sentence, DAG, route)
+        self._calc(sentence, DAG, LOGPROBS, route)
         x = 0
         N = len(sentence)
         #用來暫存英數字
@@ -496,11 +664,14 @@ class Tokenizer(object):
     """
     finalseg.cut函數不查找字典，而是只依靠HMM維特比算法來分詞。
     __cut_DAG函數則是在finalseg.cut外又包了一層，以查字典為主，維特比分詞為輔。
+    需要使用維特比算法的未登錄詞緩衝區並不會在這裡直接交給finalseg.cut，
+    而是以(buf,)這樣的tuple佔位，由_cut_many收集整篇文檔(或整批文檔)的緩衝區後，
+    再一起交給finalseg.cut_batch批次解碼。
     """
-    def __cut_DAG(self, sentence):
-        DAG = self.get_DAG(sentence)
+    def __cut_DAG(self, sentence, trie):
+        DAG, LOGPROBS = self._get_DAG(sentence, trie)
         route = {}
-        self.calc(sentence, DAG, route)
+        self._calc(sentence, DAG, LOGPROBS, route)
         x = 0
         buf = ''
         N = len(sentence)
@@ -521,11 +692,9 @@ class Tokenizer(object):
                     else:
                     #多字的buf
                         #如果buf不存在於FREQ這個字典中
-                        if not self.FREQ.get(buf):
-                            #那就使用維特比算法發現新詞
-                            recognized = finalseg.cut(buf)
-                            for t in recognized:
-                                yield t
+                        if not trie.get(buf):
+                            #那就使用維特比算法發現新詞，這裡先佔位
+                            yield (buf,)
                         else:
                         #buf存在於FREQ這個字典中
                             #buf裡的東西是沒有被DAG給當成一個詞彙的
@@ -540,10 +709,8 @@ class Tokenizer(object):
         if buf:
             if len(buf) == 1:
                 yield buf
-            elif not self.FREQ.get(buf):
-                recognized = finalseg.cut(buf)
-                for t in recognized:
-                    yield t
+            elif not trie.get(buf):
+                yield (buf,)
             else:
                 for elem in buf:
                     yield elem
@@ -564,7 +731,103 @@ class Tokenizer(object):
         '''
         # 在Python3中，是將sentence轉為str型別
         sentence = strdecode(sentence)
+        #有開啟快取時，先到快取裡找，找不到才真正分詞，並把結果存成tuple
+        for word in self._cached((sentence, cut_all, HMM), self._cut, sentence, cut_all, HMM):
+            yield word
+
+    """
+    _cached在沒有開啟快取時直接回傳func(*args)。
+    開啟快取時，以key在快取中查找，找不到就呼叫func，把結果轉成tuple後存入快取。
+    在呼叫func之前先記下快取的generation，
+    如果在分詞的過程中字典被修改（快取被清空），這次的結果就不會被存入。
+    """
+    def _cached(self, key, func, *args):
+        cache = self.cache
+        if cache is None:
+            return func(*args)
+        words = cache.get(key)
+        if words is None:
+            #載入字典時會清空快取，所以要在記下generation之前載入
+            self.check_initialized()
+            generation = cache.generation
+            words = tuple(func(*args))
+            cache.put(key, words, generation)
+        return words
 
+    """
+    _cut是cut真正分詞的部份。
+    memo是一個由區塊對應到其分詞結果的字典，由cut_batch傳入，
+    有傳入時，同一批文檔中重複出現的區塊只需分詞一次。
+    trie是分詞所使用的字典快照，沒有給定時在開始分詞時取得當下的self.FREQ，
+    整個句子都使用同一個快照，所以就算分詞途中有其它執行緒修改字典，結果也是一致的。
+    使用HMM時，未登錄詞緩衝區會以大約CUT_WINDOW_SIZE個字為一批一起解碼(見_cut_window)。
+    """
+    def _cut(self, sentence, cut_all=False, HMM=True, memo=None, trie=None):
+        self.check_initialized()
+        if trie is None:
+            trie = self.FREQ
+        if cut_all or not HMM:
+            return self._cut_items(sentence, cut_all, HMM, memo, trie)
+        return self._cut_window(sentence, memo, trie)
+
+    """
+    _cut_window是使用HMM時的_cut：每個緩衝區都是獨立解碼的，所以可以分批處理，
+    每累積CUT_WINDOW_SIZE個字，就把這一批的緩衝區一起解碼(見_expand_oov)並產生這些詞，
+    這樣cut對很長的輸入仍然是逐步產生結果的，記憶體中也只有一批的詞。
+    """
+    def _cut_window(self, sentence, memo, trie):
+        window = []
+        size = 0
+        for word in self._cut_items(sentence, False, True, memo, trie):
+            window.append(word)
+            size += len(word[0]) if isinstance(word, tuple) else len(word)
+            if size >= CUT_WINDOW_SIZE:
+                for w in self._expand_oov([window])[0]:
+                    yield w
+                window = []
+                size = 0
+        for w in self._expand_oov([window])[0]:
+            yield w
+
+    """
+    _cut_many對texts中的每個文檔分詞，回傳一個由各文檔分詞結果(list)組成的list。
+    它先以_cut_items分詞，收集所有文檔中以(buf,)佔位的未登錄詞緩衝區，
+    一次交給finalseg.cut_batch解碼(有NumPy時會以向量化的方式同時解碼)，再把結果填回原位。
+    """
+    def _cut_many(self, texts, cut_all=False, HMM=True, memo=None, trie=None):
+        results = [list(self._cut_items(text, cut_all, HMM, memo, trie)) for text in texts]
+        if cut_all or not HMM:
+            return results
+        return self._expand_oov(results)
+
+    """
+    _expand_oov把results(由_cut_items的結果組成的list)中所有以(buf,)佔位的緩衝區一次解碼，再把結果填回原位。
+    """
+    def _expand_oov(self, results):
+        oov = {}
+        for words in results:
+            for word in words:
+                if isinstance(word, tuple):
+                    oov[word[0]] = None
+        if not oov:
+            return results
+        bufs = list(oov)
+        oov.update(zip(bufs, finalseg.cut_batch(bufs)))
+        for i, words in enumerate(results):
+            expanded = []
+            for word in words:
+                if isinstance(word, tuple):
+                    expanded.extend(oov[word[0]])
+                else:
+                    expanded.append(word)
+            results[i] = expanded
+        return results
+
+    """
+    _cut_items是原本_cut的內容，依序產生每個詞，
+    但使用HMM時，未登錄詞緩衝區是以(buf,)佔位，見__cut_DAG。
+    """
+    def _cut_items(self, sentence, cut_all, HMM, memo, trie):
         if cut_all:
             #用於全模式，只包含漢字
             re_han = re_han_cut_all
@@ -600,7 +863,13 @@ class Tokenizer(object):
                 continue
             if re_han.match(blk):
             # 能跟re_han match就代表可被cut_block所處理
-                for word in cut_block(blk):
+                if memo is None:
+                    words = cut_block(blk, trie)
+                else:
+                    words = memo.get(blk)
+                    if words is None:
+                        words = memo[blk] = list(cut_block(blk, trie))
+                for word in words:
                     yield word
             else:
                 # 無法被cut_block處理的
@@ -627,22 +896,38 @@ class Tokenizer(object):
         """
         Finer segmentation for search engines.
         """
+        sentence = strdecode(sentence)
+        #搜索引擎模式的結果以(sentence, 'search', HMM)為鍵存入快取
+        for word in self._cached((sentence, 'search', HMM), self._cut_for_search, sentence, HMM):
+            yield word
+
+    def _cut_for_search(self, sentence, HMM=True, memo=None, trie=None):
+        self.check_initialized()
+        #切詞及查找二字詞、三字詞都使用同一個字典快照
+        if trie is None:
+            trie = self.FREQ
         # cut函數中cut_all參數默認為False，所以使用的是精確模式
-        words = self.cut(sentence, HMM=HMM)
+        return self._search_words(self._cut(sentence, HMM=HMM, memo=memo, trie=trie), trie)
+
+    """
+    _search_words在精確模式的分詞結果words中，對每個長詞額外輸出它所包含的二字詞及三字詞。
+    """
+    def _search_words(self, words, trie):
         for w in words:
             if len(w) > 2:
+                #由w[i]開始在字典樹裡往下走三步，
+                #走兩步及三步時的詞頻就分別是二字詞及三字詞的詞頻
+                grams = [trie.prefix_freqs(w, i, i + 3) for i in xrange(len(w) - 1)]
                 #尋找詞彙w中是否包含二字詞
                 for i in xrange(len(w) - 1):
-                    gram2 = w[i:i + 2]
-                    if self.FREQ.get(gram2):
+                    if len(grams[i]) > 1 and grams[i][1]:
                         #如果有包含二字詞則輸出
-                        yield gram2
-            if len(w) > 3:
-                #尋找詞彙w中是否包含三字詞
-                for i in xrange(len(w) - 2):
-                    gram3 = w[i:i + 3]
-                    if self.FREQ.get(gram3):
-                        yield gram3
+                        yield w[i:i + 2]
+                if len(w) > 3:
+                    #尋找詞彙w中是否包含三字詞
+                    for i in xrange(len(w) - 2):
+                        if len(grams[i]) > 2 and grams[i][2]:
+                            yield w[i:i + 3]
             #除了詞彙w中所包含的二字詞及三字詞，也輸出w本身
             yield w
 
@@ -657,6 +942,147 @@ class Tokenizer(object):
     def lcut_for_search(self, *args, **kwargs):
         return list(self.cut_for_search(*args, **kwargs))
 
+    """
+    批次分詞
+    對大量的短文檔逐一呼叫lcut時，每次都要付出建立generator，strdecode等成本。
+    cut_batch在一次呼叫中處理一整批文檔：
+    完全相同的文檔只分詞一次，不同文檔間相同的區塊(re_han切出的片段)也只分詞一次。
+    這些中間結果只在同一次呼叫內有效，為了控制記憶體，數量超過BATCH_MEMO_SIZE時會被清空。
+    文檔是以BATCH_CHUNK_SIZE個為一組分詞的，同一組中所有的未登錄詞緩衝區會一起交給HMM解碼。
+    """
+    def cut_batch(self, texts, cut_all=False, HMM=True, search=False):
+        """
+        Segment an iterable of texts, yielding a list of words per text.
+
+        Parameter:
+            - texts: An iterable of str(unicode) to be segmented.
+            - cut_all, HMM: The same as in `cut`.
+            - search: Use the search engine mode as `cut_for_search`.
+        """
+        self.check_initialized()
+        #memo中的結果只對同一個字典快照有效，所以整批文檔都使用同一個快照
+        trie = self.FREQ
+        memo = {}
+        documents = {}
+        texts = iter(texts)
+        while True:
+            #每次取出BATCH_CHUNK_SIZE個文檔一起分詞，讓它們的未登錄詞緩衝區能一起解碼
+            chunk = [strdecode(text) for text in islice(texts, BATCH_CHUNK_SIZE)]
+            if not chunk:
+                break
+            if len(memo) + len(documents) > BATCH_MEMO_SIZE:
+                memo.clear()
+                documents.clear()
+            todo = []
+            for text in chunk:
+                if text not in documents:
+                    #先佔位，讓同一組中重複的文檔只分詞一次
+                    documents[text] = None
+                    todo.append(text)
+            for text, words in zip(todo, self._cut_many(todo, cut_all, HMM, memo, trie)):
+                if search:
+                    words = list(self._search_words(words, trie))
+                documents[text] = words
+            for text in chunk:
+                #每個文檔都回傳一個新的list，避免使用者修改到共用的結果
+                yield list(documents[text])
+
+    def lcut_batch(self, *args, **kwargs):
+        return list(self.cut_batch(*args, **kwargs))
+
+    """
+    檔案分詞
+    cut_file以mmap開啟檔案，每次只取出FILE_CHUNK_SIZE個位元組，用增量解碼器解碼後接在pending後面。
+    pending中最後一個區塊邊界(與StreamingSegmenter相同，依模式使用re_stream_break或re_stream_break_cut_all)
+    之前的部份可以安全地交給_cut，剩下的部份則留到下一輪，所以不論檔案多大，記憶體中只會有大約一個chunk的文字。
+    如果一直找不到區塊邊界，pending超過max_pending個字時就直接切開，全模式下會先嘗試re_stream_skip_cut_all。
+    只有一個極長的區塊(例如沒有標點的漢字)被直接切開時，結果才可能與一次分詞整個檔案不同。
+    """
+    def cut_file(self, path, cut_all=False, HMM=True, search=False,
+                 encoding=None, chunk_size=FILE_CHUNK_SIZE, max_pending=FILE_MAX_PENDING):
+        """
+        Segment a file without loading it into memory, yielding words.
+
+        Parameter:
+            - path: The file to be segmented.
+            - cut_all, HMM: The same as in `cut`.
+            - search: Use the search engine mode as `cut_for_search`.
+            - encoding: The encoding of the file. If None, it is decoded
+              as utf-8, or as gbk if it is not valid utf-8 (like `cut`
+              does for bytes).
+            - chunk_size: The number of bytes read at a time.
+            - max_pending: The number of characters kept when no word
+              boundary is found, after which the text is cut anyway.
+        """
+        re_break = re_stream_break_cut_all if cut_all and not search else re_stream_break
+        if search:
+            cut = lambda text: self._cut_for_search(text, HMM)
+        else:
+            cut = lambda text: self._cut(text, cut_all, HMM)
+        with open(path, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if encoding is None:
+                decoder = self._file_decoder(mm, chunk_size)
+            else:
+                decoder = codecs.getincrementaldecoder(encoding)()
+            pending = ''
+            for pos in xrange(0, len(mm), chunk_size):
+                pending += decoder.decode(mm[pos:pos + chunk_size])
+                m = re_break.match(pending)
+                end = m.end() if m else 0
+                skip = False
+                if not end and len(pending) > max_pending:
+                    m = re_stream_skip_cut_all.match(pending) if cut_all and not search else None
+                    end = m.end() if m else len(pending)
+                    skip = m is not None
+                if end:
+                    words = cut(pending[:end])
+                    if skip:
+                        #去掉在分隔字元後切開而多出的空字串
+                        words = list(words)[:-1]
+                    for word in words:
+                        yield word
+                    pending = pending[end:]
+            pending += decoder.decode(b'', True)
+            for word in cut(pending):
+                yield word
+        finally:
+            mm.close()
+
+    """
+    _file_decoder回傳cut_file在沒有指定編碼時使用的增量解碼器，與strdecode相同：
+    先逐個chunk檢查整個檔案是不是合法的utf-8，是的話就以utf-8解碼，否則以gbk解碼並忽略無法解碼的位元組。
+    檢查時只解碼不分詞，所以比分詞本身快得多，而且同樣只需要大約一個chunk的記憶體。
+    """
+    def _file_decoder(self, mm, chunk_size):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            for pos in xrange(0, len(mm), chunk_size):
+                decoder.decode(mm[pos:pos + chunk_size])
+            decoder.decode(b'', True)
+        except UnicodeDecodeError:
+            return codecs.getincrementaldecoder('gbk')('ignore')
+        return codecs.getincrementaldecoder('utf-8')()
+
+    """
+    parallel建立一個只屬於這個Tokenizer的行程池，工作行程使用與它相同的字典及使用者加入的詞，詳見parallel.py。
+    """
+    def parallel(self, processnum=None):
+        """
+        Return a `jieba.parallel.TokenizerPool` running `cut`,
+        `cut_for_search`, `tokenize` and `cut_batch` of this tokenizer
+        in `processnum` worker processes (default: the number of CPUs).
+
+        The workers use this tokenizer's dictionary and user words; the
+        pool restarts them after the dictionary is modified. Call its
+        `close` method (or use it as a context manager) when done.
+        """
+        from .parallel import TokenizerPool
+        return TokenizerPool(self, processnum)
+
     _lcut = lcut
     _lcut_for_search = lcut_for_search
 
@@ -682,6 +1108,14 @@ class Tokenizer(object):
     """
     自定義詞典
     jieba支持自定義詞典，因為這不是核心功能，在此僅列出相關函數，並不多做介紹。
+    load_userdict會先讀完整個檔案，再交給_update一次更新，
+    所以不論檔案有多少詞，字典只會被複製及替換一次。
+
+    合併後的字典會被存成快取檔案，下次啟動時由相同的字典載入相同的自定義詞典，就可以直接載入合併後的結果。
+    快取檔案的名稱由修改前字典的鍵及自定義詞典的路徑決定，
+    標頭中則記錄了合併後的鍵，它由修改前字典的鍵及自定義詞典的內容算出，
+    所以只有在原始字典、之前的修改或自定義詞典的內容改變時，快取檔案才會被重寫。
+    沒有路徑的file-like object(如io.StringIO)則不會被快取。
     """
     def load_userdict(self, f):
         '''
@@ -700,11 +1134,64 @@ class Tokenizer(object):
         '''
         self.check_initialized()
         if isinstance(f, string_types):
-            f_name = f
-            f = open(f, 'rb')
+            f_name = path = f
+            with open(f, 'rb') as fp:
+                lines = fp.readlines()
         else:
             f_name = resolve_filename(f)
-        for lineno, ln in enumerate(f, 1):
+            path = getattr(f, 'name', None)
+            if not isinstance(path, string_types):
+                path = None
+            lines = list(f)
+        with self.lock:
+            base_key = self._get_dict_key()
+            h = md5(base_key.encode('utf-8'))
+            for ln in lines:
+                h.update(ln.encode('utf-8') if isinstance(ln, text_type) else ln)
+            key = h.hexdigest()
+            cache_file = None
+            if path is not None:
+                cache_file = os.path.join(
+                    self.tmp_dir or tempfile.gettempdir(), "jieba.m%s.cache" % md5(
+                        (base_key + os.path.abspath(path)).encode('utf-8', 'replace')).hexdigest())
+                if self._load_merged(cache_file, key):
+                    return
+            entries = self._parse_userdict(lines, f_name)
+            applied = self._update(entries, key)
+            if cache_file is not None:
+                #標頭中只需記錄這次加入的詞性及強制切分的詞，
+                #修改前的字典所對應的部份在載入快取檔案時己經存在於當前的行程中
+                self._dump_cache(self._working_trie(), cache_file, key=key, jieba=__version__,
+                                 tags=dict((word, tag) for word, freq, tag in applied if tag),
+                                 force_split=[word for word, freq, tag in applied if freq == 0])
+
+    """
+    _load_merged在cache_file存在且其標頭中的鍵與key相同時，直接載入合併後的字典並回傳True。
+    """
+    def _load_merged(self, cache_file, key):
+        if not os.path.isfile(cache_file):
+            return False
+        try:
+            trie, meta = DoubleArrayTrie.open(cache_file)
+        except Exception:
+            return False
+        if meta.get('key') != key or meta.get('jieba') != __version__:
+            return False
+        default_logger.debug("Loading merged dictionary from cache %s" % cache_file)
+        trie.version = self._working_trie().version + 1
+        self.user_word_tag_tab.update(meta['tags'])
+        for word in meta['force_split']:
+            finalseg.add_force_split(word)
+        self._dict_key = key
+        self._publish(trie)
+        return True
+
+    """
+    _parse_userdict把自定義詞典的每一行解析成(word, freq, tag)。
+    """
+    def _parse_userdict(self, lines, f_name):
+        entries = []
+        for lineno, ln in enumerate(lines, 1):
             line = ln.strip()
             if not isinstance(line, text_type):
                 try:
@@ -719,7 +1206,8 @@ class Tokenizer(object):
                 freq = freq.strip()
             if tag is not None:
                 tag = tag.strip()
-            self.add_word(word, freq, tag)
+            entries.append((word, freq, tag))
+        return entries
 
     def add_word(self, word, freq=None, tag=None):
         """
@@ -727,20 +1215,132 @@ class Tokenizer(object):
 
         freq and tag can be omitted, freq defaults to be a calculated value
         that ensures the word can be cut out.
+
+        Each call copies the dictionary; wrap many calls in `batch()` so
+        that it is copied only once.
+        """
+        self._update([(word, freq, tag)])
+
+    """
+    _update是所有修改字典的函數的共同入口。
+    正在分詞的執行緒可能還在讀取self.FREQ，所以不能直接修改它，
+    而是先複製一份(copy-on-write)，把entries中的(word, freq, tag)全部寫入複本後，
+    再以一次賦值把self.FREQ換成新的快照。
+    賦值是原子操作，讀取者看到的要不是舊的字典，就是己包含所有新詞的字典，
+    不會看到修改到一半的字典，所以分詞時不需要上鎖。
+    同時修改字典的執行緒則以self.lock排隊，以免後完成的覆蓋掉先完成的修改。
+    在batch中則直接寫入batch的複本，等離開batch時才發布。
+    key是修改後字典的鍵(見_get_dict_key)，沒有給定時由修改前的鍵及entries算出。
+    回傳實際寫入的(word, freq, tag)。
+    """
+    def _update(self, entries, key=None):
+        self.check_initialized()
+        with self.lock:
+            base_key = self._get_dict_key()
+            #在batch中時直接寫入batch的複本
+            trie = self._batch if self._batch is not None else self.FREQ.copy()
+            applied = []
+            #連續的己給定詞頻的詞先存在pending裡，再以trie.update一次寫入，
+            #詞數多時它會重新建構整棵字典樹，比逐一插入快得多
+            pending = []
+            tags = {}
+            for word, freq, tag in entries:
+                word = strdecode(word)
+                if freq is None:
+                    #沒有給定詞頻時，以複本計算，這樣同一批中前面加入的詞也會被考慮到
+                    trie.update(pending)
+                    pending = []
+                    freq = self._suggest_freq(trie, word)[1]
+                    #字典樹在插入word時會一併建立它的所有前綴，所以不必再把前綴逐一加入FREQ
+                    trie[word] = freq
+                else:
+                    freq = int(freq)
+                    pending.append((word, freq))
+                trie.total += freq
+                if tag:
+                    #詞性存入字典樹，user_word_tag_tab則是為了相容而保留
+                    tags[word] = tag
+                    self.user_word_tag_tab[word] = tag
+                if freq == 0:
+                    finalseg.add_force_split(word)
+                applied.append((word, freq, tag))
+            trie.update(pending)
+            for word, tag in iteritems(tags):
+                trie.set_tag(word, tag)
+            if key is None:
+                key = md5((base_key + repr(applied)).encode('utf-8')).hexdigest()
+            self._dict_key = key
+            self._publish(trie)
+        return applied
+
+    """
+    _working_trie回傳修改字典時應該讀取的字典樹：在batch中是尚未發布的複本，否則是self.FREQ。
+    只能在持有self.lock時呼叫，這樣如果batch正在進行，它一定屬於目前的執行緒。
+    """
+    def _working_trie(self):
+        return self._batch if self._batch is not None else self.FREQ
+
+    """
+    _publish把修改後的字典樹發布為新的快照；在batch中則只是記下它，等離開batch時再發布。
+    """
+    def _publish(self, trie):
+        if self._batch is not None:
+            self._batch = trie
+            return
+        self.FREQ = trie
+        #字典樹的節點編號可能己經改變，自動機需要重新建構
+        self._automaton = None
+        #字典改變了，快取裡的分詞結果也就不再有效
+        self.clear_cache()
+
+    """
+    batch把多次修改字典合併成一次：
+    在with區塊中，add_word，del_word，suggest_freq，load_userdict等都寫入同一個複本，
+    離開區塊時才發布新的快照，所以整批修改只需複製一次字典樹，
+    否則逐一呼叫add_word時，每次都要複製整棵字典樹，n個詞的成本是O(n * 字典大小)。
+    區塊執行期間會持有self.lock，其它執行緒的修改會等到發布之後才進行；
+    分詞則不受影響，在發布之前看到的仍是修改前的快照。
+    巢狀的batch會併入最外層的batch。
+    """
+    @contextmanager
+    def batch(self):
+        """
+        Group dictionary edits so that the dictionary is copied and
+        republished only once, when the block exits:
+
+            with tokenizer.batch():
+                for word in words:
+                    tokenizer.add_word(word)
+
+        Segmentation keeps using the previous dictionary until then.
         """
         self.check_initialized()
-        word = strdecode(word)
-        freq = int(freq) if freq is not None else self.suggest_freq(word, False)
-        self.FREQ[word] = freq
-        self.total += freq
-        if tag:
-            self.user_word_tag_tab[word] = tag
-        for ch in xrange(len(word)):
-            wfrag = word[:ch + 1]
-            if wfrag not in self.FREQ:
-                self.FREQ[wfrag] = 0
-        if freq == 0:
-            finalseg.add_force_split(word)
+        with self.lock:
+            if self._batch is not None:
+                yield
+                return
+            self._batch = self.FREQ.copy()
+            try:
+                yield
+            finally:
+                trie, self._batch = self._batch, None
+                #即使區塊中發生例外，己完成的修改也與逐一修改時一樣會生效
+                self._publish(trie)
+
+    """
+    _update_tags只修改字典中己有的詞的詞性，不改變詞頻，供POSTokenizer.load_word_tag使用。
+    與_update一樣是在複本上修改，完成後再換上去。
+    """
+    def _update_tags(self, tags):
+        self.check_initialized()
+        with self.lock:
+            base_key = self._get_dict_key()
+            trie = self._batch if self._batch is not None else self.FREQ.copy()
+            for word, tag in iteritems(tags):
+                if word in trie:
+                    trie.set_tag(word, tag)
+            self._dict_key = md5((base_key + repr(sorted(iteritems(tags)))).encode('utf-8')).hexdigest()
+            self._publish(trie)
 
     def del_word(self, word):
         """
@@ -762,22 +1362,32 @@ class Tokenizer(object):
         set HMM=False.
         """
         self.check_initialized()
-        ftotal = float(self.total)
+        #在batch中要以尚未發布的複本計算，才會考慮到同一批中之前的修改
+        with self.lock:
+            word, freq = self._suggest_freq(self._working_trie(), segment)
+            if tune:
+                self.add_word(word, freq)
+        return freq
+
+    """
+    _suggest_freq以字典快照trie計算建議的詞頻，回傳(word, freq)。
+    _update在寫入複本的過程中也會用它來計算沒有給定詞頻的詞。
+    """
+    def _suggest_freq(self, trie, segment):
+        ftotal = float(trie.total)
         freq = 1
         if isinstance(segment, string_types):
-            word = segment
-            for seg in self.cut(word, HMM=False):
-                freq *= self.FREQ.get(seg, 1) / ftotal
-            freq = max(int(freq * self.total) + 1, self.FREQ.get(word, 1))
+            word = strdecode(segment)
+            for seg in self._cut(word, HMM=False, trie=trie):
+                freq *= trie.get(seg, 1) / ftotal
+            freq = max(int(freq * trie.total) + 1, trie.get(word, 1))
         else:
             segment = tuple(map(strdecode, segment))
             word = ''.join(segment)
             for seg in segment:
-                freq *= self.FREQ.get(seg, 1) / ftotal
-            freq = min(int(freq * self.total), self.FREQ.get(word, 0))
-        if tune:
-            add_word(word, freq)
-        return freq
+                freq *= trie.get(seg, 1) / ftotal
+            freq = min(int(freq * trie.total), trie.get(word, 0))
+        return word, freq
 
     """
     tokenize函數
@@ -803,20 +1413,23 @@ class Tokenizer(object):
                 yield (w, start, start + width)
                 start += width
         else:
-            for w in self.cut(unicode_sentence, HMM=HMM):
+            self.check_initialized()
+            # 切詞及查找二字詞、三字詞都使用同一個字典快照
+            trie = self.FREQ
+            for w in self._cut(unicode_sentence, HMM=HMM, trie=trie):
                 width = len(w)
                 if len(w) > 2:
+                    # 與cut_for_search相同，一次走三步來取得二字詞及三字詞的詞頻
+                    grams = [trie.prefix_freqs(w, i, i + 3) for i in xrange(len(w) - 1)]
                     # 檢查w中是否包含有二字詞
                     for i in xrange(len(w) - 1):
-                        gram2 = w[i:i + 2]
-                        if self.FREQ.get(gram2):
-                            yield (gram2, start + i, start + i + 2)
-                if len(w) > 3:
-                    # 檢查w中是否包含有三字詞
-                    for i in xrange(len(w) - 2):
-                        gram3 = w[i:i + 3]
-                        if self.FREQ.get(gram3):
-                            yield (gram3, start + i, start + i + 3)
+                        if len(grams[i]) > 1 and grams[i][1]:
+                            yield (w[i:i + 2], start + i, start + i + 2)
+                    if len(w) > 3:
+                        # 檢查w中是否包含有三字詞
+                        for i in xrange(len(w) - 2):
+                            if len(grams[i]) > 2 and grams[i][2]:
+                                yield (w[i:i + 3], start + i, start + i + 3)
                 yield (w, start, start + width)
                 start += width
 
@@ -827,6 +1440,169 @@ class Tokenizer(object):
                 raise Exception("jieba: file does not exist: " + abs_path)
             self.dictionary = abs_path
             self.initialized = False
+            self.clear_cache()
+
+    """
+    分詞結果快取
+    對於重複出現的句子，可以直接回傳先前的分詞結果。
+    快取的鍵是(sentence, cut_all, HMM)，搜索引擎模式則是(sentence, 'search', HMM)，
+    字典被修改(add_word，del_word，load_userdict，suggest_freq)或更換(set_dictionary)時會被清空。
+    """
+    def enable_cache(self, maxsize=1024):
+        """
+        Cache the results of `cut` and `cut_for_search` in a LRU cache
+        holding at most `maxsize` sentences.
+        """
+        self.cache = LRUCache(maxsize)
+
+    def disable_cache(self):
+        self.cache = None
+
+    def clear_cache(self):
+        if self.cache is not None:
+            self.cache.clear()
+        #字典改變時一併清空finalseg中未登錄詞的分詞結果
+        finalseg.clear_memo()
+
+    def cache_info(self):
+        """
+        Return (hits, misses, evictions, maxsize, currsize) of the result
+        cache, or None if the cache is disabled.
+        """
+        if self.cache is not None:
+            return self.cache.info()
+
+"""
+StreamingSegmenter用於分段到達的文字(例如由socket收到的日誌或聊天訊息)，
+一個詞有可能被切在兩段之間，所以不能對每一段分別分詞。
+
+feed每收到一段文字，就只輸出之後不可能再改變的詞，把尚未確定的尾巴留到下一次：
+1. 區塊的邊界是安全的：cut本來就是以re_han切出的區塊為單位分詞的。
+   re_stream_break(精確模式)及re_stream_break_cut_all(全模式)會找出最後一個區塊邊界，
+   在這之前的文字可以直接分詞，剩下的就只有最後一個區塊。
+2. 如果最後一個區塊是漢字區塊，還可以在它的內部找到確定的切分點：
+   若DAG中沒有任何一條邊跨過位置j，則所有的切分路徑都會經過j，
+   動態規劃在j之前選擇的路徑與j之後的內容無關。
+   只有當j之前的每個位置都能看到最長詞長(FREQ.maxlen)個字時，才能確定沒有邊跨過j。
+   使用HMM時，連續的單字會被合併交給finalseg，所以還要求路徑中結束於j的詞是多字詞。
+所以留下的尾巴不會超過當前的區塊，也通常不會比最長詞長多太多。
+為了避免記憶體無限制地增長，尾巴超過max_pending個字時會被直接分詞(全模式下會先嘗試re_stream_skip_cut_all)。
+
+每次feed只處理新收到的部份，所以分詞整個串流的時間與它的長度成正比：
+尾巴本身不含區塊邊界，新的邊界只可能出現在尾巴的最後一個字之後；
+一個沒有邊跨過的位置在之後收到更多文字時也不會改變，它之前的路徑也一樣，
+所以_settled記下上一次找到的最後一個這種位置(_scan)，下一次只從那裡開始建構DAG及計算路徑。
+否則在尾巴一直無法確定時(例如使用HMM時大量的未登錄詞都是單字)，每次feed都要重新掃描整個尾巴。
+"""
+class StreamingSegmenter(object):
+    """
+    Incremental segmenter for text arriving in chunks.
+
+    `feed(chunk)` returns the words that can no longer change,
+    `flush()` returns the remaining words at the end of the stream.
+    """
+
+    def __init__(self, tokenizer=None, cut_all=False, HMM=True, search=False,
+                 max_pending=4096):
+        self.tokenizer = tokenizer or dt
+        self.cut_all = cut_all
+        self.HMM = HMM
+        self.search = search
+        self.max_pending = max_pending
+        self.pending = ''
+        #pending中己經確定沒有邊跨過的最後一個位置，及計算它時所使用的字典快照
+        self._scan = 0
+        self._trie = None
+        #搜索引擎模式是基於精確模式的，與cut_for_search相同，此時會忽略cut_all
+        if cut_all and not search:
+            self.re_han = re_han_cut_all
+            self.re_break = re_stream_break_cut_all
+        else:
+            self.re_han = re_han_default
+            self.re_break = re_stream_break
+
+    def _cut(self, text):
+        if self.search:
+            return list(self.tokenizer._cut_for_search(text, self.HMM))
+        return list(self.tokenizer._cut(text, self.cut_all, self.HMM))
+
+    def feed(self, chunk):
+        self.tokenizer.check_initialized()
+        text = self.pending + strdecode(chunk)
+        #pending中沒有區塊邊界，只需從它的最後一個字開始尋找
+        m = self.re_break.match(text, max(len(self.pending) - 1, 0))
+        end = m.end() if m else 0
+        words = self._cut(text[:end])
+        text = text[end:]
+        if end:
+            self._scan = 0
+        m = self.re_han.match(text)
+        if m and m.end() == len(text):
+            end = self._settled(text)
+            words.extend(self._cut(text[:end]))
+            text = text[end:]
+            self._scan -= end
+        if len(text) > self.max_pending:
+            m = re_stream_skip_cut_all.match(text) if self.cut_all and not self.search else None
+            if m:
+                #去掉在分隔字元後切開而多出的空字串
+                words.extend(self._cut(text[:m.end()])[:-1])
+                text = text[m.end():]
+            else:
+                words.extend(self._cut(text))
+                text = ''
+            self._scan = 0
+        self.pending = text
+        return words
+
+    def flush(self):
+        words = self._cut(self.pending)
+        self.pending = ''
+        self._scan = 0
+        return words
+
+    def _settled(self, block):
+        """
+        回傳漢字區塊block中最後一個確定的切分點，找不到時回傳0。
+        block[:self._scan]在之前的feed中己經掃描過，其中沒有確定的切分點，所以只需掃描block[self._scan:]。
+        """
+        tokenizer = self.tokenizer
+        trie = tokenizer.FREQ
+        if trie is not self._trie:
+            #字典改變了，之前找到的位置不再可靠
+            self._trie = trie
+            self._scan = 0
+        start = self._scan
+        #start之前的路徑己經確定，從start開始的部份則可以獨立地處理
+        block = block[start:]
+        limit = len(block) - trie.maxlen + 1
+        if limit < 1:
+            return 0
+        DAG, LOGPROBS = tokenizer._get_DAG(block, trie)
+        #forced記錄了所有沒有邊跨過的位置，reach是目前為止所有的邊能到達的最遠位置
+        forced = set()
+        reach = -1
+        for k in xrange(limit):
+            reach = max(reach, DAG[k][-1])
+            if reach == k:
+                forced.add(k + 1)
+        if not forced:
+            return 0
+        last = max(forced)
+        self._scan = start + last
+        if self.cut_all and not self.search:
+            return start + last
+        #沒有邊跨過last，所以可以只對block[:last]做動態規劃
+        route = {}
+        tokenizer._calc(block[:last], DAG, LOGPROBS, route)
+        settled = 0
+        x = 0
+        while x < last:
+            y = route[x][1] + 1
+            if y - x > 1 and y in forced:
+                settled = start + y
+            x = y
+        return settled
 
 """
 根據jieba文檔裡介紹的使用方法，我們可以直接調用jieba.cut來分詞，這是怎麼做到的呢？
@@ -848,6 +1624,9 @@ cut = dt.cut
 lcut = dt.lcut
 cut_for_search = dt.cut_for_search
 lcut_for_search = dt.lcut_for_search
+cut_batch = dt.cut_batch
+lcut_batch = dt.lcut_batch
+cut_file = dt.cut_file
 del_word = dt.del_word
 get_DAG = dt.get_DAG
 get_dict_file = dt.get_dict_file
@@ -855,7 +1634,12 @@ initialize = dt.initialize
 load_userdict = dt.load_userdict
 set_dictionary = dt.set_dictionary
 suggest_freq = dt.suggest_freq
+batch = dt.batch
 tokenize = dt.tokenize
+enable_cache = dt.enable_cache
+disable_cache = dt.disable_cache
+clear_cache = dt.clear_cache
+cache_info = dt.cache_info
 user_word_tag_tab = dt.user_word_tag_tab
 
 
@@ -884,26 +1668,33 @@ def _lcut_for_search_no_hmm(s):
 
 """
 以下是並行分詞相關函數
+輸入以_split_parts切成大小相近的片段(見parallel.py中的_balanced_split)，每次分派一個片段給工作行程。
 """
+def _split_parts(sentence, cut_all=False):
+    from .parallel import _balanced_split
+    return _balanced_split(strdecode(sentence), pool_size, cut_all)
+
+
 def _pcut(sentence, cut_all=False, HMM=True):
-    parts = strdecode(sentence).splitlines(True)
+    parts = _split_parts(sentence, cut_all)
     if cut_all:
-        result = pool.map(_lcut_all, parts)
+        from .parallel import _join_cut_all
+        result = [_join_cut_all(parts, pool.map(_lcut_all, parts, 1))]
     elif HMM:
-        result = pool.map(_lcut, parts)
+        result = pool.map(_lcut, parts, 1)
     else:
-        result = pool.map(_lcut_no_hmm, parts)
+        result = pool.map(_lcut_no_hmm, parts, 1)
     for r in result:
         for w in r:
             yield w
 
 
 def _pcut_for_search(sentence, HMM=True):
-    parts = strdecode(sentence).splitlines(True)
+    parts = _split_parts(sentence)
     if HMM:
-        result = pool.map(_lcut_for_search, parts)
+        result = pool.map(_lcut_for_search, parts, 1)
     else:
-        result = pool.map(_lcut_for_search_no_hmm, parts)
+        result = pool.map(_lcut_for_search_no_hmm, parts, 1)
     for r in result:
         for w in r:
             yield w
@@ -914,10 +1705,10 @@ def enable_parallel(processnum=None):
     Change the module's `cut` and `cut_for_search` functions to the
     parallel version.
 
-    Note that this only works using dt, custom Tokenizer
-    instances are not supported.
+    Note that this only works using dt, use `Tokenizer.parallel` for
+    custom Tokenizer instances.
     """
-    global pool, dt, cut, cut_for_search
+    global pool, pool_size, dt, cut, cut_for_search
     from multiprocessing import cpu_count
     if os.name == 'nt':
         raise NotImplementedError(
@@ -928,14 +1719,16 @@ def enable_parallel(processnum=None):
     if processnum is None:
         processnum = cpu_count()
     pool = Pool(processnum)
+    pool_size = processnum
     cut = _pcut
     cut_for_search = _pcut_for_search
 
 
 def disable_parallel():
-    global pool, dt, cut, cut_for_search
+    global pool, pool_size, dt, cut, cut_for_search
     if pool:
         pool.close()
         pool = None
+        pool_size = 0
     cut = dt.cut
     cut_for_search = dt.cut_for_search
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# _lru.py裡定義了分詞結果快取所用的LRU快取
+from __future__ import absolute_import, unicode_literals
+import threading
+from collections import namedtuple, OrderedDict
+
+"""
+LRU(Least Recently Used)快取：
+快取的項目數超過maxsize時，最久沒有被使用的項目會被淘汰。
+
+OrderedDict會記住鍵被插入的順序，
+每次命中時把該項目取出再重新插入，它就會被移到最後面，
+所以最前面的項目永遠是最久沒有被使用的那一個。
+(Python2的OrderedDict沒有move_to_end，所以用pop再插入的方式)
+
+hits，misses及evictions分別記錄命中，未命中及被淘汰的次數，
+它們不會因為clear而歸零，方便使用者觀察快取的大小是否足夠。
+"""
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize=1024):
+        if maxsize <= 0:
+            raise ValueError('jieba: cache size must be positive')
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        #每次clear都會遞增，用來捨棄在clear之前開始計算的結果
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        """
+        存入一個項目。
+        如果傳入了generation，而快取在那之後被clear過，
+        表示value是以舊的字典算出來的，這時就不存入。
+        """
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.data.pop(key, None)
+            self.data[key] = value
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.generation += 1
+
+    def info(self):
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             self.maxsize, len(self.data))
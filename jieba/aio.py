@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio介面
+
+在asyncio的伺服器中直接呼叫jieba.cut或jieba.analyse.extract_tags，
+分詞的過程會卡住整個事件迴圈，第一次呼叫時載入字典(initialize)更是要花上一段時間。
+
+這個模組提供了ainitialize，acut，alcut及aextract_tags這幾個協程：
+它們把實際的工作交給一個執行器(executor)，可以是執行緒池或是行程池，
+預設使用事件迴圈自己的執行緒池，也可以用set_executor更換。
+較長的輸入會先在區塊邊界(見jieba.re_stream_break)被切成約BLOCK_SIZE個字的片段，
+每個片段分別交給執行器，所以在兩個片段之間，事件迴圈可以去執行其它的任務，
+多個請求共用一個執行器時，長的輸入也不會一直霸佔它。
+
+使用行程池時，工作會在其它行程中以它們自己的jieba.dt完成，
+所以不能指定自訂的Tokenizer，而ainitialize則總是在當前的行程中載入字典。
+
+這個模組使用了async def及非同步生成器，需要Python 3.6以上的版本。
+"""
+from __future__ import absolute_import, unicode_literals
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import jieba
+from ._compat import strdecode
+
+#每個片段大約的字數
+BLOCK_SIZE = 4096
+
+executor = None
+
+
+def set_executor(new_executor):
+    """
+    Set the executor (a thread or process pool) used by the coroutines.
+    `None` means the default executor of the event loop.
+    """
+    global executor
+    executor = new_executor
+
+
+def _split(sentence, cut_all=False, size=BLOCK_SIZE):
+    """
+    把sentence切成約size個字的片段，只在區塊邊界切開，所以分詞的結果不受影響。
+    如果在size個字內找不到邊界，就把範圍加倍再找。
+    """
+    re_break = jieba.re_stream_break_cut_all if cut_all else jieba.re_stream_break
+    start = 0
+    N = len(sentence)
+    while N - start > size:
+        width = size
+        m = None
+        while start + width < N:
+            m = re_break.match(sentence, start, start + width)
+            if m and m.end() > start:
+                break
+            width *= 2
+        if not m or m.end() <= start or start + width >= N:
+            break
+        yield sentence[start:m.end()]
+        start = m.end()
+    if start < N:
+        yield sentence[start:]
+
+
+def _lcut(tokenizer, sentence, cut_all, HMM):
+    return list((tokenizer or jieba.dt)._cut(sentence, cut_all, HMM))
+
+
+def _pos_lcut(postokenizer, sentence, HMM):
+    if postokenizer is None:
+        import jieba.posseg
+        postokenizer = jieba.posseg.dt
+    return postokenizer.lcut(sentence, HMM)
+
+
+def _get_executor(tokenizer, given):
+    pool = executor if given is None else given
+    if tokenizer is not None and isinstance(pool, ProcessPoolExecutor):
+        raise ValueError('jieba: custom tokenizers cannot be used with a process pool')
+    return pool
+
+
+async def ainitialize(dictionary=None, tokenizer=None, executor=None):
+    """
+    Load the dictionary without blocking the event loop.
+    """
+    tokenizer = tokenizer or jieba.dt
+    pool = _get_executor(None, executor)
+    #字典必須載入在當前的行程中，所以行程池會被換成事件迴圈的執行緒池
+    if isinstance(pool, ProcessPoolExecutor):
+        pool = None
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(pool, tokenizer.initialize, dictionary)
+
+
+async def acut(sentence, cut_all=False, HMM=True, tokenizer=None, executor=None):
+    """
+    Asynchronous version of `cut`, yielding words as each block is done.
+    """
+    pool = _get_executor(tokenizer, executor)
+    loop = asyncio.get_event_loop()
+    for piece in _split(strdecode(sentence), cut_all):
+        words = await loop.run_in_executor(pool, _lcut, tokenizer, piece, cut_all, HMM)
+        for word in words:
+            yield word
+
+
+async def alcut(sentence, cut_all=False, HMM=True, tokenizer=None, executor=None):
+    return [word async for word in acut(sentence, cut_all, HMM, tokenizer, executor)]
+
+
+async def aextract_tags(sentence, topK=20, withWeight=False, allowPOS=(), withFlag=False,
+                        executor=None):
+    """
+    Asynchronous version of `jieba.analyse.extract_tags`.
+    """
+    import jieba.analyse
+    tfidf = jieba.analyse.default_tfidf
+    pool = _get_executor(None, executor)
+    #在行程池中只能使用各行程自己的預設分詞器
+    if isinstance(pool, ProcessPoolExecutor):
+        tokenizer = postokenizer = None
+    else:
+        tokenizer, postokenizer = tfidf.tokenizer, tfidf.postokenizer
+    loop = asyncio.get_event_loop()
+    words = []
+    for piece in _split(strdecode(sentence)):
+        if allowPOS:
+            words.extend(await loop.run_in_executor(pool, _pos_lcut, postokenizer, piece, True))
+        else:
+            words.extend(await loop.run_in_executor(pool, _lcut, tokenizer, piece, False, True))
+    #計算TF-IDF只需要詞頻，在事件迴圈的執行緒池中完成即可
+    return await loop.run_in_executor(
+        None, tfidf._extract_tags_from_words,
+        words, topK, withWeight, allowPOS, withFlag)
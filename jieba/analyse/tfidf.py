@@ -127,6 +127,15 @@ class TFIDF(KeywordExtractor):
         else:
             # words為generator of str
             words = self.tokenizer.cut(sentence)
+        return self._extract_tags_from_words(words, topK, withWeight, allowPOS, withFlag)
+
+    """
+    _extract_tags_from_words是extract_tags中分詞以外的部份，
+    它接受己經分好的詞(allowPOS不為空時是pair)，計算TF-IDF後回傳關鍵詞。
+    jieba.aio在事件迴圈之外分段分詞後，會直接呼叫它。
+    """
+    def _extract_tags_from_words(self, words, topK=20, withWeight=False, allowPOS=(), withFlag=False):
+        allowPOS = frozenset(allowPOS)
         # 計算詞頻(即TF，term frequency)
         freq = {}
         for w in words:
@@ -0,0 +1,159 @@
+from __future__ import absolute_import, unicode_literals
+from array import array
+from math import log
+from collections import deque
+from ._compat import *
+from .trie import ROOT, SINGLE, HIGH
+
+"""
+Aho-Corasick自動機
+
+get_DAG對句中的每個位置k都會由字典樹的根節點重新往下走一次，
+所以一個長度為N的區塊需要O(N × 最長詞長)次查找。
+
+Aho-Corasick自動機在字典樹上額外加上兩種連結：
+  fail[s]：節點s所代表的字串，其最長且也在字典樹裡的真後綴所在的節點
+  out[s]：沿著fail連結往上走，遇到的第一個成詞的節點（沒有則為根節點0）
+另外report[s]在s本身成詞時為s，否則為out[s]，它是列舉以當前字元結尾的詞的起點。
+有了它們，只需由左到右掃描句子一次，就能找出句中所有出現在字典裡的詞：
+當前節點走不下去時就沿著fail退到較短的後綴，
+而每到達一個節點，就沿著out列舉所有以當前字元結尾的詞。
+
+自動機直接使用雙數組字典樹的base及check來轉移，
+只另外記錄fail，out，report及depth（節點代表的字串的長度）四個數組。
+字典樹被修改後節點的編號可能會改變，所以自動機必須重新建構。
+"""
+
+
+class AhoCorasick(object):
+
+    def __init__(self, trie):
+        self.trie = trie
+        size = len(trie.check)
+        self.fail = array('i', [ROOT]) * size
+        self.out = array('i', [ROOT]) * size
+        self.report = array('i', [ROOT]) * size
+        self.depth = array('i', [0]) * size
+        self._build()
+
+    def _step(self, s, u):
+        """
+        由節點s經過轉移編號u（可能需要兩步）到達的節點，走不下去時回傳-1。
+        """
+        base, check = self.trie.base, self.trie.check
+        if u > 0xffff:
+            t = base[s] + (u >> 16)
+            if check[t] != s:
+                return -1
+            s = t
+            u &= 0xffff
+        t = base[s] + u
+        if check[t] != s:
+            return -1
+        return t
+
+    def _char_children(self, s):
+        """
+        列舉節點s在字元層級上的子節點，回傳(字元編號，子節點)的list。
+        需要兩步轉移的字元會跳過中間節點，直接給出第二步到達的節點。
+        """
+        base, child, sibling = self.trie.base, self.trie.child, self.trie.sibling
+        children = []
+        u = child[s]
+        while u:
+            t = base[s] + u
+            if SINGLE < u <= SINGLE + HIGH:
+                v = child[t]
+                while v:
+                    children.append(((u << 16) | v, base[t] + v))
+                    v = sibling[base[t] + v]
+            else:
+                children.append((u, t))
+            u = sibling[t]
+        return children
+
+    def _build(self):
+        """
+        以廣度優先的順序計算每個節點的fail及out。
+        處理節點t時，比它淺的節點都己處理完畢，所以fail[s]及out[fail[t]]都己可用。
+        """
+        freq = self.trie.freq
+        fail, out, report, depth = self.fail, self.out, self.report, self.depth
+        step = self._step
+        queue = deque()
+        for u, t in self._char_children(ROOT):
+            depth[t] = 1
+            report[t] = t if freq[t] else ROOT
+            queue.append(t)
+        while queue:
+            s = queue.popleft()
+            for u, t in self._char_children(s):
+                depth[t] = depth[s] + 1
+                f = fail[s]
+                while True:
+                    g = step(f, u)
+                    if g >= 0:
+                        fail[t] = g
+                        break
+                    if f == ROOT:
+                        break
+                    f = fail[f]
+                g = fail[t]
+                out[t] = g if freq[g] else out[g]
+                report[t] = t if freq[t] else out[t]
+                queue.append(t)
+
+    def dag(self, sentence):
+        """
+        由左到右掃描sentence一次，回傳與Tokenizer._get_DAG相同的(DAG, LOGPROBS)。
+        """
+        trie = self.trie
+        alphabet, base, check, logfreq = trie.alphabet, trie.base, trie.check, trie.logfreq
+        fail, report, out, depth = self.fail, self.report, self.out, self.depth
+        logtotal = log(trie.total)
+        N = len(sentence)
+        ends = [[] for _ in xrange(N)]
+        logfreqs = [[] for _ in xrange(N)]
+        s = ROOT
+        for i in xrange(N):
+            u = alphabet.get(sentence[i])
+            #字典裡沒有這個字，任何詞都不可能跨過它
+            if u is None:
+                s = ROOT
+                continue
+            high, low = u >> 16, u & 0xffff
+            while True:
+                p = s
+                if high:
+                    p = base[s] + high
+                    if check[p] != s:
+                        p = -1
+                if p >= 0:
+                    t = base[p] + low
+                    if check[t] == p:
+                        break
+                if s == ROOT:
+                    t = ROOT
+                    break
+                #走不下去，退到最長的後綴再試一次
+                s = fail[s]
+            s = t
+            #列舉所有以sentence[i]結尾的詞，它們的詞首是i - depth + 1
+            o = report[s]
+            while o:
+                k = i - depth[o] + 1
+                ends[k].append(i)
+                logfreqs[k].append(logfreq[o] - logtotal)
+                o = out[o]
+        #DAG的鍵必須由小到大排列，__cut_all會依序走訪它
+        DAG = {}
+        LOGPROBS = {}
+        for k in xrange(N):
+            if ends[k]:
+                DAG[k] = ends[k]
+                LOGPROBS[k] = logfreqs[k]
+            else:
+                #沒有任何詞以sentence[k]開頭時，單字成詞
+                DAG[k] = [k]
+                LOGPROBS[k] = [-logtotal]
+        return DAG, LOGPROBS
@@ -3,7 +3,15 @@ import re
 import os
 import sys
 import pickle
+import threading
+from array import array
+from collections import namedtuple
 from .._compat import *
+from .._lru import LRUCache
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 MIN_FLOAT = -3.14e100
 
@@ -43,13 +51,123 @@ def load_model():
 
 """
 從.p檔或.py檔載入start_P, trans_P, emit_P
+
+prob_emit.py是一個1.3MB的字典常量，匯入它要花上數百毫秒，
+而只使用HMM=False或全模式的程式根本用不到它，
+所以模型改為在第一次呼叫cut時才由_get_model載入。
+多個執行緒可能同時第一次呼叫cut，所以用_model_lock確保模型只被載入一次，
+載入完成前其它執行緒會在鎖上等待，不會拿到不完整的模型。
+
+載入後的模型會被轉換成緊湊的CompactModel(見_compile_model)，原本巢狀的字典則被丟棄，
+所以prob_emit模組也會從sys.modules中移除，讓它佔用的記憶體可以被回收。
+"""
+_model = None
+_model_lock = threading.Lock()
+
+"""
+CompactModel：
+rows：字元到列編號的對應。cut只會處理re_han中的漢字，所以以一個array記錄
+      U+4E00到U+9FD5每個字的列編號，rows[ord(ch) - HAN_FIRST]就是ch的列編號，
+      不必為每個字保存一個字串物件及字典的項目
+extra：其它範圍的字元到列編號的字典
+unknown：模型中沒有的字使用的列編號，該列全是MIN_FLOAT
+start：4個狀態的初始log機率
+trans：16個元素的array，trans[y0 * 4 + y]是由狀態y0轉移到y的log機率
+emit：(unknown + 1) * 4個元素的array，emit[row * 4 + y]是狀態y發射出第row列的字的log機率
+狀態以整數表示，其順序與'BEMS'相同，也就是字元的大小順序，
+所以比較(機率，狀態)時平手的處理方式與viterbi比較(機率，狀態字元)時相同。
+"""
+CompactModel = namedtuple('CompactModel', ['rows', 'extra', 'unknown', 'start', 'trans', 'emit'])
+STATES = 'BEMS'
+HAN_FIRST, HAN_LAST = 0x4E00, 0x9FD5
+
+def _compile_model(start_p, trans_p, emit_p):
+    chars = set()
+    for y in STATES:
+        chars.update(emit_p[y])
+    chars = sorted(chars)
+    unknown = len(chars)
+    rows = array('i', [unknown]) * (HAN_LAST - HAN_FIRST + 1)
+    extra = {}
+    for row, ch in enumerate(chars):
+        if HAN_FIRST <= ord(ch) <= HAN_LAST:
+            rows[ord(ch) - HAN_FIRST] = row
+        else:
+            extra[ch] = row
+    emit = array('d', [MIN_FLOAT]) * ((unknown + 1) * 4)
+    for row, ch in enumerate(chars):
+        for i, y in enumerate(STATES):
+            prob = emit_p[y].get(ch)
+            if prob is not None:
+                emit[row * 4 + i] = prob
+    start = array('d', [start_p[y] for y in STATES])
+    trans = array('d', [trans_p[y0].get(y, MIN_FLOAT) for y0 in STATES for y in STATES])
+    return CompactModel(rows, extra, unknown, start, trans, emit)
+
+"""
+回傳obs中每個字的列編號。
+"""
+def _rows(obs, model):
+    rows, extra, unknown = model.rows, model.extra, model.unknown
+    result = []
+    for ch in obs:
+        o = ord(ch) - HAN_FIRST
+        if 0 <= o < len(rows):
+            result.append(rows[o])
+        else:
+            result.append(extra.get(ch, unknown))
+    return result
+
+def _get_model():
+    global _model, start_P, trans_P
+    #載入後就不需要再上鎖
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if sys.platform.startswith("java"):
+                    start_p, trans_p, emit_p = load_model()
+                else:
+                    from .prob_start import P as start_p
+                    from .prob_trans import P as trans_p
+                    from .prob_emit import P as emit_p
+                    for name in ('prob_start', 'prob_trans', 'prob_emit'):
+                        sys.modules.pop('%s.%s' % (__name__, name), None)
+                        globals().pop(name, None)
+                #保留原本的模組層級名稱，讓直接讀取finalseg.start_P等的程式碼也能使用
+                start_P, trans_P = start_p, trans_p
+                _model = _compile_model(start_p, trans_p, emit_p)
+    return _model
+
 """
-if sys.platform.startswith("java"):
-    start_P, trans_P, emit_P = load_model()
-else:
-    from .prob_start import P as start_P
-    from .prob_trans import P as trans_P
-    from .prob_emit import P as emit_P
+由CompactModel重建原本的emit_P字典，只在有程式碼讀取finalseg.emit_P時才會用到。
+"""
+def _emit_dict(model):
+    emit_p = dict((y, {}) for y in STATES)
+    index = dict(model.extra)
+    for o, row in enumerate(model.rows):
+        if row != model.unknown:
+            index[unichr(HAN_FIRST + o)] = row
+    for ch, row in iteritems(index):
+        for i, y in enumerate(STATES):
+            prob = model.emit[row * 4 + i]
+            if prob != MIN_FLOAT:
+                emit_p[y][ch] = prob
+    return emit_p
+
+"""
+Python 3.7以上，讀取finalseg.start_P，trans_P或emit_P時，
+會經由模組層級的__getattr__觸發載入，emit_P則是由緊湊的模型重建後保存下來。
+"""
+def __getattr__(name):
+    global emit_P
+    if name in ('start_P', 'trans_P'):
+        _get_model()
+        return globals()[name]
+    if name == 'emit_P':
+        emit_P = _emit_dict(_get_model())
+        return emit_P
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
 """
 start_P:4個狀態的初始log機率
 {'B': -0.26268660809250016, #使用e^x換算回去，機率約為0.76
@@ -172,17 +290,186 @@ def viterbi(obs, states, start_p, trans_p, emit_p):
     #path[state]:終點是state的路徑
     return (prob, path[state])
 
+"""
+_viterbi是viterbi在CompactModel上的版本，結果與viterbi(obs, 'BMES', start_P, trans_P, emit_P)相同。
+不同之處在於：
+1. 每個字只查一次rows得到列編號，四個狀態的發射機率就在emit中相鄰的位置，
+   而不是對四個字典各做一次get。
+2. 每個狀態可能的前一個狀態只有兩個(見PrevStatus)，所以直接把四個狀態展開來寫，
+   省去建立list及呼叫max的成本。
+3. 每一步只記錄四個狀態各自的前一個狀態(backpointer)，最後再回溯，
+   而不是每一步都複製path[state] + [y]，那樣的成本是句長的平方。
+"""
+def _viterbi(obs, model):
+    start, trans, emit = model.start, model.trans, model.emit
+    rows = _rows(obs, model)
+    #轉移機率，tEB表示由E轉移到B，其它依此類推
+    tBE, tBM = trans[1], trans[2]
+    tEB, tES = trans[4], trans[7]
+    tME, tMM = trans[9], trans[10]
+    tSB, tSS = trans[12], trans[15]
+    r = rows[0] * 4
+    vB, vE, vM, vS = [start[i] + emit[r + i] for i in xrange(4)]
+    backs = []
+    for r in rows[1:]:
+        r *= 4
+        eB, eE, eM, eS = emit[r], emit[r + 1], emit[r + 2], emit[r + 3]
+        #B之前只可能是E或S，平手時與max相同，選擇較大的狀態
+        a, b = vE + tEB + eB, vS + tSB + eB
+        nB, pB = (a, 1) if a > b else (b, 3)
+        #E之前只可能是B或M
+        a, b = vB + tBE + eE, vM + tME + eE
+        nE, pE = (a, 0) if a > b else (b, 2)
+        #M之前只可能是B或M
+        a, b = vB + tBM + eM, vM + tMM + eM
+        nM, pM = (a, 0) if a > b else (b, 2)
+        #S之前只可能是E或S
+        a, b = vE + tES + eS, vS + tSS + eS
+        nS, pS = (a, 1) if a > b else (b, 3)
+        backs.append((pB, pE, pM, pS))
+        vB, vE, vM, vS = nB, nE, nM, nS
+    #最後一個狀態只能是E或S
+    prob, state = (vE, 1) if vE > vS else (vS, 3)
+    #由最後一個狀態沿著backpointer回溯
+    states = [state]
+    for back in reversed(backs):
+        state = back[state]
+        states.append(state)
+    states.reverse()
+    return prob, [STATES[y] for y in states]
+
+"""
+批次維特比算法
+
+一篇文檔裡通常有上千個未登錄詞緩衝區，逐一呼叫_viterbi時，每個都要付出Python層級的成本。
+_viterbi_batch一次解碼多個漢字區塊，有NumPy時改用_viterbi_numpy：
+把區塊依長度排序後分組，每組補齊成相同長度的矩陣，
+每一步對整組的所有區塊同時做_viterbi中的四個狀態的計算。
+區塊數少於NUMPY_MIN_BATCH，或是沒有安裝NumPy時，則逐一呼叫_viterbi。
+"""
+NUMPY_MIN_BATCH = 128
+#每組的區塊數乘上最長區塊的長度不超過NUMPY_CELLS，以限制backpointer矩陣的大小
+NUMPY_CELLS = 1 << 20
+
+def _viterbi_batch(blocks, model):
+    """
+    回傳blocks中每個區塊的狀態序列，與_viterbi(blk, model)[1]相同。
+    """
+    if np is None or len(blocks) < NUMPY_MIN_BATCH:
+        return [_viterbi(blk, model)[1] for blk in blocks]
+    return _viterbi_numpy(blocks, model)
+
+_numpy_model = None
+
+def _get_numpy_model(model):
+    """
+    由CompactModel建立NumPy陣列，直接共用array的記憶體，不必複製。
+    """
+    global _numpy_model
+    if _numpy_model is None or _numpy_model[0] is not model:
+        rows = np.frombuffer(model.rows, dtype=np.intc).astype(np.intp)
+        emit = np.frombuffer(model.emit, dtype=np.float64).reshape(-1, 4)
+        start = np.frombuffer(model.start, dtype=np.float64)
+        _numpy_model = (model, rows, emit, start)
+    return _numpy_model
+
+def _viterbi_numpy(blocks, model):
+    result = [None] * len(blocks)
+    lengths = [len(blk) for blk in blocks]
+    order = sorted(xrange(len(blocks)), key=lengths.__getitem__)
+    lo = 0
+    while lo < len(order):
+        #排序後，組內最後一個區塊最長
+        hi = lo + 1
+        while hi < len(order) and (hi - lo + 1) * lengths[order[hi]] <= NUMPY_CELLS:
+            hi += 1
+        group = order[lo:hi]
+        if len(group) < NUMPY_MIN_BATCH:
+            #很長的區塊只能分成很小的組，這時每一步的NumPy呼叫成本反而比較高
+            for i in group:
+                result[i] = _viterbi(blocks[i], model)[1]
+        else:
+            for i, states in zip(group, _viterbi_padded([blocks[i] for i in group], model)):
+                result[i] = states
+        lo = hi
+    return result
+
+def _viterbi_padded(seqs, model):
+    _, rows, emit, start = _get_numpy_model(model)
+    trans = model.trans
+    tBE, tBM = trans[1], trans[2]
+    tEB, tES = trans[4], trans[7]
+    tME, tMM = trans[9], trans[10]
+    tSB, tSS = trans[12], trans[15]
+    B = len(seqs)
+    lengths = np.array([len(seq) for seq in seqs], dtype=np.intp)
+    L = int(lengths.max())
+    #mask中每一列的前len(seq)個位置為True，依列優先的順序正好對應到所有區塊接起來的字
+    mask = np.arange(L) < lengths[:, None]
+    codes = np.frombuffer(''.join(seqs).encode('utf-32-le'), dtype='<u4').astype(np.intp) - HAN_FIRST
+    inside = (codes >= 0) & (codes < len(rows))
+    flat = np.where(inside, rows[np.where(inside, codes, 0)], model.unknown)
+    for k in np.nonzero(~inside)[0]:
+        flat[k] = model.extra.get(unichr(codes[k] + HAN_FIRST), model.unknown)
+    R = np.full((B, L), model.unknown, dtype=np.intp)
+    R[mask] = flat
+
+    e = emit[R[:, 0]]
+    v = start + e
+    vB, vE, vM, vS = v[:, 0], v[:, 1], v[:, 2], v[:, 3]
+    #backs[t - 1, b, y]是第b個區塊在時刻t位於狀態y時，時刻t-1最有可能的狀態
+    #超過區塊長度的時刻，backpointer指向自己，分數也維持不變
+    backs = np.empty((max(L - 1, 0), B, 4), dtype=np.int8)
+    for t in xrange(1, L):
+        e = emit[R[:, t]]
+        eB, eE, eM, eS = e[:, 0], e[:, 1], e[:, 2], e[:, 3]
+        active = t < lengths
+        back = backs[t - 1]
+        a, b = vE + tEB + eB, vS + tSB + eB
+        nB = np.where(a > b, a, b)
+        back[:, 0] = np.where(active, np.where(a > b, 1, 3), 0)
+        a, b = vB + tBE + eE, vM + tME + eE
+        nE = np.where(a > b, a, b)
+        back[:, 1] = np.where(active, np.where(a > b, 0, 2), 1)
+        a, b = vB + tBM + eM, vM + tMM + eM
+        nM = np.where(a > b, a, b)
+        back[:, 2] = np.where(active, np.where(a > b, 0, 2), 2)
+        a, b = vE + tES + eS, vS + tSS + eS
+        nS = np.where(a > b, a, b)
+        back[:, 3] = np.where(active, np.where(a > b, 1, 3), 3)
+        vB = np.where(active, nB, vB)
+        vE = np.where(active, nE, vE)
+        vM = np.where(active, nM, vM)
+        vS = np.where(active, nS, vS)
+    state = np.where(vE > vS, 1, 3).astype(np.intp)
+    states = np.empty((B, L), dtype=np.uint8)
+    states[:, L - 1] = state
+    index = np.arange(B)
+    for t in xrange(L - 1, 0, -1):
+        state = backs[t - 1][index, state].astype(np.intp)
+        states[:, t - 1] = state
+    #依列優先的順序取出mask中的位置，得到所有區塊的狀態序列接在一起的字串，再依長度切開
+    letters = np.frombuffer(STATES.encode('ascii'), dtype=np.uint8)[states[mask]]
+    letters = letters.tobytes().decode('ascii')
+    result = []
+    pos = 0
+    for n in lengths.tolist():
+        result.append(letters[pos:pos + n])
+        pos += n
+    return result
+
 """
 viterbi函數返回的是狀態序列及其機率值。在__cut函數中，調用了viterbi，並依據狀態序列來切分傳入的句子。
 要注意的是：__cut函數只能接受全是漢字的句子當作輸入。
 所以我們等一下會看到，它還會有一個wrapper，用來處理句子中包含英數字或其它符號的情況。
 """
-def __cut(sentence):
-    #為什麼只有emit_P是global?
-    global emit_P
-    # 向viterbi函數傳入觀察序列，可能狀態值以及三個矩陣
+def __cut(sentence, pos_list=None):
+    # 第一次呼叫時才載入模型，見_get_model
+    # 向_viterbi函數傳入觀察序列及緊湊的模型
     # 得到機率最大的狀態序列及其機率
-    prob, pos_list = viterbi(sentence, 'BMES', start_P, trans_P, emit_P)
+    # 批次解碼時，pos_list己經由_viterbi_batch算好
+    if pos_list is None:
+        prob, pos_list = _viterbi(sentence, _get_model())
     begin, nexti = 0, 0
     # print pos_list, sentence
     # 利用pos_list(即狀態序列)來切分sentence
@@ -229,6 +516,33 @@ re_skip = re.compile("([a-zA-Z0-9]+(?:\.\d+)?%?)")
 def add_force_split(word):
     global Force_Split_Words
     Force_Split_Words.add(word)
+    #強制切分的詞改變了，memo中的結果也就不再正確
+    memo.clear()
+
+"""
+未登錄詞的分詞結果快取
+同樣的未登錄詞(產品名稱，使用者名稱，音譯詞等)在語料中會一再出現，
+所以以一個LRU快取記錄傳入cut的字串到其分詞結果(tuple)的對應，最多保留MEMO_SIZE個。
+LRUCache內部有鎖，可以被多個執行緒同時使用。
+add_force_split及jieba.Tokenizer的字典被修改時都會清空它，
+memo_info可以查看命中，未命中及被淘汰的次數。
+"""
+MEMO_SIZE = 10000
+memo = LRUCache(MEMO_SIZE)
+
+def memo_info():
+    """
+    Return (hits, misses, evictions, maxsize, currsize) of the memo of
+    HMM segmentations.
+    """
+    return memo.info()
+
+def clear_memo():
+    memo.clear()
+
+def set_memo_size(maxsize):
+    global memo
+    memo = LRUCache(maxsize)
 
 """
 這是__cut函數的wrapper，它會把句中的漢字/非漢字的部份分離。
@@ -236,11 +550,48 @@ def add_force_split(word):
 """
 def cut(sentence):
     sentence = strdecode(sentence)
+    words = memo.get(sentence)
+    if words is None:
+        #先記下generation，分詞途中memo被清空的話結果就不會被存入
+        generation = memo.generation
+        words = tuple(_cut(sentence))
+        memo.put(sentence, words, generation)
+    return iter(words)
+
+"""
+cut_batch是cut的批次版本，回傳每個句子的分詞結果(list)。
+它先在memo中查找每個句子，找出其餘句子中的漢字區塊，交給_viterbi_batch一次解碼，再逐句組合結果。
+"""
+def cut_batch(sentences):
+    sentences = [strdecode(sentence) for sentence in sentences]
+    generation = memo.generation
+    results = {}
+    blocks = []
+    seen = set()
+    for sentence in sentences:
+        if sentence in results:
+            continue
+        results[sentence] = words = memo.get(sentence)
+        if words is None:
+            for blk in re_han.split(sentence):
+                if blk not in seen and re_han.match(blk):
+                    seen.add(blk)
+                    blocks.append(blk)
+    pos_lists = {}
+    if blocks:
+        pos_lists = dict(zip(blocks, _viterbi_batch(blocks, _get_model())))
+    for sentence, words in list(results.items()):
+        if words is None:
+            results[sentence] = words = tuple(_cut(sentence, pos_lists))
+            memo.put(sentence, words, generation)
+    return [list(results[sentence]) for sentence in sentences]
+
+def _cut(sentence, pos_lists=None):
     blocks = re_han.split(sentence)
     for blk in blocks:
         if re_han.match(blk):
             #呼叫__cut函數切分漢字
-            for word in __cut(blk):
+            for word in __cut(blk, None if pos_lists is None else pos_lists[blk]):
                 if word not in Force_Split_Words:
                     yield word
                 else:
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+每個Tokenizer(及POSTokenizer)自己的行程池
+
+jieba.enable_parallel只能讓模組層級的cut，cut_for_search及posseg.cut使用jieba.dt平行分詞，
+同一個服務中載入了不同字典的其它Tokenizer則無法使用它。
+Tokenizer.parallel及POSTokenizer.parallel會建立一個只屬於該物件的行程池：
+建立工作行程前，先把當下的字典快照(FREQ，包含使用者加入的詞及詞性)存成一個暫存檔，
+強制切分的詞(finalseg.Force_Split_Words)則記錄在它的標頭中，
+每個工作行程在初始化時以mmap開啟這個檔案(見DoubleArrayTrie.open)，
+所以工作行程不必重新讀取字典檔案，它們也共用同一份分頁快取。
+之後字典再被修改的話(FREQ換成了新的快照)，下一次呼叫時會先以新的快照重新建立工作行程。
+工作行程的狀態完全由初始化參數建立，不依賴fork時複製的記憶體。
+
+長的輸入與enable_parallel相同，以_balanced_split切成大小相近的片段後分給各個工作行程。
+"""
+from __future__ import absolute_import, unicode_literals
+import os
+import tempfile
+import threading
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+import jieba
+from . import finalseg
+from ._compat import *
+from .trie import DoubleArrayTrie
+
+"""
+原本的平行分詞以splitlines(True)把輸入切成一行一個工作：
+只有一行的長文件只能由一個工作行程處理，而由大量短行組成的文件則把時間都花在序列化每個工作上。
+_balanced_split改為把輸入切成大小相近的片段：每個工作行程約分到TASKS_PER_PROCESS個片段，
+讓先做完的行程可以再拿下一個，但每個片段至少有MIN_TASK_SIZE個字，最多MAX_TASK_SIZE個字。
+切開的位置只選在TASK_BREAKS(換行符及句末標點)之後：
+它們在精確模式及詞性標注中都不屬於任何漢字區塊，而且是被單獨切開的，所以分詞的結果不受影響。
+全模式下則不同：換行符不是re_skip_cut_all的分隔字元，會與前後的英數字接成同一個詞，所以只在句末標點
+(TASK_BREAKS_CUT_ALL)之後切開；re_skip_cut_all.split會丟棄分隔字元，在它之後切開時，如果下一個片段
+由非漢字開始，前一個片段的結果會在結尾多出一個空字串，_join_cut_all會去掉它。
+"""
+TASKS_PER_PROCESS = 4
+MIN_TASK_SIZE = 1 << 14
+MAX_TASK_SIZE = 1 << 20
+TASK_BREAKS = '\n。！？；!?;'
+TASK_BREAKS_CUT_ALL = '。！？；!?;'
+
+
+def _balanced_split(sentence, processnum, cut_all=False):
+    """
+    把sentence切成大小相近的片段，每個片段都在TASK_BREAKS(全模式下是TASK_BREAKS_CUT_ALL)中的一個字元之後結束。
+    先在目標大小的後半段中找最後一個切點，找不到時再往後找第一個切點，
+    整個剩下的部份都沒有切點的話就不再切開。
+    """
+    breaks = TASK_BREAKS_CUT_ALL if cut_all else TASK_BREAKS
+    N = len(sentence)
+    size = min(max(N // (processnum * TASKS_PER_PROCESS), MIN_TASK_SIZE), MAX_TASK_SIZE)
+    parts = []
+    start = 0
+    while N - start > size:
+        end = max(sentence.rfind(c, start + size // 2, start + size) for c in breaks)
+        if end < 0:
+            ends = [i for i in (sentence.find(c, start + size) for c in breaks) if i >= 0]
+            end = min(ends) if ends else N - 1
+        parts.append(sentence[start:end + 1])
+        start = end + 1
+    if start < N:
+        parts.append(sentence[start:])
+    return parts
+
+
+def _join_cut_all(parts, results):
+    """
+    接起全模式下各片段(由_balanced_split以cut_all=True切出)的分詞結果，
+    下一個片段由非漢字開始時，去掉前一個片段結尾多出的空字串。
+    """
+    for i, words in enumerate(results):
+        if i + 1 < len(parts) and not jieba.re_han_cut_all.match(parts[i + 1][0]):
+            words = words[:-1]
+        for w in words:
+            yield w
+
+
+#工作行程中的Tokenizer及POSTokenizer，由_init_worker建立，POSTokenizer則在第一次用到時才建立
+_worker = None
+_worker_pos = None
+
+
+def _init_worker(path, dictionary, automaton):
+    global _worker, _worker_pos
+    trie, meta = DoubleArrayTrie.open(path)
+    tokenizer = jieba.Tokenizer(dictionary, automaton)
+    tokenizer.FREQ = trie
+    tokenizer.initialized = True
+    for word in meta['force_split']:
+        finalseg.add_force_split(word)
+    _worker = tokenizer
+    _worker_pos = None
+
+
+def _call(args):
+    """
+    在工作行程中呼叫_worker(pos為True時是_worker_pos)的name方法，結果轉為list後傳回。
+    """
+    global _worker_pos
+    pos, name, text, kwargs = args
+    if pos:
+        if _worker_pos is None:
+            import jieba.posseg
+            _worker_pos = jieba.posseg.POSTokenizer(_worker)
+        target = _worker_pos
+    else:
+        target = _worker
+    return list(getattr(target, name)(text, **kwargs))
+
+
+def _chunks(iterable, size):
+    iterable = iter(iterable)
+    while True:
+        chunk = list(islice(iterable, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+class _Pool(object):
+    """
+    TokenizerPool及POSTokenizerPool共用的部份：管理工作行程及字典快照的暫存檔。
+    """
+
+    def __init__(self, tokenizer, processnum=None):
+        self.tokenizer = tokenizer
+        self.processnum = processnum or cpu_count()
+        self.pool = None
+        self.path = None
+        #工作行程所使用的字典快照
+        self._trie = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<%s tokenizer=%r processnum=%d>' % (
+            self.__class__.__name__, self.tokenizer, self.processnum)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get_pool(self):
+        """
+        回傳使用當前字典快照的multiprocessing.Pool，必要時(第一次或字典被修改後)才建立。
+        """
+        tokenizer = self.tokenizer
+        tokenizer.check_initialized()
+        with self._lock:
+            trie = tokenizer.FREQ
+            if self.pool is not None and trie is self._trie:
+                return self.pool
+            self._close()
+            fd, path = tempfile.mkstemp(prefix='jieba.', suffix='.pool', dir=tokenizer.tmp_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    trie.save(f, force_split=sorted(finalseg.Force_Split_Words))
+                self.pool = Pool(self.processnum, _init_worker,
+                                 (path, tokenizer.dictionary, tokenizer.automaton))
+            except Exception:
+                os.remove(path)
+                raise
+            self.path = path
+            self._trie = trie
+            return self.pool
+
+    def _split(self, sentence, cut_all=False):
+        return _balanced_split(strdecode(sentence), self.processnum, cut_all)
+
+    #片段己經是大小相近的了，所以每次只分派一個片段(chunksize=1)
+    def _map(self, pos, name, parts, **kwargs):
+        return self._get_pool().map(_call, [(pos, name, part, kwargs) for part in parts], 1)
+
+    def _imap(self, pos, name, parts, **kwargs):
+        return self._get_pool().imap(_call, ((pos, name, part, kwargs) for part in parts))
+
+    def _close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self._trie = None
+
+    def close(self):
+        """
+        Stop the worker processes and remove the dictionary snapshot file.
+        The pool is started again on the next call.
+        """
+        with self._lock:
+            self._close()
+
+
+class TokenizerPool(_Pool):
+    """
+    A process pool segmenting with the dictionary and user words of a
+    `jieba.Tokenizer`. Created by `Tokenizer.parallel`.
+    """
+
+    def cut(self, sentence, cut_all=False, HMM=True):
+        parts = self._split(sentence, cut_all)
+        results = self._map(False, 'cut', parts, cut_all=cut_all, HMM=HMM)
+        if cut_all:
+            results = [_join_cut_all(parts, results)]
+        for words in results:
+            for w in words:
+                yield w
+
+    def cut_for_search(self, sentence, HMM=True):
+        for words in self._map(False, 'cut_for_search', self._split(sentence), HMM=HMM):
+            for w in words:
+                yield w
+
+    def tokenize(self, unicode_sentence, mode="default", HMM=True):
+        if not isinstance(unicode_sentence, text_type):
+            raise ValueError("jieba: the input parameter should be unicode.")
+        parts = self._split(unicode_sentence)
+        #各工作行程回傳的位置是相對於各自片段的，這裡再加上片段的起點
+        start = 0
+        for part, tokens in zip(parts, self._map(False, 'tokenize', parts, mode=mode, HMM=HMM)):
+            for w, s, e in tokens:
+                yield (w, start + s, start + e)
+            start += len(part)
+
+    """
+    cut_batch把文檔以BATCH_CHUNK_SIZE個為一組分給工作行程，每組在工作行程中再以cut_batch分詞，
+    所以同一組中重複的文檔及區塊只需分詞一次。
+    """
+    def cut_batch(self, texts, cut_all=False, HMM=True, search=False):
+        for words_list in self._imap(False, 'cut_batch', _chunks(texts, jieba.BATCH_CHUNK_SIZE),
+                                     cut_all=cut_all, HMM=HMM, search=search):
+            for words in words_list:
+                yield words
+
+    def lcut(self, *args, **kwargs):
+        return list(self.cut(*args, **kwargs))
+
+    def lcut_for_search(self, *args, **kwargs):
+        return list(self.cut_for_search(*args, **kwargs))
+
+    def lcut_batch(self, *args, **kwargs):
+        return list(self.cut_batch(*args, **kwargs))
+
+
+class POSTokenizerPool(_Pool):
+    """
+    A process pool tagging with the dictionary and user words of a
+    `jieba.posseg.POSTokenizer`. Created by `POSTokenizer.parallel`.
+    """
+
+    def __init__(self, postokenizer, processnum=None):
+        _Pool.__init__(self, postokenizer.tokenizer, processnum)
+        self.postokenizer = postokenizer
+
+    def _beam(self, beam):
+        return self.postokenizer.beam if beam is None else beam
+
+    """
+    工作行程一律回傳(詞彙，詞性)的tuple，它們序列化的成本比pair低，在這裡才依as_tuples轉成pair。
+    """
+    def _pairs(self, words, as_tuples):
+        from .posseg import pair
+        if as_tuples:
+            return words
+        return [pair(word, flag) for word, flag in words]
+
+    def cut(self, sentence, HMM=True, beam=None, as_tuples=False):
+        for words in self._map(True, 'cut', self._split(sentence), HMM=HMM,
+                               beam=self._beam(beam), as_tuples=True):
+            for w in self._pairs(words, as_tuples):
+                yield w
+
+    def tokenize(self, unicode_sentence, mode="default", HMM=True, beam=None):
+        if not isinstance(unicode_sentence, text_type):
+            raise ValueError("jieba: the input parameter should be unicode.")
+        parts = self._split(unicode_sentence)
+        start = 0
+        for part, tokens in zip(parts, self._map(True, 'tokenize', parts, mode=mode, HMM=HMM,
+                                                 beam=self._beam(beam))):
+            for w, f, s, e in tokens:
+                yield (w, f, start + s, start + e)
+            start += len(part)
+
+    """
+    tag把tokens平均分成processnum份，每份在一個工作行程中以POSTokenizer.tag標注。
+    """
+    def tag(self, tokens, HMM=True, beam=None, as_tuples=False):
+        tokens = list(tokens)
+        size = max(1, -(-len(tokens) // self.processnum))
+        result = []
+        for words in self._map(True, 'tag', _chunks(tokens, size), HMM=HMM,
+                               beam=self._beam(beam), as_tuples=True):
+            result.extend(self._pairs(words, as_tuples))
+        return result
+
+    def cut_batch(self, texts, HMM=True, beam=None, as_tuples=False):
+        for words_list in self._imap(True, 'cut_batch', _chunks(texts, jieba.BATCH_CHUNK_SIZE),
+                                     HMM=HMM, beam=self._beam(beam), as_tuples=True):
+            for words in words_list:
+                yield self._pairs(words, as_tuples)
+
+    def lcut(self, *args, **kwargs):
+        return list(self.cut(*args, **kwargs))
+
+    def lcut_batch(self, *args, **kwargs):
+        return list(self.cut_batch(*args, **kwargs))
@@ -4,8 +4,11 @@ import re
 import sys
 import jieba
 import pickle
+import threading
+from functools import partial
 from .._compat import *
-from .viterbi import viterbi
+from .._lru import LRUCache
+from .viterbi import _viterbi, _compile_model
 
 PROB_START_P = "prob_start.p"
 PROB_TRANS_P = "prob_trans.p"
@@ -29,12 +32,24 @@ re_num = re.compile("[\.0-9]+")
 #長度為1的英數字
 re_eng1 = re.compile('^[a-zA-Z0-9]$', re.U)
 
+#每個POSTokenizer最多記住的未登錄詞標注結果數，見POSTokenizer.hmm_memo
+MEMO_SIZE = 10000
+
+def _check_beam(beam):
+    if beam is not None and beam < 1:
+        raise ValueError('jieba: beam width must be positive')
+    return beam
+
 """
 載入了HMM的參數
 包括初始機率向量，狀態轉移機率矩陣，發射機率矩陣及CHAR_STATE_TAB_P這個字典(它記錄各個漢字可能的狀態及詞性)
 
 如果是使用Jython的話，會需要用到load_model這個函數，裡面使用pickle這個模組來載入.p檔
 如果是使用純Python的話，直接使用from ... import ...即可
+
+這些字典常量匯入時要花上數秒，並佔用數十MB的記憶體，而__cut只需要編譯後的POSModel，
+所以它們不再在匯入時載入，只有在讀取posseg.char_state_tab_P等名稱，
+或是找不到編譯好的模型檔時，才由_load_dicts載入。
 """
 def load_model():
     # For Jython
@@ -45,19 +60,59 @@ def load_model():
     return state, start_p, trans_p, emit_p
 
 
-if sys.platform.startswith("java"):
-    char_state_tab_P, start_P, trans_P, emit_P = load_model()
-else:
-    from .char_state_tab import P as char_state_tab_P
-    from .prob_start import P as start_P
-    from .prob_trans import P as trans_P
-    from .prob_emit import P as emit_P
+def _load_dicts():
+    global char_state_tab_P, start_P, trans_P, emit_P
+    if sys.platform.startswith("java"):
+        char_state_tab_P, start_P, trans_P, emit_P = load_model()
+    else:
+        from .char_state_tab import P as char_state_tab_P
+        from .prob_start import P as start_P
+        from .prob_trans import P as trans_P
+        from .prob_emit import P as emit_P
+    return char_state_tab_P, start_P, trans_P, emit_P
+
+"""
+Python 3.7以上，讀取posseg.char_state_tab_P，start_P，trans_P或emit_P時，
+會經由模組層級的__getattr__觸發載入。
+"""
+def __getattr__(name):
+    if name in ('char_state_tab_P', 'start_P', 'trans_P', 'emit_P'):
+        _load_dicts()
+        return globals()[name]
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+"""
+__cut實際使用的是由上面的字典編譯成的POSModel(見viterbi.py)。
+套件中附有以model.py的格式存好的COMPILED_MODEL(以python -m jieba.posseg.model產生)，
+第一次用維特比算法標注時才以mmap載入，_model_lock確保只載入一次。
+模型檔不存在或格式不符(例如位元組順序不同)時，才退而載入字典常量並編譯。
+"""
+COMPILED_MODEL = "posseg.model"
+_model = None
+_model_lock = threading.Lock()
+
+def _get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from .model import open_model
+                path = os.path.join(os.path.dirname(os.path.abspath(__file__)), COMPILED_MODEL)
+                try:
+                    _model = open_model(path)
+                except (IOError, OSError, ValueError) as e:
+                    jieba.default_logger.debug("Compiling POS model: %s" % e)
+                    _model = _compile_model(*_load_dicts())
+    return _model
 
 """
 pair類別具有兩個屬性，分別是word及flag，它們代表詞彙本身及其詞性。
-在POSTokenizer中的__cut_DAG_NO_HMM及__cut_DAG函數中，將會把分詞結果及詞性標注結果打包成pair類別的物件後回傳。
+POSTokenizer內部的各個生成器只產生(詞彙，詞性)的tuple，cut在最後才把它們打包成pair類別的物件後回傳，
+以as_tuples=True呼叫時則直接回傳tuple，省下建立pair的成本。
+pair使用__slots__，每個物件不帶__dict__，可以節省記憶體及建立物件的時間。
 """
 class pair(object):
+    __slots__ = ('word', 'flag')
 
     def __init__(self, word, flag):
         self.word = word
@@ -90,40 +145,70 @@ class pair(object):
     def encode(self, arg):
         return self.__unicode__().encode(arg)
 
+    #有__slots__而沒有__dict__的物件在Python2中無法以舊的pickle協定序列化，平行分詞時需要它
+    def __reduce__(self):
+        return pair, (self.word, self.flag)
+
 """
 POSTokenizer類別中定義了__cut_DAG_NO_HMM及__cut_DAG函數，它們負責了詞性標注的核心算法。
 """
 class POSTokenizer(object):
 
-    def __init__(self, tokenizer=None):
+    def __init__(self, tokenizer=None, beam=None):
         # 它需要借用jieba.Tokenizer的get_dict_file, get_DAG, calc等函數
         # 所以這裡才會定義了tokenizer這個屬性
         self.tokenizer = tokenizer or jieba.Tokenizer()
-        # 這一句怎麼同時出現在__init__()及initialize()?
-        self.load_word_tag(self.tokenizer.get_dict_file())
+        #維特比算法的beam寬度，None表示不剪枝，見viterbi.py
+        self.beam = _check_beam(beam)
+        #未登錄詞緩衝區到其標注結果(由(詞彙，詞性)組成的tuple)的LRU快取，
+        #_memo_trie是建立這些結果時的字典快照，字典被修改後就會被清空
+        self.hmm_memo = LRUCache(MEMO_SIZE)
+        self._memo_trie = None
+        #原本這裡會以load_word_tag重新讀取整個字典檔案來建立word_tag_tab，
+        #現在詞性與詞頻一起存在字典樹(及其快取檔案)中，標注時直接由字典快照查詢
+        #_word_tag_tab是word_tag_tab由字典快照_word_tag_trie建立的dict
+        self._word_tag_tab = None
+        self._word_tag_trie = None
 
     def __repr__(self):
         return '<POSTokenizer tokenizer=%r>' % self.tokenizer
 
     def __getattr__(self, name):
-        if name in ('cut_for_search', 'lcut_for_search', 'tokenize'):
+        if name in ('cut_for_search', 'lcut_for_search'):
             # may be possible?
             raise NotImplementedError
-        # POSTokenizer並未實作cut_for_search, lcut_for_search, tokenize
+        # POSTokenizer並未實作cut_for_search, lcut_for_search
         # 其餘的功能如cut, lcut等有被POSTokenizer覆寫，所以可以使用
         return getattr(self.tokenizer, name)
 
     def initialize(self, dictionary=None):
         self.tokenizer.initialize(dictionary)
-        # 這一句怎麼同時出現在__init__()及initialize()?
-        self.load_word_tag(self.tokenizer.get_dict_file())
+
+    """
+    word_tag_tab原本是由字典檔案讀出的詞彙到詞性的字典，
+    現在詞性存在字典樹中，它只是為了相容而保留：
+    第一次讀取時由當前的字典快照建立一個dict，之後在字典被修改(FREQ換成新的快照)之前都回傳同一個dict。
+    標注時並不會用到它，所以修改回傳的dict不會改變詞性；
+    對word_tag_tab賦值則與load_word_tag相同，把其中己在字典中的詞的詞性寫入字典樹。
+    """
+    @property
+    def word_tag_tab(self):
+        self.tokenizer.check_initialized()
+        trie = self.tokenizer.FREQ
+        if trie is not self._word_tag_trie:
+            self._word_tag_tab = dict(trie.tag_items())
+            self._word_tag_trie = trie
+        return self._word_tag_tab
+
+    @word_tag_tab.setter
+    def word_tag_tab(self, tags):
+        self.tokenizer.check_initialized()
+        self.tokenizer._update_tags(tags)
 
     def load_word_tag(self, f):
-        #這個函數接受一個開啟的file object當作輸入，然後將它的內容讀到一個dict內
-        #即，從jieba/dict.txt中載入word_tag_tab
-        
-        #一個把詞彙對應到詞性的字典
-        self.word_tag_tab = {}
+        #這個函數接受一個開啟的file object當作輸入，讀取其中每個詞的詞性，
+        #再寫入self.tokenizer的字典樹中己有的詞
+        tags = {}
         f_name = resolve_filename(f)
         for lineno, line in enumerate(f, 1):
             try:
@@ -131,22 +216,17 @@ class POSTokenizer(object):
                 if not line:
                     continue
                 word, _, tag = line.split(" ")
-                self.word_tag_tab[word] = tag
+                tags[word] = tag
             except Exception:
                 raise ValueError(
                     'invalid POS dictionary entry in %s at Line %s: %s' % (f_name, lineno, line))
         f.close()
+        self.tokenizer._update_tags(tags)
 
     def makesure_userdict_loaded(self):
-        #如果使用者有自定義詞彙，那麼makesure_userdict_loaded函數會將它們加入word_tag_tab。
-        
-        #在使用者有用add_word增加新詞時self.tokenizer.user_word_tag_tab才會不為空
-        if self.tokenizer.user_word_tag_tab:
-            #參考https://www.programiz.com/python-programming/methods/dictionary/update
-            #字典1.update(字典2):如果字典2的key不在字典1中,則把該key加入字典1;
-            #如果字典2的key己經存在字典1中,則更新字典1中該key的值
-            self.word_tag_tab.update(self.tokenizer.user_word_tag_tab)
-            self.tokenizer.user_word_tag_tab = {}
+        #原本會把self.tokenizer.user_word_tag_tab中使用者自定義的詞性加入word_tag_tab，
+        #現在add_word及load_userdict會直接把詞性寫入字典樹，所以不需要做任何事，只為了相容而保留
+        pass
 
     """
     __cut會先呼叫viterbi這個函數，得到句中各字的分詞標籤及詞性。
@@ -154,11 +234,12 @@ class POSTokenizer(object):
     __cut是一個生成器，每次被呼叫時，就生成一對(詞彙，詞性)pair。
     注意__cut並未對英數字做特別處理，所以它跟viterbi函數一樣，只能處理sentence全是漢字的情況。
     """
-    def __cut(self, sentence):
+    def __cut(self, sentence, beam=None):
         #使用維特比算法找出最有可能的狀態序列pos_list及其機率prob
         #所謂狀態包含分詞標籤及詞性
-        prob, pos_list = viterbi(
-            sentence, char_state_tab_P, start_P, trans_P, emit_P)
+        #_viterbi的結果與viterbi(sentence, char_state_tab_P, start_P, trans_P, emit_P, beam)相同，
+        #但是在以整數表示狀態的POSModel上運算
+        prob, pos_list = _viterbi(sentence, _get_model(), beam)
         begin, nexti = 0, 0
 
         for i, char in enumerate(sentence):
@@ -169,27 +250,27 @@ class POSTokenizer(object):
             elif pos == 'E':
                 #到詞尾時yield出該詞彙
                 #pos_list[i][1]表示該詞的詞性，這裡以詞尾的詞性代表全詞的詞性
-                yield pair(sentence[begin:i + 1], pos_list[i][1])
+                yield (sentence[begin:i + 1], pos_list[i][1])
                 nexti = i + 1
             elif pos == 'S':
                 #單字成詞的情況下直接yield
-                yield pair(char, pos_list[i][1])
+                yield (char, pos_list[i][1])
                 nexti = i + 1
         #nexti記錄上個詞彙詞尾的後一個位置
         if nexti < len(sentence):
-            yield pair(sentence[nexti:], pos_list[nexti][1])
+            yield (sentence[nexti:], pos_list[nexti][1])
 
     """
     __cut_detail是__cut的wrapper，它與__cut同樣是一個會生成(詞彙，詞性)pair的生成器。
     但是它有對英數字做處理，並賦予它們詞性，所以它可以處理句中包含英數字的情況。
     """
-    def __cut_detail(self, sentence):
+    def __cut_detail(self, sentence, beam=None):
         #re_han_detail:一個或多個漢字
         blocks = re_han_detail.split(sentence)
         for blk in blocks:
             if re_han_detail.match(blk):
                 #如果該區段包含漢字，則直接使用__cut來切
-                for word in self.__cut(blk):
+                for word in self.__cut(blk, beam):
                     yield word
             else:
                 #非漢字的區段
@@ -201,26 +282,27 @@ class POSTokenizer(object):
                     if x:
                         if re_num.match(x):
                             #'m':數詞
-                            yield pair(x, 'm')
+                            yield (x, 'm')
                         elif re_eng.match(x):
                             #'eng':外語
-                            yield pair(x, 'eng')
+                            yield (x, 'eng')
                         else:
                             #'x':非語素字
-                            yield pair(x, 'x')
+                            yield (x, 'x')
     """
     此處代碼與jieba/__init__.py裡的__cut_DAG_NO_HMM雷同
     可以參考https://blog.csdn.net/keineahnung2345/article/details/86735757
     不同之處僅在於：
-    self.get_DAG及self.calc變成self.tokenizer.get_DAG及self.tokenizer.calc
+    self._get_DAG及self._calc變成self.tokenizer._get_DAG及self.tokenizer._calc，
+    而字典快照trie則是由__cut_internal傳入的self.tokenizer.FREQ
     if re_eng.match(l_word) and len(l_word) == 1:被改成了if re_eng1.match(l_word)
     yield的東西由一個詞彙變成一個pair
     """
-    def __cut_DAG_NO_HMM(self, sentence):
-        #__cut_DAG_NO_HMM是以匹配正則表達式re_eng1及查找字典self.word_tag_tab並用的方式來標注詞性。
-        DAG = self.tokenizer.get_DAG(sentence)
+    def __cut_DAG_NO_HMM(self, sentence, trie):
+        #__cut_DAG_NO_HMM是以匹配正則表達式re_eng1及查找字典樹trie中的詞性並用的方式來標注詞性。
+        DAG, LOGPROBS = self.tokenizer._get_DAG(sentence, trie)
         route = {}
-        self.tokenizer.calc(sentence, DAG, route)
+        self.tokenizer._calc(sentence, DAG, LOGPROBS, route)
         x = 0
         N = len(sentence)
         buf = ''
@@ -235,28 +317,42 @@ class POSTokenizer(object):
                 if buf:
                     #buf裡只有與re_eng1配對的字
                     #所以這裡可以將它的詞性設為英文
-                    yield pair(buf, 'eng')
+                    yield (buf, 'eng')
                     buf = ''
                 #如果字典裡沒有l_word，就把它的詞性當成'x'(未知)
-                yield pair(l_word, self.word_tag_tab.get(l_word, 'x'))
+                yield (l_word, trie.get_tag(l_word, 'x'))
                 x = y
         if buf:
             #buf裡只有與re_eng1配對的字
             #所以這裡可以將它的詞性設為英文
-            yield pair(buf, 'eng')
+            yield (buf, 'eng')
             buf = ''
 
+    """
+    __cut_oov是__cut_detail加上快取的版本，同樣的未登錄詞只需用維特比算法標注一次。
+    先記下generation，標注途中快取被清空的話結果就不會被存入。
+    不同的beam寬度可能得到不同的結果，所以快取的鍵是(buf, beam)。
+    """
+    def __cut_oov(self, buf, beam):
+        memo = self.hmm_memo
+        words = memo.get((buf, beam))
+        if words is None:
+            generation = memo.generation
+            words = tuple(self.__cut_detail(buf, beam))
+            memo.put((buf, beam), words, generation)
+        return words
+
     """
     此處的代碼邏輯與jieba/__init__.py裡的__cut_DAG函數類似。
     它會呼叫__cut_detail，而__cut_detail又會呼叫__cut。
     __cut_DAG這個函數是以查找字典為主，維特比算法(即呼叫__cut_detail)為輔的方式來找出詞首詞尾。
     它與之前的__cut_detail還有__cut一樣，都是生成器，每次生成一對(詞彙，詞性)pair。
     """
-    def __cut_DAG(self, sentence):
-        DAG = self.tokenizer.get_DAG(sentence)
+    def __cut_DAG(self, sentence, trie, beam=None):
+        DAG, LOGPROBS = self.tokenizer._get_DAG(sentence, trie)
         route = {}
 
-        self.tokenizer.calc(sentence, DAG, route)
+        self.tokenizer._calc(sentence, DAG, LOGPROBS, route)
 
         x = 0
         buf = ''
@@ -271,53 +367,76 @@ class POSTokenizer(object):
                 if buf:
                     if len(buf) == 1:
                         #單字詞
-                        yield pair(buf, self.word_tag_tab.get(buf, 'x'))
-                    elif not self.tokenizer.FREQ.get(buf):
+                        yield (buf, trie.get_tag(buf, 'x'))
+                    elif not trie.get(buf):
                         #如果是未記錄於FREQ裡的buf，就使用維特比算法來找出詞首詞尾
-                        recognized = self.__cut_detail(buf)
+                        recognized = self.__cut_oov(buf, beam)
                         for t in recognized:
                             yield t
                     else:
                         #如果buf存在於FREQ裡，則把它拆成多個單字詞?
                         for elem in buf:
-                            yield pair(elem, self.word_tag_tab.get(elem, 'x'))
+                            yield (elem, trie.get_tag(elem, 'x'))
                     buf = ''
                 #處理當前的多字詞
-                yield pair(l_word, self.word_tag_tab.get(l_word, 'x'))
+                yield (l_word, trie.get_tag(l_word, 'x'))
             x = y
 
         #用一樣的方式來處理殘留的buf
         if buf:
             if len(buf) == 1:
-                yield pair(buf, self.word_tag_tab.get(buf, 'x'))
-            elif not self.tokenizer.FREQ.get(buf):
-                recognized = self.__cut_detail(buf)
+                yield (buf, trie.get_tag(buf, 'x'))
+            elif not trie.get(buf):
+                recognized = self.__cut_oov(buf, beam)
                 for t in recognized:
                     yield t
             else:
                 for elem in buf:
-                    yield pair(elem, self.word_tag_tab.get(elem, 'x'))
+                    yield (elem, trie.get_tag(elem, 'x'))
+
+    """
+    __snapshot回傳要使用的字典快照，沒有傳入時使用當前的self.tokenizer.FREQ。
+    字典每次被修改都會發佈一個新的快照，所以快照不同就表示字典改變了，此時清空未登錄詞的快取。
+    """
+    def __snapshot(self, trie=None):
+        if trie is None:
+            self.tokenizer.check_initialized()
+            trie = self.tokenizer.FREQ
+        if trie is not self._memo_trie:
+            self._memo_trie = trie
+            self.hmm_memo.clear()
+        return trie
 
     """
     在以下代碼中，先依HMM這個參數來決定要使用__cut_DAG或__cut_DAG_NO_HMM，然後改以cut_blk來稱呼它。
     一開始用re_han_internal來將句子分割成可處理的及不可處理的部份。可處理的部份直接呼叫cut_blk，不可處理的部份則利用正則表達式匹配的方式來做詞性標注。
     """
-    def __cut_internal(self, sentence, HMM=True):
-        self.makesure_userdict_loaded()
+    def __cut_internal(self, sentence, HMM=True, memo=None, trie=None, beam=None):
+        #整個句子都使用同一個字典快照，見jieba.Tokenizer._update
+        trie = self.__snapshot(trie)
         sentence = strdecode(sentence)
         #re_han_internal:一個或多個中文或英數字或+#&._
         #能與re_han_internal匹配代表可以被__cut_DAG或__cut_DAG_NO_HMM處理
         blocks = re_han_internal.split(sentence)
         #決定要使用__cut_DAG或__cut_DAG_NO_HMM中的一個
+        #沒有指定beam時使用self.beam
         if HMM:
-            cut_blk = self.__cut_DAG
+            beam = self.beam if beam is None else _check_beam(beam)
+            cut_blk = lambda blk, trie: self.__cut_DAG(blk, trie, beam)
         else:
             cut_blk = self.__cut_DAG_NO_HMM
 
         for blk in blocks:
             #如果與re_han_internal相匹配，代表可被__cut_DAG及__cut_DAG_NO_HMM所處理
             if re_han_internal.match(blk):
-                for word in cut_blk(blk):
+                #memo由cut_batch傳入，記錄了同一批文檔中己處理過的區塊
+                if memo is None:
+                    words = cut_blk(blk, trie)
+                else:
+                    words = memo.get(blk)
+                    if words is None:
+                        words = memo[blk] = list(cut_blk(blk, trie))
+                for word in words:
                     yield word
             else:
                 #無法與re_han_internal匹配的blk
@@ -326,37 +445,43 @@ class POSTokenizer(object):
                 for x in tmp:
                     if re_skip_internal.match(x):
                         #換行字元及空白字元的詞性為'x'(未知)
-                        yield pair(x, 'x')
+                        yield (x, 'x')
                     else:
                         #非空白字元，檢查它是否為數字或英文
                         for xx in x:
                             if re_num.match(xx):
-                                yield pair(xx, 'm')
+                                yield (xx, 'm')
                             elif re_eng.match(x):
-                                yield pair(xx, 'eng')
+                                yield (xx, 'eng')
                             else:
-                                yield pair(xx, 'x')
+                                yield (xx, 'x')
 
     """
     __cut_internal(sentence)的wrapper，將其輸出由generator型別轉為list型別。
     """
-    def _lcut_internal(self, sentence):
-        return list(self.__cut_internal(sentence))
+    def _lcut_internal(self, sentence, beam=None, as_tuples=False):
+        return self.lcut(sentence, beam=beam, as_tuples=as_tuples)
     
     """
     __cut_internal(sentence, False)的wrapper，將其輸出由generator型別轉為list型別。
     """
-    def _lcut_internal_no_hmm(self, sentence):
-        return list(self.__cut_internal(sentence, False))
+    def _lcut_internal_no_hmm(self, sentence, as_tuples=False):
+        return self.lcut(sentence, False, as_tuples=as_tuples)
 
     """
     POSTokenizer的cut函數是__cut_internal函數的wrapper，
     接受的參數與__cut_internal一樣是sentence跟HMM。
     它會依據HMM來決定要調用__cut_DAG_NO_HMM，__cut_DAG中的一個。
+    beam是維特比算法的beam寬度，沒有給定時使用self.beam。
+    __cut_internal產生的是(詞彙，詞性)的tuple，as_tuples為False時才把它們轉成pair。
     """
-    def cut(self, sentence, HMM=True):
-        for w in self.__cut_internal(sentence, HMM=HMM):
-            yield w
+    def cut(self, sentence, HMM=True, beam=None, as_tuples=False):
+        if as_tuples:
+            for w in self.__cut_internal(sentence, HMM=HMM, beam=beam):
+                yield w
+        else:
+            for word, flag in self.__cut_internal(sentence, HMM=HMM, beam=beam):
+                yield pair(word, flag)
 
     """
     cut的wrapper，將其輸出由generator型別轉為list型別。
@@ -364,6 +489,127 @@ class POSTokenizer(object):
     def lcut(self, *args, **kwargs):
         return list(self.cut(*args, **kwargs))
 
+    """
+    批次詞性標注，與Tokenizer.cut_batch相同，
+    重複的文檔及區塊在同一次呼叫中只處理一次。
+    """
+    def cut_batch(self, texts, HMM=True, beam=None, as_tuples=False):
+        """
+        Tag an iterable of texts, yielding a list of pairs per text.
+        With `as_tuples=True` the lists hold plain (word, flag) tuples.
+        """
+        self.tokenizer.check_initialized()
+        trie = self.tokenizer.FREQ
+        memo = {}
+        documents = {}
+        for text in texts:
+            text = strdecode(text)
+            words = documents.get(text)
+            if words is None:
+                if len(memo) + len(documents) > jieba.BATCH_MEMO_SIZE:
+                    memo.clear()
+                    documents.clear()
+                words = documents[text] = list(self.__cut_internal(text, HMM, memo, trie, beam))
+            if as_tuples:
+                yield list(words)
+            else:
+                yield [pair(word, flag) for word, flag in words]
+
+    def lcut_batch(self, *args, **kwargs):
+        return list(self.cut_batch(*args, **kwargs))
+
+    """
+    tag為己經分好的詞標注詞性，不重新分詞，回傳的list與tokens一一對應。
+    字典中的詞直接查詢字典樹中的詞性；
+    未登錄詞先去除重複，每個不同的詞只用維特比算法標注一次(結果也會存入hmm_memo)，
+    維特比算法可能把它再切成幾個詞，這時與__cut相同，以詞尾的詞性代表全詞的詞性。
+    HMM為False或只有一個字的未登錄詞則與__cut_DAG_NO_HMM相同，英數字標為'eng'，其餘標為'x'。
+    """
+    def tag(self, tokens, HMM=True, beam=None, as_tuples=False):
+        """
+        Tag already segmented tokens without segmenting them again.
+
+        Returns a list with one pair (or (word, flag) tuple if `as_tuples`
+        is True) per token. Dictionary words get their dictionary tag;
+        unknown tokens are tagged by the HMM when `HMM` is True.
+        """
+        trie = self.__snapshot()
+        if HMM:
+            beam = self.beam if beam is None else _check_beam(beam)
+        tokens = [strdecode(w) for w in tokens]
+        flags = {}
+        for w in tokens:
+            if w in flags:
+                continue
+            if trie.get(w):
+                flags[w] = trie.get_tag(w, 'x')
+            elif HMM and len(w) > 1:
+                flags[w] = self.__cut_oov(w, beam)[-1][1]
+            elif re_eng.match(w):
+                flags[w] = 'eng'
+            else:
+                flags[w] = 'x'
+        if as_tuples:
+            return [(w, flags[w]) for w in tokens]
+        return [pair(w, flags[w]) for w in tokens]
+
+    """
+    tokenize與jieba.Tokenizer.tokenize相同，但在同一次分詞中一併標注詞性，
+    不必先以jieba.tokenize取得位置，再以cut取得詞性，把同一個句子切兩次。
+    search模式中的二字詞及三字詞一定存在於字典中，所以它們的詞性直接由字典樹查詢。
+    """
+    def tokenize(self, unicode_sentence, mode="default", HMM=True, beam=None):
+        """
+        Tokenize a sentence and yields tuples of (word, flag, start, end)
+
+        Parameter:
+            - sentence: the str(unicode) to be segmented.
+            - mode: "default" or "search", "search" is for finer segmentation.
+            - HMM: whether to use the Hidden Markov Model.
+            - beam: beam width of the HMM Viterbi search, see `cut`.
+        """
+        if not isinstance(unicode_sentence, text_type):
+            raise ValueError("jieba: the input parameter should be unicode.")
+        self.tokenizer.check_initialized()
+        # 切詞，標注及查找二字詞、三字詞都使用同一個字典快照
+        trie = self.tokenizer.FREQ
+        start = 0
+        for w, flag in self.__cut_internal(unicode_sentence, HMM=HMM, trie=trie, beam=beam):
+            width = len(w)
+            if mode != 'default' and width > 2:
+                # 與Tokenizer.tokenize相同，一次走三步來取得二字詞及三字詞的詞頻
+                grams = [trie.prefix_freqs(w, i, i + 3) for i in xrange(width - 1)]
+                for i in xrange(width - 1):
+                    if len(grams[i]) > 1 and grams[i][1]:
+                        gram = w[i:i + 2]
+                        yield (gram, trie.get_tag(gram, 'x'), start + i, start + i + 2)
+                if width > 3:
+                    for i in xrange(width - 2):
+                        if len(grams[i]) > 2 and grams[i][2]:
+                            gram = w[i:i + 3]
+                            yield (gram, trie.get_tag(gram, 'x'), start + i, start + i + 3)
+            yield (w, flag, start, start + width)
+            start += width
+
+    def parallel(self, processnum=None):
+        """
+        Return a `jieba.parallel.POSTokenizerPool` running `cut`,
+        `tokenize`, `tag` and `cut_batch` of this POSTokenizer in
+        `processnum` worker processes, see `jieba.Tokenizer.parallel`.
+        """
+        from ..parallel import POSTokenizerPool
+        return POSTokenizerPool(self, processnum)
+
+    def hmm_memo_info(self):
+        """
+        Return (hits, misses, evictions, maxsize, currsize) of the memo of
+        HMM-tagged unknown words.
+        """
+        return self.hmm_memo.info()
+
+    def clear_hmm_memo(self):
+        self.hmm_memo.clear()
+
 """
 此處基於上述定義的POSTokenizer及pair類別，定義了幾個全局的變數及函數。
 """
@@ -374,37 +620,49 @@ dt = POSTokenizer(jieba.dt)
 # global functions
 
 initialize = dt.initialize
+cut_batch = dt.cut_batch
+lcut_batch = dt.lcut_batch
+hmm_memo_info = dt.hmm_memo_info
+tokenize = dt.tokenize
+tag = dt.tag
+clear_hmm_memo = dt.clear_hmm_memo
 
 
-def _lcut_internal(s):
-    return dt._lcut_internal(s)
+def _lcut_internal(s, beam=None, as_tuples=False):
+    return dt._lcut_internal(s, beam, as_tuples)
 
 
-def _lcut_internal_no_hmm(s):
-    return dt._lcut_internal_no_hmm(s)
+def _lcut_internal_no_hmm(s, as_tuples=False):
+    return dt._lcut_internal_no_hmm(s, as_tuples)
 
 
-def cut(sentence, HMM=True):
+def cut(sentence, HMM=True, beam=None, as_tuples=False):
     """
     Global `cut` function that supports parallel processing.
 
-    Note that this only works using dt, custom POSTokenizer
-    instances are not supported.
+    Note that this only works using dt, use `POSTokenizer.parallel` for
+    custom POSTokenizer instances.
+
+    `beam` limits the HMM Viterbi search to the `beam` most probable
+    states per character; None (the default) uses `dt.beam`.
+
+    With `as_tuples=True` plain (word, flag) tuples are yielded instead
+    of `pair` objects.
     """
     global dt
     if jieba.pool is None:
-        for w in dt.cut(sentence, HMM=HMM):
+        for w in dt.cut(sentence, HMM=HMM, beam=beam, as_tuples=as_tuples):
             yield w
     else:
-        parts = strdecode(sentence).splitlines(True)
+        parts = jieba._split_parts(sentence)
         if HMM:
-            result = jieba.pool.map(_lcut_internal, parts)
+            result = jieba.pool.map(partial(_lcut_internal, beam=beam, as_tuples=as_tuples), parts, 1)
         else:
-            result = jieba.pool.map(_lcut_internal_no_hmm, parts)
+            result = jieba.pool.map(partial(_lcut_internal_no_hmm, as_tuples=as_tuples), parts, 1)
         for r in result:
             for w in r:
                 yield w
 
 
-def lcut(sentence, HMM=True):
-    return list(cut(sentence, HMM))
+def lcut(sentence, HMM=True, beam=None, as_tuples=False):
+    return list(cut(sentence, HMM, beam, as_tuples))
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# model.py裡定義了編譯後的詞性標注模型(POSModel)的二進位檔案格式
+from __future__ import absolute_import, unicode_literals
+import sys
+import json
+import mmap
+import struct
+from array import array
+from .._compat import *
+from .viterbi import POSModel, MIN_FLOAT
+
+"""
+二進位檔案格式：
+char_state_tab.py，prob_emit.py等字典常量在匯入時要花上數秒，並佔用數十MB的記憶體，
+所以POSModel可以用save_model存成一個二進位檔案，再用open_model以mmap的方式載入：
+  MAGIC(8 bytes)
+  標頭的長度(uint32，little endian)
+  標頭：以utf-8編碼的JSON，記錄了格式版本，位元組順序，狀態，各區段的位置及量化的參數
+  各區段：每個數組的原始內容，每個區段都對齊到8 bytes
+
+整數的數組(狀態編號，各列的起點等)直接以memoryview建立在mmap上，不必複製。
+機率的數組(start，pred_prob，emit_prob)則量化為16位元的整數：
+log機率都落在一個不大的範圍內(約-16到0)，所以把這個範圍均分成QUANT_MAX份，
+誤差不超過一份的一半(約1.2e-4)，檔案只需原本的四分之一。
+QUANT_MAX + 1這個值保留給MIN_FLOAT(不可能的初始狀態)。
+載入時再還原成array('d')，供_viterbi直接使用。
+"""
+
+MAGIC = b'JIEBAPOS'
+#檔案格式的版本，格式改變時必須遞增，舊版的檔案會被視為無效
+FORMAT_VERSION = 1
+#整數數組的名稱及型別
+INDEX_ARRAYS = (('has_next', 'b'), ('pred_start', 'i'), ('pred_state', 'H'),
+                ('rows', 'i'), ('cand_start', 'i'), ('cand_state', 'H'),
+                ('emit_start', 'i'), ('emit_state', 'H'))
+#量化為16位元整數的機率數組
+PROB_ARRAYS = ('start', 'pred_prob', 'emit_prob')
+QUANT_MAX = 0xFFFE
+
+
+def _quantize(values):
+    """
+    回傳(lo, scale, codes)，values[i]約等於lo + codes[i] * scale。
+    """
+    finite = [v for v in values if v > MIN_FLOAT]
+    lo = min(finite) if finite else 0.0
+    hi = max(finite) if finite else 0.0
+    scale = (hi - lo) / QUANT_MAX or 1.0
+    codes = array('H', [int(round((v - lo) / scale)) if v > MIN_FLOAT else QUANT_MAX + 1
+                        for v in values])
+    return lo, scale, codes
+
+
+def _dequantize(codes, lo, scale):
+    return array('d', [lo + code * scale if code <= QUANT_MAX else MIN_FLOAT for code in codes])
+
+
+def quantize_model(model):
+    """
+    回傳機率經過量化再還原的POSModel，與save_model後再open_model得到的模型有相同的機率。
+    """
+    probs = {}
+    for name in PROB_ARRAYS:
+        lo, scale, codes = _quantize(getattr(model, name))
+        probs[name] = _dequantize(codes, lo, scale)
+    return model._replace(**probs)
+
+
+def save_model(model, f):
+    """
+    把POSModel寫入一個以二進位模式開啟的檔案物件f。
+    """
+    tobytes = lambda a: a.tostring() if PY2 else a.tobytes()
+    sections = [(name, tobytes(array(typecode, getattr(model, name))))
+                for name, typecode in INDEX_ARRAYS]
+    quant = {}
+    for name in PROB_ARRAYS:
+        lo, scale, codes = _quantize(getattr(model, name))
+        quant[name] = [lo, scale]
+        sections.append((name, tobytes(codes)))
+    layout = {}
+    offset = 0
+    for name, data in sections:
+        layout[name] = [offset, len(data)]
+        offset += _align(len(data))
+    header = dict(version=FORMAT_VERSION, byteorder=sys.byteorder,
+                  itemsize=dict((typecode, array(typecode).itemsize)
+                                for _, typecode in INDEX_ARRAYS),
+                  states=[list(y) for y in model.states], extra=model.extra,
+                  unknown=model.unknown, quant=quant, sections=layout)
+    header = json.dumps(header, sort_keys=True).encode('utf-8')
+    f.write(MAGIC + struct.pack('<I', len(header)) + header)
+    f.write(b'\x00' * (_align(_header_size(header)) - _header_size(header)))
+    for name, data in sections:
+        f.write(data)
+        f.write(b'\x00' * (_align(len(data)) - len(data)))
+
+
+def open_model(path):
+    """
+    以mmap開啟save_model寫出的檔案，回傳POSModel。
+    Python2的memoryview不支援cast，所以退而把內容複製進array。
+    檔案格式不符時拋出ValueError。
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError('jieba: %s is not a compiled POS model' % path)
+    size = struct.unpack('<I', mm[len(MAGIC):len(MAGIC) + 4])[0]
+    header = mm[len(MAGIC) + 4:len(MAGIC) + 4 + size]
+    meta = json.loads(header.decode('utf-8'))
+    if (meta.get('version') != FORMAT_VERSION or meta['byteorder'] != sys.byteorder
+            or any(meta['itemsize'][typecode] != array(typecode).itemsize
+                   for _, typecode in INDEX_ARRAYS)):
+        raise ValueError('jieba: incompatible compiled POS model %s' % path)
+    start = _align(_header_size(header))
+    sections = dict((name, (start + offset, start + offset + length))
+                    for name, (offset, length) in iteritems(meta['sections']))
+
+    def section(name, typecode):
+        lo, hi = sections[name]
+        if PY2:
+            a = array(typecode)
+            a.fromstring(mm[lo:hi])
+            return a
+        return memoryview(mm)[lo:hi].cast(str(typecode))
+
+    fields = dict((name, section(name, typecode)) for name, typecode in INDEX_ARRAYS)
+    for name in PROB_ARRAYS:
+        fields[name] = _dequantize(section(name, 'H'), *meta['quant'][name])
+    fields['states'] = [tuple(y) for y in meta['states']]
+    fields['extra'] = meta['extra']
+    fields['unknown'] = meta['unknown']
+    #在Python3中，memoryview會讓mmap保持開啟，直到模型被回收
+    if PY2:
+        mm.close()
+    return POSModel(**fields)
+
+
+def _header_size(header):
+    return len(MAGIC) + 4 + len(header)
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+if __name__ == "__main__":
+    #由字典常量重新產生套件中的模型檔：python -m jieba.posseg.model
+    import os
+    from . import COMPILED_MODEL, _load_dicts
+    from .viterbi import _compile_model
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), COMPILED_MODEL)
+    with open(path, 'wb') as f:
+        save_model(_compile_model(*_load_dicts()), f)
@@ -1,5 +1,12 @@
 import sys
+import heapq
 import operator
+from array import array
+from collections import namedtuple
+try:
+    import numpy as np
+except ImportError:
+    np = None
 MIN_FLOAT = -3.14e100
 MIN_INF = float("-inf")
 
@@ -8,12 +15,15 @@ MIN_INF = float("-inf")
 if sys.version_info[0] > 2:
     xrange = range
 
-# 沒有被用到
-def get_top_states(t_state_v, K=4):
-    return sorted(t_state_v, key=t_state_v.__getitem__, reverse=True)[:K]
+# 回傳t_state_v中(或states這些候選狀態中)機率最大的K個狀態，供viterbi的beam search使用
+# heapq.nlargest的結果與sorted(...)[:K]相同，但只需O(N log K)的時間
+def get_top_states(t_state_v, K=4, states=None):
+    if states is None:
+        states = t_state_v
+    return heapq.nlargest(K, states, key=t_state_v.__getitem__)
 
 
-def viterbi(obs, states, start_p, trans_p, emit_p):
+def viterbi(obs, states, start_p, trans_p, emit_p, beam=None):
     """
     請參考李航書中的算法10.5(維特比算法)
     
@@ -25,6 +35,9 @@ def viterbi(obs, states, start_p, trans_p, emit_p):
     這是一個用來查詢漢字可能狀態的字典
 
     此處沿用李航書中的符號，令T=len(obs)，令N=len(trans_p.keys())
+
+    beam不為None時，每個時間點只保留機率最大的beam個狀態來遞推(beam search)，
+    每一步的成本由N乘N降為beam乘N，但找到的不一定是機率最大的路徑
     """
     
     """
@@ -53,11 +66,14 @@ def viterbi(obs, states, start_p, trans_p, emit_p):
     for t in xrange(1, len(obs)):
         V.append({})
         mem_path.append({})
-        #prev_states = get_top_states(V[t-1])
         #mem_path[t - 1].keys(): 前一個時間點在什麼狀態，這裡以x代表
         #只有在len(trans_p[x])>0(即x有可能轉移到其它狀態)的情況下，prev_states才保留x
         prev_states = [
             x for x in mem_path[t - 1].keys() if len(trans_p[x]) > 0]
+        #使用beam search時只保留其中機率最大的beam個狀態
+        #(256個狀態中有93個沒有任何轉移，所以要先過濾再選取，否則可能一個都不剩)
+        if beam is not None and len(prev_states) > beam:
+            prev_states = get_top_states(V[t - 1], beam, prev_states)
 
         #前一個狀態是x(prev_states中的各狀態)，那麼現在可能在什麼狀態(y)
         prev_states_expect_next = set(
@@ -112,3 +128,214 @@ def viterbi(obs, states, start_p, trans_p, emit_p):
         state = mem_path[i][state]
         i -= 1
     return (prob, route)
+
+
+"""
+POSModel：以整數表示狀態的緊湊模型，由_compile_model從上面viterbi所用的字典建立
+viterbi每一步都要重新建立prev_states，prev_states_expect_next及obs_states這些集合，
+並以('B', 'n')這樣的tuple當作字典的鍵，而_viterbi則直接在以下的array上運算：
+
+states：依大小排序的狀態tuple，狀態的整數編號就是它在這個list中的位置，
+        所以比較(機率，編號)時平手的處理方式與viterbi比較(機率，狀態)時相同
+start：每個狀態的初始log機率
+has_next：狀態是否有可能轉移到其它狀態(256個狀態中有93個沒有)
+pred_start，pred_state，pred_prob：轉移機率的稀疏矩陣，依目標狀態y分列，
+        pred_state[pred_start[y]:pred_start[y + 1]]是可以轉移到y的狀態(由小到大)，
+        pred_prob是對應的log機率
+rows：U+4E00到U+9FD5每個字的列編號，extra是其它範圍的字元到列編號的字典，
+      unknown是模型中沒有的字使用的列編號
+cand_start，cand_state：每一列的候選狀態，即char_state_tab_P中該字可能的狀態，
+        沒有記錄在char_state_tab_P中的字候選狀態為空，表示所有狀態都可能
+emit_start，emit_state，emit_prob：每一列的發射機率，只記錄不是MIN_FLOAT的狀態
+        (emit_P中有些字不在char_state_tab_P中，所以候選狀態及發射機率要分開記錄)
+"""
+POSModel = namedtuple('POSModel', [
+    'states', 'start', 'has_next', 'pred_start', 'pred_state', 'pred_prob',
+    'rows', 'extra', 'unknown', 'cand_start', 'cand_state', 'emit_start', 'emit_state', 'emit_prob'])
+HAN_FIRST, HAN_LAST = 0x4E00, 0x9FD5
+
+
+def _compile_model(char_state_tab, start_p, trans_p, emit_p):
+    states = sorted(trans_p)
+    index = dict((y, i) for i, y in enumerate(states))
+    start = array('d', [start_p[y] for y in states])
+    has_next = array('b', [bool(trans_p[y]) for y in states])
+    preds = [[] for y in states]
+    for y0 in states:
+        for y, prob in trans_p[y0].items():
+            preds[index[y]].append((index[y0], prob))
+    pred_start, pred_state, pred_prob = array('i', [0]), array('H'), array('d')
+    for pred in preds:
+        for x, prob in sorted(pred):
+            pred_state.append(x)
+            pred_prob.append(prob)
+        pred_start.append(len(pred_state))
+
+    emits = {}
+    for y in states:
+        for ch, prob in emit_p[y].items():
+            emits.setdefault(ch, []).append((index[y], prob))
+    chars = sorted(set(char_state_tab) | set(emits))
+    unknown = len(chars)
+    rows = array('i', [unknown]) * (HAN_LAST - HAN_FIRST + 1)
+    extra = {}
+    cand_start, cand_state = array('i', [0]), array('H')
+    emit_start, emit_state, emit_prob = array('i', [0]), array('H'), array('d')
+    for row, ch in enumerate(chars):
+        if HAN_FIRST <= ord(ch) <= HAN_LAST:
+            rows[ord(ch) - HAN_FIRST] = row
+        else:
+            extra[ch] = row
+        cand_state.extend(sorted(index[y] for y in char_state_tab.get(ch, ())))
+        cand_start.append(len(cand_state))
+        for y, prob in sorted(emits.get(ch, ())):
+            emit_state.append(y)
+            emit_prob.append(prob)
+        emit_start.append(len(emit_state))
+    #unknown這一列沒有候選狀態也沒有發射機率
+    cand_start.append(len(cand_state))
+    emit_start.append(len(emit_state))
+    return POSModel(states, start, has_next, pred_start, pred_state, pred_prob,
+                    rows, extra, unknown, cand_start, cand_state, emit_start, emit_state, emit_prob)
+
+
+def _row(ch, model):
+    o = ord(ch) - HAN_FIRST
+    if 0 <= o < len(model.rows):
+        return model.rows[o]
+    return model.extra.get(ch, model.unknown)
+
+
+def _viterbi(obs, model, beam=None):
+    """
+    與viterbi(obs, char_state_tab_P, start_P, trans_P, emit_P, beam)相同的結果，
+    但在POSModel上運算。
+    有NumPy時改由_viterbi_numpy計算。
+    """
+    if np is not None:
+        return _viterbi_numpy(obs, model, beam)
+    states, start, has_next = model.states, model.start, model.has_next
+    pred_start, pred_state, pred_prob = model.pred_start, model.pred_state, model.pred_prob
+    cand_start, cand_state = model.cand_start, model.cand_state
+    emit_start, emit_state, emit_prob = model.emit_start, model.emit_state, model.emit_prob
+    all_states = range(len(states))
+
+    def emissions(ch):
+        row = _row(ch, model)
+        lo, hi = emit_start[row], emit_start[row + 1]
+        emit = dict(zip(emit_state[lo:hi], emit_prob[lo:hi]))
+        lo, hi = cand_start[row], cand_start[row + 1]
+        return emit, (cand_state[lo:hi] if lo < hi else all_states)
+
+    emit, cands = emissions(obs[0])
+    V = dict((y, start[y] + emit.get(y, MIN_FLOAT)) for y in cands)
+    mem_path = []
+    for t in xrange(1, len(obs)):
+        #prev相當於viterbi中的prev_states
+        prev = dict((x, V[x]) for x in V if has_next[x])
+        #beam search在機率平手時保留編號較小的狀態：prev依編號由小到大排列，而heapq.nlargest是穩定的
+        if beam is not None and len(prev) > beam:
+            prev = dict((x, prev[x]) for x in get_top_states(prev, beam, sorted(prev)))
+        emit, cands = emissions(obs[t])
+        #不能由prev中任何狀態轉移到的候選狀態不在prev_states_expect_next中，所以不會出現在V裡
+        #如果候選狀態都被排除了，就改為考慮所有狀態，相當於viterbi中的prev_states_expect_next
+        for ys in (cands, all_states):
+            V = {}
+            back = {}
+            for y in ys:
+                e = emit.get(y, MIN_FLOAT)
+                best = None
+                for i in xrange(pred_start[y], pred_start[y + 1]):
+                    x = pred_state[i]
+                    if x in prev:
+                        prob = prev[x] + pred_prob[i] + e
+                        #pred_state由小到大排列，用>=在平手時選擇編號較大的狀態，與max相同
+                        if best is None or prob >= best:
+                            best, state = prob, x
+                if best is not None:
+                    V[y] = best
+                    back[y] = state
+            if V:
+                break
+        mem_path.append(back)
+    prob, state = max((V[y], y) for y in V)
+    route = [state]
+    for back in reversed(mem_path):
+        state = back[state]
+        route.append(state)
+    route.reverse()
+    return (prob, [states[y] for y in route])
+
+
+_numpy_model = None
+
+
+def _get_numpy_model(model):
+    """
+    由POSModel建立NumPy所用的陣列：
+    trans是稠密的轉移矩陣，trans[y, x]是由狀態x轉移到y的log機率，沒有轉移的位置是-inf，
+    每一步只取出候選狀態的那幾列及前一個時間點存在的狀態的那幾行
+    """
+    global _numpy_model
+    if _numpy_model is None or _numpy_model[0] is not model:
+        N = len(model.states)
+        trans = np.full((N, N), MIN_INF)
+        pred_start = np.frombuffer(model.pred_start, dtype=np.intc)
+        targets = np.repeat(np.arange(N), np.diff(pred_start))
+        trans[targets, np.frombuffer(model.pred_state, dtype=np.uint16)] = np.frombuffer(model.pred_prob)
+        start = np.frombuffer(model.start)
+        has_next = np.frombuffer(model.has_next, dtype=np.int8).astype(bool)
+        _numpy_model = (model, trans, start, has_next)
+    return _numpy_model
+
+
+def _viterbi_numpy(obs, model, beam=None):
+    _, trans, start, has_next = _get_numpy_model(model)
+    N = len(model.states)
+    cand_start, cand_state = model.cand_start, model.cand_state
+    emit_start, emit_state, emit_prob = model.emit_start, model.emit_state, model.emit_prob
+    all_states = np.arange(N)
+
+    def emissions(ch):
+        row = _row(ch, model)
+        emit = np.full(N, MIN_FLOAT)
+        lo, hi = emit_start[row], emit_start[row + 1]
+        emit[np.array(emit_state[lo:hi], dtype=np.intp)] = emit_prob[lo:hi]
+        lo, hi = cand_start[row], cand_start[row + 1]
+        return emit, (np.array(cand_state[lo:hi], dtype=np.intp) if lo < hi else all_states)
+
+    #V中不存在的狀態以-inf表示
+    emit, cands = emissions(obs[0])
+    V = np.full(N, MIN_INF)
+    V[cands] = start[cands] + emit[cands]
+    mem_path = []
+    for t in xrange(1, len(obs)):
+        #prev是前一個時間點存在且有可能轉移到其它狀態的狀態(由小到大)，相當於viterbi中的prev_states
+        prev = np.flatnonzero(has_next & (V > MIN_INF))
+        #與_viterbi相同，在機率平手時保留編號較小的狀態，所以要用穩定的排序而不是argpartition
+        if beam is not None and len(prev) > beam:
+            prev = np.sort(prev[np.argsort(-V[prev], kind='stable')[:beam]])
+        emit, cands = emissions(obs[t])
+        for ys in (cands, all_states):
+            # scores[i, j]是由狀態prev[j]轉移到ys[i]的路徑的log機率
+            scores = (V.take(prev) + trans.take(ys, 0).take(prev, 1)) + emit.take(ys)[:, None]
+            #反過來找第一個最大值，平手時就會選擇編號較大的狀態，與max相同
+            state = prev[(len(prev) - 1) - scores[:, ::-1].argmax(axis=1)]
+            best = scores.max(axis=1)
+            alive = best > MIN_INF
+            if alive.any():
+                break
+        V = np.full(N, MIN_INF)
+        V[ys[alive]] = best[alive]
+        back = np.zeros(N, dtype=np.intp)
+        back[ys[alive]] = state[alive]
+        mem_path.append(back)
+    state = (N - 1) - int(V[::-1].argmax())
+    prob = float(V[state])
+    route = [state]
+    for back in reversed(mem_path):
+        state = int(back[state])
+        route.append(state)
+    route.reverse()
+    states = model.states
+    return (prob, [states[y] for y in route])
@@ -0,0 +1,702 @@
+from __future__ import absolute_import, unicode_literals
+import sys
+import json
+import mmap
+import struct
+from math import log
+from array import array
+from ._compat import *
+
+"""
+雙數組字典樹(Double-Array Trie)
+
+原本的前綴字典是一個Python dict，它不僅記錄了字典裡的每個詞，
+還把每個詞的所有前綴都當成詞頻為0的鍵存進去，
+get_DAG則是靠sentence[k:i+1]這樣的切片加上hash查找來逐字擴展。
+
+這裡改用雙數組字典樹來儲存字典：
+字典樹的每個節點對應一個前綴，節點的編號就是它在各個數組中的索引。
+base及check兩個數組描述了節點之間的轉移：
+  對於節點s及轉移編號u，t = base[s] + u
+  如果check[t] == s，則t就是s經過u到達的子節點，否則s沒有這條邊
+freq則記錄了每個節點（即每個前綴）的詞頻，不成詞的前綴詞頻為0。
+logfreq是預先算好的log(freq or 1)，
+分詞時的動態規劃只需要查表及做加法，不必對每條邊重新呼叫log。
+它與freq一起在建構及新增詞彙時更新。
+
+tag記錄了每個詞的詞性在tagnames中的編號，0表示沒有詞性。
+詞性與詞頻存在同一個快照及快取檔案裡，詞性標注時不必再重新讀取字典檔案。
+
+child及sibling兩個數組只在新增節點（add_word）時使用，
+用來列舉一個節點的所有子節點：
+  child[s]是節點s第一個子節點的轉移編號(沒有子節點時為0)
+  sibling[t]是節點t的下一個兄弟節點的轉移編號(沒有時為0)
+
+節點0是根節點，check中的-1表示該位置尚未被使用。
+
+字元編號：
+漢字有上萬個，如果直接用字元的排名當作轉移編號，
+一個節點的子節點就可能散落在上萬個位置的範圍內，數組會變得非常稀疏。
+所以這裡把字元依出現次數排名：
+  排名前SINGLE的字元只需一步轉移，編號為1 ~ SINGLE
+  其餘的字元拆成兩步轉移，先走一個HIGH區間的編號，再走一個LOW區間的編號
+如此一來任何節點的子節點編號都落在一個不到一千的範圍內。
+只走了第一步的中間節點不對應任何前綴，它們不會被計入nodes，詞頻也恆為0。
+
+二進位檔案格式：
+字典樹可以用save存成一個二進位檔案，再用open以mmap的方式直接在檔案上查詢，
+不必像marshal一樣把整個檔案反序列化成Python物件，冷啟動只需要幾毫秒，
+而且多個行程載入同一個檔案時，會共用作業系統的page cache。
+檔案的結構如下：
+  MAGIC(8 bytes)
+  標頭的長度(uint32，little endian)
+  標頭：以utf-8編碼的JSON，記錄了格式版本，位元組順序，各區段的位置及其它資訊
+  各區段：base，check，freq，logfreq，child，sibling，tag這幾個數組的原始內容，以及alphabet的字元，
+  每個區段都對齊到8 bytes
+詞性的名稱(tagnames)則記錄在標頭裡。
+"""
+
+ROOT = 0
+FREE = -1
+
+SINGLE = 128
+HIGH = 512
+LOW = 256
+#所有轉移編號中最大的一個
+MAX_UNIT = SINGLE + HIGH + LOW
+#尋找空位時，在空隙中最多嘗試幾次，之後就直接使用數組末端的空位
+MAX_TRIALS = 256
+
+#一次插入的詞數乘上REBUILD_RATIO超過現有的節點數時，update會重新建構整棵字典樹
+REBUILD_RATIO = 8
+
+MAGIC = b'JIEBADAT'
+#檔案格式的版本，格式改變時必須遞增，舊版的檔案會被視為無效
+FORMAT_VERSION = 3
+#各數組的名稱及型別
+ARRAYS = (('base', 'i'), ('check', 'i'), ('freq', 'q'), ('logfreq', 'd'),
+          ('child', 'i'), ('sibling', 'i'), ('tag', 'H'))
+
+
+def _unit_code(rank):
+    """
+    把字元的排名（由0開始）轉成alphabet中儲存的編號。
+    需要兩步轉移的字元，其編號為(第一步 << 16) | 第二步。
+    """
+    if rank < SINGLE:
+        return rank + 1
+    rank -= SINGLE
+    if rank >= HIGH * LOW:
+        raise ValueError('jieba: too many distinct characters in dictionary')
+    return ((SINGLE + 1 + rank // LOW) << 16) | (SINGLE + HIGH + 1 + rank % LOW)
+
+
+def _unit_rank(code):
+    if code <= SINGLE:
+        return code - 1
+    return SINGLE + ((code >> 16) - SINGLE - 1) * LOW + (code & 0xffff) - SINGLE - HIGH - 1
+
+
+class DoubleArrayTrie(object):
+    """
+    以雙數組實現的前綴字典。
+
+    為了與原本的FREQ字典相容，它提供了get，in，[]及len等操作，
+    其語義也與原本的FREQ相同：
+    所有詞的前綴都"在"字典裡，只是詞頻為0。
+    """
+
+    def __init__(self, words=None, tags=None):
+        #字元到字元編號的對應
+        self.alphabet = {}
+        self.base = array('i', [0])
+        self.check = array('i', [-2])
+        self.freq = array('q', [0])
+        self.logfreq = array('d', [0.0])
+        self.child = array('i', [0])
+        self.sibling = array('i', [0])
+        self.tag = array('H', [0])
+        #詞性編號到詞性的對應，編號0表示沒有詞性
+        self.tagnames = [None]
+        #節點總數，不含根節點及中間節點
+        self.nodes = 0
+        #字典中最長的詞的長度
+        self.maxlen = 0
+        #所有詞的詞頻總和，由Tokenizer維護
+        self.total = 0
+        #快照的版本，每次由copy產生新的快照時遞增
+        self.version = 0
+        #used[t]為1表示位置t己被占用，在新增節點時才會用到
+        self._used = None
+        #由open載入時，各數組是建立在這個mmap上的唯讀memoryview
+        self._mmap = None
+        self._resize(MAX_UNIT + 1)
+        if words:
+            self.build(words, tags)
+
+    def __repr__(self):
+        return '<DoubleArrayTrie nodes=%d>' % self.nodes
+
+    """
+    以下是與dict相容的介面
+    """
+    def __len__(self):
+        return self.nodes
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __getitem__(self, word):
+        s = self.find(word)
+        if s < 0:
+            raise KeyError(word)
+        return self.freq[s]
+
+    def __setitem__(self, word, freq):
+        self.insert(word, freq)
+
+    def get(self, word, default=None):
+        s = self.find(word)
+        if s < 0:
+            return default
+        return self.freq[s]
+
+    def __iter__(self):
+        for word, _ in self.iteritems():
+            yield word
+
+    def iteritems(self):
+        """
+        以深度優先的順序列舉所有前綴（包括詞頻為0的前綴）及它們的詞頻。
+        """
+        freq = self.freq
+        for word, t in self._walk():
+            yield word, freq[t]
+
+    items = iteritems
+
+    def get_tag(self, word, default=None):
+        """
+        回傳word的詞性，沒有記錄詞性時回傳default。
+        """
+        s = self.find(word)
+        if s < 0 or not self.tag[s]:
+            return default
+        return self.tagnames[self.tag[s]]
+
+    def set_tag(self, word, tag):
+        """
+        設定word的詞性，word必須己經在字典樹中。
+        """
+        s = self.find(word)
+        if s < 0:
+            raise KeyError(word)
+        self._make_writable()
+        self._set_tag(s, tag)
+
+    def tag_items(self):
+        """
+        列舉所有有詞性的詞及其詞性。
+        """
+        tag, tagnames = self.tag, self.tagnames
+        for word, t in self._walk():
+            if tag[t]:
+                yield word, tagnames[tag[t]]
+
+    def _walk(self):
+        """
+        以深度優先的順序列舉所有前綴及它們所在的節點。
+        """
+        chars = self.chars()
+        base, child, sibling = self.base, self.child, self.sibling
+        #stack中的high不為0時，表示節點s是走了第一步的中間節點
+        stack = [(ROOT, '', 0)]
+        while stack:
+            s, prefix, high = stack.pop()
+            u = child[s]
+            while u:
+                t = base[s] + u
+                if SINGLE < u <= SINGLE + HIGH:
+                    stack.append((t, prefix, u))
+                else:
+                    word = prefix + chars[_unit_rank((high << 16) | u if high else u)]
+                    yield word, t
+                    stack.append((t, word, 0))
+                u = sibling[t]
+
+    def chars(self):
+        """
+        回傳一個由字元排名對應到字元的list。
+        """
+        chars = [''] * len(self.alphabet)
+        for ch, code in iteritems(self.alphabet):
+            chars[_unit_rank(code)] = ch
+        return chars
+
+    """
+    查找
+    """
+    def find(self, word, s=ROOT):
+        """
+        由節點s開始沿著word逐字往下走，回傳最後到達的節點。
+        如果中途走不下去，則回傳-1。
+        """
+        alphabet, base, check = self.alphabet, self.base, self.check
+        for ch in word:
+            u = alphabet.get(ch)
+            if u is None:
+                return -1
+            if u > 0xffff:
+                t = base[s] + (u >> 16)
+                if check[t] != s:
+                    return -1
+                s = t
+                u &= 0xffff
+            t = base[s] + u
+            if check[t] != s:
+                return -1
+            s = t
+        return s
+
+    def prefix_freqs(self, sentence, start=0, end=None):
+        """
+        由sentence[start]開始逐字往下走，
+        回傳一個list，其第i個元素是sentence[start:start+i+1]的詞頻。
+        字典裡沒有的前綴不會出現在list中，所以list的長度就是能走的步數。
+        """
+        freq = self.freq
+        return [freq[s] for s in self.prefix_nodes(sentence, start, end)]
+
+    def prefix_nodes(self, sentence, start=0, end=None):
+        """
+        與prefix_freqs相同，只是回傳的是各前綴所在的節點。
+        """
+        alphabet, base, check = self.alphabet, self.base, self.check
+        if end is None or end > len(sentence):
+            end = len(sentence)
+        s = ROOT
+        nodes = []
+        for i in xrange(start, end):
+            u = alphabet.get(sentence[i])
+            if u is None:
+                break
+            if u > 0xffff:
+                t = base[s] + (u >> 16)
+                if check[t] != s:
+                    break
+                s = t
+                u &= 0xffff
+            t = base[s] + u
+            if check[t] != s:
+                break
+            s = t
+            nodes.append(s)
+        return nodes
+
+    """
+    建構
+    """
+    def _units(self, word):
+        """
+        把word轉成轉移編號的list，字典裡沒有的字元會被加進alphabet。
+        """
+        alphabet = self.alphabet
+        units = []
+        for ch in word:
+            u = alphabet.get(ch)
+            if u is None:
+                u = alphabet[ch] = _unit_code(len(alphabet))
+            if u > 0xffff:
+                units.append(u >> 16)
+                u &= 0xffff
+            units.append(u)
+        return units
+
+    def build(self, words, tags=None):
+        """
+        由(詞彙，詞頻)的集合一次性地建構整棵字典樹。
+
+        words可以是一個dict或是(詞彙，詞頻)的序列，tags是詞彙到詞性的dict。
+        先把所有詞轉成轉移編號後排序，這樣一來共享同一個前綴的詞就會相鄰，
+        接著由根節點開始，對每個節點找出它的子節點的轉移編號，
+        再用_find_base為這些子節點找到一個不衝突的base。
+        """
+        if isinstance(words, dict):
+            words = iteritems(words)
+        words = list(words)
+        self._make_writable()
+        #出現次數越多的字元給越小的編號，讓常用字只需一步轉移
+        counts = {}
+        for word, _ in words:
+            for ch in word:
+                counts[ch] = counts.get(ch, 0) + 1
+        for ch in sorted(counts, key=lambda ch: (-counts[ch], ch)):
+            if ch not in self.alphabet:
+                self.alphabet[ch] = _unit_code(len(self.alphabet))
+        #先把詞性轉成編號，不必對每個詞在tagnames中搜尋
+        tag_ids = dict((tag, i) for i, tag in enumerate(self.tagnames))
+        for tag in set(itervalues(tags or {})):
+            if tag and tag not in tag_ids:
+                tag_ids[tag] = len(self.tagnames)
+                self.tagnames.append(tag)
+        tags = dict((word, tag_ids[tag]) for word, tag in iteritems(tags or {}) if tag)
+        keys = sorted((self._units(word), freq, len(word), tags.get(word, 0)) for word, freq in words)
+
+        used = self._ensure_used()
+        base, check, child, sibling = self.base, self.check, self.child, self.sibling
+
+        #stack中的每個元素表示：節點s對應的是keys[lo:hi]這些詞的前d個轉移編號
+        stack = [(ROOT, 0, 0, len(keys))]
+        while stack:
+            s, d, lo, hi = stack.pop()
+            i = lo
+            #排序過後，恰好等於這個前綴的詞一定排在最前面
+            if len(keys[i][0]) == d:
+                self._set_freq(s, keys[i][1])
+                self.maxlen = max(self.maxlen, keys[i][2])
+                self.tag[s] = keys[i][3]
+                i += 1
+            codes = []
+            ranges = []
+            while i < hi:
+                u = keys[i][0][d]
+                j = i + 1
+                while j < hi and keys[j][0][d] == u:
+                    j += 1
+                codes.append(u)
+                ranges.append((i, j))
+                i = j
+            if not codes:
+                continue
+            b = self._find_base(codes)
+            base[s] = b
+            child[s] = codes[0]
+            for k, u in enumerate(codes):
+                t = b + u
+                check[t] = s
+                used[t] = 1
+                sibling[t] = codes[k + 1] if k + 1 < len(codes) else 0
+                if not SINGLE < u <= SINGLE + HIGH:
+                    self.nodes += 1
+                lo, hi = ranges[k]
+                stack.append((t, d + 1, lo, hi))
+        self._shrink()
+
+    def insert(self, word, freq, tag=None):
+        """
+        新增或更新一個詞，沿途缺少的前綴節點會被一併建立。
+        tag不為None時一併設定它的詞性。
+        """
+        self._make_writable()
+        base, check = self.base, self.check
+        self._ensure_used()
+        s = ROOT
+        for u in self._units(word):
+            t = base[s] + u
+            if base[s] and check[t] == s:
+                s = t
+            else:
+                s = self._add_child(s, u)
+        self._set_freq(s, freq)
+        if tag:
+            self._set_tag(s, tag)
+        self.maxlen = max(self.maxlen, len(word))
+        return s
+
+    def update(self, words, tags=None):
+        """
+        新增或更新多個(詞彙，詞頻)，tags是其中一些詞的詞性。
+        逐一insert時，數組越滿，_find_base就要試越多次才能找到空位，
+        所以要插入的詞很多時，把原有的詞與新詞合在一起用build重新建構反而比較快。
+        """
+        if isinstance(words, dict):
+            words = iteritems(words)
+        words = list(words)
+        tags = tags or {}
+        if len(words) * REBUILD_RATIO < self.nodes:
+            for word, freq in words:
+                self.insert(word, freq, tags.get(word))
+            return
+        merged = dict(self.iteritems())
+        merged.update(words)
+        merged_tags = dict(self.tag_items())
+        merged_tags.update(tags)
+        trie = self.__class__(merged, merged_tags)
+        trie.total, trie.version = self.total, self.version
+        self.__dict__.update(trie.__dict__)
+
+    def _set_freq(self, s, freq):
+        self.freq[s] = freq
+        self.logfreq[s] = log(freq or 1)
+
+    def _set_tag(self, s, tag):
+        tagnames = self.tagnames
+        try:
+            i = tagnames.index(tag)
+        except ValueError:
+            i = len(tagnames)
+            tagnames.append(tag)
+        self.tag[s] = i
+
+    def _make_writable(self):
+        """
+        寫入時複製(copy-on-write)：
+        由檔案載入的數組是唯讀的，在第一次修改之前把它們複製成array。
+        """
+        if self._mmap is None:
+            return
+        for name, typecode in ARRAYS:
+            setattr(self, name, _copy_array(typecode, getattr(self, name)))
+        self._mmap = None
+
+    def copy(self):
+        """
+        回傳一個可以修改的複本，其version比自己大1。
+        Tokenizer把己發布的字典樹視為不可變的快照，
+        修改字典時是在複本上修改，完成後再整個換上去。
+        """
+        trie = self.__class__.__new__(self.__class__)
+        trie.alphabet = dict(self.alphabet)
+        for name, typecode in ARRAYS:
+            setattr(trie, name, _copy_array(typecode, getattr(self, name)))
+        trie.tagnames = list(self.tagnames)
+        trie.nodes = self.nodes
+        trie.maxlen = self.maxlen
+        trie.total = self.total
+        trie.version = self.version + 1
+        trie._used = None if self._used is None else bytearray(self._used)
+        trie._mmap = None
+        return trie
+
+    def _ensure_used(self):
+        if self._used is None:
+            self._used = bytearray(c != FREE for c in self.check)
+        return self._used
+
+    def _resize(self, size):
+        """
+        確保各數組的長度至少為size，新增的位置都是空位。
+        """
+        n = len(self.check)
+        if size <= n:
+            return
+        self._ensure_used()
+        #以倍數成長，避免頻繁地重新配置
+        grow = max(size, n * 2) - n
+        self._used.extend(bytearray(grow))
+        self.base.extend(array('i', [0]) * grow)
+        self.check.extend(array('i', [FREE]) * grow)
+        self.freq.extend(array('q', [0]) * grow)
+        self.logfreq.extend(array('d', [0.0]) * grow)
+        self.child.extend(array('i', [0]) * grow)
+        self.sibling.extend(array('i', [0]) * grow)
+        self.tag.extend(array('H', [0]) * grow)
+
+    def _shrink(self):
+        """
+        把數組末端多配置的空位去掉，只保留MAX_UNIT個空位。
+        """
+        size = self._used.rfind(b'\x01') + MAX_UNIT + 1
+        for a in (self._used, self.base, self.check, self.freq, self.logfreq,
+                  self.child, self.sibling, self.tag):
+            del a[size:]
+
+    def _find_base(self, codes):
+        """
+        找出一個base，使得對codes中的每個轉移編號u，base + u都是空位。
+        codes必須是由小到大排列的。
+
+        used是一個bytearray，所以可以用bytearray.find來跳過己被占用的位置，
+        尋找空位的迴圈就不必在Python層級逐格掃描。
+        嘗試超過MAX_TRIALS次後，就直接跳到最後一個被占用的位置之後。
+
+        數組的長度總是比最大的base多出MAX_UNIT，
+        所以查找時不必檢查base[s] + u是否越界。
+        """
+        used = self._used
+        first = codes[0]
+        pos = used.find(b'\x00', first + 1)
+        trials = 0
+        while True:
+            if pos < 0 or trials >= MAX_TRIALS:
+                pos = max(pos, used.rfind(b'\x01') + 1, first + 1)
+            b = pos - first
+            self._resize(b + MAX_UNIT + 1)
+            used = self._used
+            for u in codes:
+                if used[b + u]:
+                    break
+            else:
+                return b
+            trials += 1
+            pos = used.find(b'\x00', pos + 1)
+
+    def _children(self, s):
+        base, sibling = self.base, self.sibling
+        codes = []
+        u = self.child[s]
+        while u:
+            codes.append(u)
+            u = sibling[base[s] + u]
+        return codes
+
+    def _add_child(self, s, u):
+        """
+        為節點s新增一個轉移編號為u的子節點，回傳該子節點的索引。
+        如果base[s] + u這個位置己被其它節點占用，就把s的所有子節點搬到新的base。
+        """
+        base, check = self.base, self.check
+        t = base[s] + u
+        if not base[s] or check[t] != FREE:
+            codes = self._children(s)
+            codes.append(u)
+            codes.sort()
+            self._relocate(s, self._find_base(codes))
+            t = self.base[s] + u
+        base, check, child, sibling = self.base, self.check, self.child, self.sibling
+        check[t] = s
+        self._used[t] = 1
+        base[t] = 0
+        self._set_freq(t, 0)
+        self.tag[t] = 0
+        child[t] = 0
+        #把新節點按轉移編號的順序接進兄弟串列
+        if not child[s] or u < child[s]:
+            sibling[t] = child[s]
+            child[s] = u
+        else:
+            prev = child[s]
+            while sibling[base[s] + prev] and sibling[base[s] + prev] < u:
+                prev = sibling[base[s] + prev]
+            sibling[t] = sibling[base[s] + prev]
+            sibling[base[s] + prev] = u
+        if not SINGLE < u <= SINGLE + HIGH:
+            self.nodes += 1
+        return t
+
+    def _relocate(self, s, new_base):
+        """
+        把節點s的所有子節點由base[s]搬到new_base，
+        並更新孫節點的check，讓它們指向搬家後的子節點。
+        """
+        base, check, freq, logfreq, child, sibling, tag = (
+            self.base, self.check, self.freq, self.logfreq, self.child, self.sibling, self.tag)
+        used = self._used
+        old_base = base[s]
+        for u in self._children(s):
+            old, new = old_base + u, new_base + u
+            base[new] = base[old]
+            check[new] = s
+            used[new] = 1
+            freq[new] = freq[old]
+            logfreq[new] = logfreq[old]
+            child[new] = child[old]
+            sibling[new] = sibling[old]
+            tag[new] = tag[old]
+            for g in self._children(old):
+                check[base[old] + g] = new
+            base[old] = 0
+            check[old] = FREE
+            used[old] = 0
+            freq[old] = 0
+            logfreq[old] = 0.0
+            child[old] = 0
+            sibling[old] = 0
+            tag[old] = 0
+        base[s] = new_base
+
+    """
+    序列化
+    """
+    def save(self, f, **meta):
+        """
+        把字典樹寫入一個以二進位模式開啟的檔案物件f。
+        meta中的其它資訊會被一起寫進標頭，open時原樣回傳。
+        """
+        tobytes = lambda a: a.tostring() if PY2 else a.tobytes()
+        sections = [(name, tobytes(array(typecode, getattr(self, name))))
+                    for name, typecode in ARRAYS]
+        sections.append(('chars', ''.join(self.chars()).encode('utf-8')))
+        layout = {}
+        offset = 0
+        for name, data in sections:
+            layout[name] = [offset, len(data)]
+            offset += _align(len(data))
+        header = dict(meta, version=FORMAT_VERSION, byteorder=sys.byteorder, total=self.total,
+                      itemsize=dict((typecode, array(typecode).itemsize)
+                                    for _, typecode in ARRAYS),
+                      nodes=self.nodes, maxlen=self.maxlen, tagnames=self.tagnames,
+                      sections=layout)
+        header = json.dumps(header, sort_keys=True).encode('utf-8')
+        f.write(MAGIC + struct.pack('<I', len(header)) + header)
+        f.write(b'\x00' * (_align(_header_size(header)) - _header_size(header)))
+        for name, data in sections:
+            f.write(data)
+            f.write(b'\x00' * (_align(len(data)) - len(data)))
+
+    @classmethod
+    def open(cls, path):
+        """
+        以mmap開啟save寫出的檔案，回傳(trie, meta)。
+        各數組直接以memoryview建立在mmap上，查詢時才會由作業系統分頁載入。
+        Python2的memoryview不支援cast，所以退而把內容複製進array。
+        檔案格式不符時拋出ValueError。
+        """
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(MAGIC)] != MAGIC:
+            raise ValueError('jieba: %s is not a compiled dictionary' % path)
+        size = struct.unpack('<I', mm[len(MAGIC):len(MAGIC) + 4])[0]
+        header = mm[len(MAGIC) + 4:len(MAGIC) + 4 + size]
+        meta = json.loads(header.decode('utf-8'))
+        if (meta.get('version') != FORMAT_VERSION or meta['byteorder'] != sys.byteorder
+                or any(meta['itemsize'][typecode] != array(typecode).itemsize
+                       for _, typecode in ARRAYS)):
+            raise ValueError('jieba: incompatible compiled dictionary %s' % path)
+        start = _align(_header_size(header))
+        sections = dict((name, (start + offset, start + offset + length))
+                        for name, (offset, length) in iteritems(meta['sections']))
+        trie = cls.__new__(cls)
+        for name, typecode in ARRAYS:
+            lo, hi = sections[name]
+            if PY2:
+                a = array(typecode)
+                a.fromstring(mm[lo:hi])
+            else:
+                a = memoryview(mm)[lo:hi].cast(str(typecode))
+            setattr(trie, name, a)
+        lo, hi = sections['chars']
+        chars = mm[lo:hi].decode('utf-8')
+        trie.alphabet = dict((ch, _unit_code(rank)) for rank, ch in enumerate(chars))
+        trie.nodes = meta.pop('nodes')
+        trie.maxlen = meta.pop('maxlen')
+        trie.tagnames = meta.pop('tagnames')
+        trie.total = meta.pop('total')
+        trie.version = 0
+        trie._used = None
+        trie._mmap = mm
+        if PY2:
+            mm.close()
+            trie._mmap = None
+        for key in ('version', 'byteorder', 'itemsize', 'sections'):
+            del meta[key]
+        return trie, meta
+
+
+def _copy_array(typecode, a):
+    """
+    複製一個array或是建立在mmap上的memoryview。
+    """
+    if isinstance(a, array):
+        return a[:]
+    b = array(typecode)
+    b.frombytes(a.cast('B'))
+    return b
+
+
+def _header_size(header):
+    return len(MAGIC) + 4 + len(header)
+
+
+def _align(n):
+    return (n + 7) & ~7
@@ -1,9 +1,13 @@
 #-*-coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
+import os
 import sys
+import time
 sys.path.append("../")
 import unittest
 import types
+import shutil
+import tempfile
 import jieba
 if sys.version_info[0] > 2:
     from imp import reload
@@ -201,5 +205,603 @@ class JiebaTestCase(unittest.TestCase):
             print(" , ".join(result), file=sys.stderr)
         print("testCutForSearch_NOHMM", file=sys.stderr)
 
+    def testFREQ(self):
+        # 使用另一個Tokenizer，以免新詞留在全局的字典中
+        tokenizer = jieba.Tokenizer()
+        freq = jieba.get_FREQ("石墨烯")
+        tokenizer.add_word("石墨烯", 10)
+        assert tokenizer.FREQ.get("石墨烯") == 10, "Test FREQ error on added word"
+        assert tokenizer.FREQ.get("石墨") is not None, "Test FREQ error on prefix"
+        assert jieba.get_FREQ("石墨烯") == freq, "Test FREQ error on global dictionary"
+        assert jieba.get_FREQ("石墨烯烯") is None, "Test FREQ error on missing word"
+        for content in test_contents:
+            DAG = jieba.get_DAG(content)
+            route = {}
+            jieba.calc(content, DAG, route)
+            assert sorted(DAG) == list(range(len(content))), "Test FREQ DAG error on content: %s" % content
+        print("testFREQ", file=sys.stderr)
+
+    def testCacheFile(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            tokenizer = jieba.Tokenizer()
+            tokenizer.tmp_dir = tmp_dir
+            tokenizer.initialize()
+            cached = jieba.Tokenizer()
+            cached.tmp_dir = tmp_dir
+            cached.initialize()
+            assert cached.total == tokenizer.total, "Test CacheFile error on total"
+            for content in test_contents:
+                assert cached.lcut(content) == tokenizer.lcut(content), "Test CacheFile error on content: %s" % content
+            cached.add_word("石墨烯", 10)
+            assert cached.lcut("石墨烯") == ["石墨烯"], "Test CacheFile error on add_word"
+            dictionary = os.path.join(tmp_dir, "dict.txt")
+            with open(dictionary, "wb") as f:
+                f.write("石墨 5 n\n烯 3 n\n".encode("utf-8"))
+            custom = jieba.Tokenizer(dictionary)
+            custom.tmp_dir = tmp_dir
+            custom.initialize()
+            cache_file = [name for name in os.listdir(tmp_dir) if name.startswith("jieba.u")][0]
+            meta = jieba.DoubleArrayTrie.open(os.path.join(tmp_dir, cache_file))[1]
+            assert meta["source"] == custom._hash_dict_file(), "Test CacheFile error on source"
+            assert meta["jieba"] == jieba.__version__, "Test CacheFile error on version"
+            #內容改變但修改時間不變的字典也必須重新生成快取檔案
+            with open(dictionary, "ab") as f:
+                f.write("石墨烯 7 n\n".encode("utf-8"))
+            os.utime(dictionary, (0, 0))
+            custom = jieba.Tokenizer(dictionary)
+            custom.tmp_dir = tmp_dir
+            custom.initialize()
+            assert custom.FREQ["石墨烯"] == 7, "Test CacheFile error on stale cache"
+        finally:
+            shutil.rmtree(tmp_dir)
+        print("testCacheFile", file=sys.stderr)
+
+    def testAutomaton(self):
+        tokenizer = jieba.Tokenizer(automaton=True)
+        for content in test_contents:
+            assert tokenizer.get_DAG(content) == jieba.get_DAG(content), "Test Automaton DAG error on content: %s" % content
+            assert tokenizer.lcut(content) == jieba.lcut(content), "Test Automaton error on content: %s" % content
+        tokenizer.add_word("石墨烯")
+        assert tokenizer.lcut("石墨烯") == ["石墨烯"], "Test Automaton error on add_word"
+        print("testAutomaton", file=sys.stderr)
+
+    def testCache(self):
+        tokenizer = jieba.Tokenizer()
+        tokenizer.enable_cache(maxsize=2)
+        for content in test_contents[:3]:
+            assert tokenizer.lcut(content) == jieba.lcut(content), "Test Cache error on content: %s" % content
+        result = tokenizer.cut(test_contents[2])
+        assert isinstance(result, types.GeneratorType), "Test Cache Generator error"
+        assert list(result) == jieba.lcut(test_contents[2]), "Test Cache error on cached content"
+        assert tokenizer.lcut_for_search(test_contents[2]) == jieba.lcut_for_search(test_contents[2]), "Test Cache error on search mode"
+        info = tokenizer.cache_info()
+        assert (info.hits, info.misses, info.evictions, info.currsize) == (1, 4, 2, 2), "Test Cache error on counters"
+        tokenizer.add_word("石墨烯")
+        assert tokenizer.cache_info().currsize == 0, "Test Cache error on add_word"
+        assert tokenizer.lcut("石墨烯") == ["石墨烯"], "Test Cache error after add_word"
+        print("testCache", file=sys.stderr)
+
+    def testSnapshot(self):
+        tokenizer = jieba.Tokenizer()
+        tokenizer.initialize()
+        snapshot = tokenizer.FREQ
+        result = tokenizer.cut("李小福是创新办主任也是云计算方面的专家")
+        next(result)
+        tokenizer.load_userdict(["创新办 3 i", "云计算 5", "凱特琳 nz"])
+        assert tokenizer.FREQ is not snapshot, "Test Snapshot error on publishing"
+        assert tokenizer.FREQ.version == snapshot.version + 1, "Test Snapshot error on bulk update"
+        assert snapshot.get("创新办") is None, "Test Snapshot error on old snapshot"
+        assert tokenizer.total == snapshot.total + 3 + 5 + tokenizer.FREQ["凱特琳"], "Test Snapshot error on total"
+        assert "创新办" not in list(result), "Test Snapshot error on pinned snapshot"
+        assert "创新办" in tokenizer.lcut("李小福是创新办主任也是云计算方面的专家"), "Test Snapshot error after update"
+        print("testSnapshot", file=sys.stderr)
+
+    def testUserdictCache(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            userdict = os.path.join(tmp_dir, "userdict.txt")
+            shutil.copy("userdict.txt", userdict)
+            tokenizer = jieba.Tokenizer()
+            tokenizer.tmp_dir = tmp_dir
+            tokenizer.load_userdict(userdict)
+            expected = tokenizer.lcut(test_contents[0])
+            merged = [name for name in os.listdir(tmp_dir) if name.startswith("jieba.m")]
+            assert len(merged) == 1, "Test UserdictCache error on dumping"
+            merged = os.path.join(tmp_dir, merged[0])
+            stat = os.stat(merged)
+            tokenizer = jieba.Tokenizer()
+            tokenizer.tmp_dir = tmp_dir
+            tokenizer.load_userdict(userdict)
+            assert tokenizer.lcut(test_contents[0]) == expected, "Test UserdictCache error on loading"
+            assert tokenizer.FREQ["凱特琳"] == jieba.suggest_freq("凱特琳"), "Test UserdictCache error on FREQ"
+            assert os.stat(merged).st_ino == stat.st_ino, "Test UserdictCache error on rewriting"
+            with open(userdict, "ab") as f:
+                f.write("石墨烯 3 n\n".encode("utf-8"))
+            tokenizer = jieba.Tokenizer()
+            tokenizer.tmp_dir = tmp_dir
+            tokenizer.load_userdict(userdict)
+            assert tokenizer.FREQ["石墨烯"] == 3, "Test UserdictCache error on changed input"
+            assert os.stat(merged).st_ino != stat.st_ino, "Test UserdictCache error on changed input"
+        finally:
+            shutil.rmtree(tmp_dir)
+        print("testUserdictCache", file=sys.stderr)
+
+    def testCutBatch(self):
+        texts = test_contents + test_contents[:10]
+        for kwargs, cut in (({}, jieba.lcut), ({"cut_all": True}, lambda s: jieba.lcut(s, cut_all=True)),
+                            ({"HMM": False}, lambda s: jieba.lcut(s, HMM=False)),
+                            ({"search": True}, jieba.lcut_for_search)):
+            result = jieba.lcut_batch(texts, **kwargs)
+            assert result == [cut(content) for content in texts], "Test CutBatch error on %r" % kwargs
+        import jieba.posseg as pseg
+        result = pseg.lcut_batch(texts)
+        assert result == [pseg.lcut(content) for content in texts], "Test CutBatch error on posseg"
+        print("testCutBatch", file=sys.stderr)
+
+    def testCutFile(self):
+        fd, path = tempfile.mkstemp()
+        try:
+            content = "\n".join(test_contents)
+            with os.fdopen(fd, "wb") as f:
+                f.write(content.encode("utf-8"))
+            for kwargs, cut in (({}, jieba.lcut), ({"cut_all": True}, lambda s: jieba.lcut(s, cut_all=True)),
+                                ({"search": True}, jieba.lcut_for_search)):
+                result = jieba.cut_file(path, chunk_size=64, **kwargs)
+                assert isinstance(result, types.GeneratorType), "Test CutFile Generator error"
+                assert list(result) == cut(content), "Test CutFile error on %r" % kwargs
+            # 只有ASCII字元的檔案沒有漢字，也不能在max_pending處切在詞的中間
+            content = "jieba-0.39 supports Python 2/3, user_dict.txt & C++ (cut_all=True).\n" * 200
+            with open(path, "wb") as f:
+                f.write(content.encode("utf-8"))
+            for kwargs, cut in (({}, jieba.lcut), ({"cut_all": True}, lambda s: jieba.lcut(s, cut_all=True)),
+                                ({"search": True}, jieba.lcut_for_search)):
+                result = jieba.cut_file(path, chunk_size=64, max_pending=200, **kwargs)
+                assert list(result) == cut(content), "Test CutFile error on ASCII %r" % kwargs
+            # 沒有指定編碼時，不是utf-8的檔案與cut相同以gbk解碼
+            content = "\n".join(test_contents)
+            with open(path, "wb") as f:
+                f.write(content.encode("gbk", "ignore"))
+            assert list(jieba.cut_file(path, chunk_size=64)) == jieba.lcut(content.encode("gbk", "ignore")), "Test CutFile error on gbk"
+        finally:
+            os.remove(path)
+        print("testCutFile", file=sys.stderr)
+
+    def testStreamingSegmenter(self):
+        content = "\r\n".join(test_contents)
+        for kwargs, cut in (({}, jieba.lcut), ({"HMM": False}, lambda s: jieba.lcut(s, HMM=False)),
+                            ({"cut_all": True}, lambda s: jieba.lcut(s, cut_all=True)),
+                            ({"search": True}, jieba.lcut_for_search),
+                            ({"search": True, "cut_all": True}, jieba.lcut_for_search)):
+            segmenter = jieba.StreamingSegmenter(**kwargs)
+            result = []
+            for i in range(0, len(content), 7):
+                result.extend(segmenter.feed(content[i:i + 7]))
+                assert len(segmenter.pending) < 200, "Test StreamingSegmenter error on pending size"
+            result.extend(segmenter.flush())
+            assert result == cut(content), "Test StreamingSegmenter error on %r" % kwargs
+        print("testStreamingSegmenter", file=sys.stderr)
+
+    def testStreamingSegmenterOOV(self):
+        # 使用HMM時，全是未登錄字的串流一直無法確定切分點，每次feed仍應只處理新收到的文字
+        from jieba._compat import unichr
+        jieba.initialize()
+        oov = [unichr(c) for c in range(0x4e00, 0x9fd6) if unichr(c) not in jieba.dt.FREQ][:500]
+        content = "".join(oov[i * 7 % len(oov)] for i in range(16000))
+        def timed(n):
+            segmenter = jieba.StreamingSegmenter()
+            result = []
+            t1 = time.time()
+            for i in range(0, n, 10):
+                result.extend(segmenter.feed(content[i:i + 10]))
+                assert len(segmenter.pending) <= segmenter.max_pending, "Test StreamingSegmenterOOV error on pending size"
+            result.extend(segmenter.flush())
+            assert "".join(result) == content[:n], "Test StreamingSegmenterOOV error on content"
+            return time.time() - t1
+        timed(2000)
+        small, large = timed(2000), timed(16000)
+        assert large < 8 * 4 * max(small, 0.01), "Test StreamingSegmenterOOV error on linearity: %.3f %.3f" % (small, large)
+        print("testStreamingSegmenterOOV", file=sys.stderr)
+
+    @unittest.skipIf(sys.version_info < (3, 6), "asyncio coroutines need Python 3.6+")
+    def testAsync(self):
+        import asyncio
+        import jieba.aio
+        content = "\n".join(test_contents)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(jieba.aio.ainitialize())
+            result = loop.run_until_complete(jieba.aio.alcut(content))
+            assert result == jieba.lcut(content), "Test Async error on alcut"
+            result = loop.run_until_complete(jieba.aio.alcut(content, cut_all=True))
+            assert result == jieba.lcut(content, cut_all=True), "Test Async error on cut_all"
+        finally:
+            loop.close()
+        print("testAsync", file=sys.stderr)
+
+    def testFinalsegLazyLoad(self):
+        import subprocess
+        code = "\n".join([
+            "import sys, threading",
+            "sys.path.insert(0, %r)" % os.path.abspath(".."),
+            "import jieba",
+            "assert jieba.finalseg._model is None",
+            "results = []",
+            "threads = [threading.Thread(target=lambda: results.append(list(jieba.finalseg.cut('隐马尔可夫'))))",
+            "           for _ in range(8)]",
+            "[t.start() for t in threads]",
+            "[t.join() for t in threads]",
+            "assert len(results) == 8 and all(r == results[0] for r in results)",
+            "assert isinstance(jieba.finalseg._model, jieba.finalseg.CompactModel)",
+        ])
+        subprocess.check_call([sys.executable, "-c", code])
+        print("testFinalsegLazyLoad", file=sys.stderr)
+
+    def testFinalsegCompactModel(self):
+        from jieba import finalseg
+        model = finalseg._get_model()
+        emit_p = finalseg._emit_dict(model)
+        for content in test_contents + ["".join(test_contents) * 3]:
+            for blk in finalseg.re_han.split(content):
+                if finalseg.re_han.match(blk):
+                    expected = finalseg.viterbi(blk, 'BMES', finalseg.start_P, finalseg.trans_P, emit_p)
+                    assert finalseg._viterbi(blk, model) == expected, "Test FinalsegCompactModel error on content: %s" % blk
+        print("testFinalsegCompactModel", file=sys.stderr)
+
+    def testFinalsegBatch(self):
+        from jieba import finalseg
+        model = finalseg._get_model()
+        blocks = [blk for content in test_contents for blk in finalseg.re_han.split(content)
+                  if finalseg.re_han.match(blk)]
+        # 重複多次，讓NumPy的批次解碼真正被使用
+        blocks = blocks * (finalseg.NUMPY_MIN_BATCH // len(blocks) + 1) + ["".join(blocks)]
+        expected = [finalseg._viterbi(blk, model)[1] for blk in blocks]
+        expected_cut = [list(finalseg.cut(content)) for content in test_contents]
+        np = finalseg.np
+        try:
+            # 有無NumPy的結果都要和逐一解碼的結果相同
+            for use_numpy in (True, False):
+                if not use_numpy:
+                    finalseg.np = None
+                result = [list(states) for states in finalseg._viterbi_batch(blocks, model)]
+                assert result == expected, "Test FinalsegBatch error, numpy: %s" % use_numpy
+                assert finalseg.cut_batch(test_contents) == expected_cut, "Test FinalsegBatch cut_batch error"
+        finally:
+            finalseg.np = np
+        print("testFinalsegBatch", file=sys.stderr)
+
+    def testCutWindow(self):
+        from jieba import finalseg
+        content = "".join(test_contents) * 200
+        expected = jieba.lcut(content)
+        # 未登錄詞緩衝區分批解碼，結果應與批次大小無關
+        size = jieba.CUT_WINDOW_SIZE
+        jieba.CUT_WINDOW_SIZE = 16
+        try:
+            assert jieba.lcut(content) == expected, "Test CutWindow error on window size"
+        finally:
+            jieba.CUT_WINDOW_SIZE = size
+        # cut仍是逐步產生結果的：取得第一個詞時只解碼了第一批的緩衝區
+        decoded = []
+        cut_batch = finalseg.cut_batch
+        finalseg.cut_batch = lambda bufs: decoded.extend(bufs) or cut_batch(bufs)
+        try:
+            words = jieba.cut(content * 10)
+            assert next(words) == expected[0], "Test CutWindow error on first word"
+        finally:
+            finalseg.cut_batch = cut_batch
+        assert sum(map(len, decoded)) <= jieba.CUT_WINDOW_SIZE, "Test CutWindow error on laziness: %d" % sum(map(len, decoded))
+        print("testCutWindow", file=sys.stderr)
+
+    def testHMMMemo(self):
+        from jieba import finalseg
+        import jieba.posseg as pseg
+        sentence = "他叫鑫垚淼焱"
+        finalseg.clear_memo()
+        expected = jieba.lcut(sentence)
+        info = finalseg.memo_info()
+        assert jieba.lcut(sentence) == expected, "Test HMMMemo error on cached content"
+        assert finalseg.memo_info().hits == info.hits + 1, "Test HMMMemo error on finalseg hits"
+        word = [w for w in finalseg.cut(sentence) if len(w) > 1][0]
+        try:
+            finalseg.add_force_split(word)
+            assert finalseg.memo_info().currsize == 0, "Test HMMMemo error on add_force_split"
+            assert word not in finalseg.cut(sentence), "Test HMMMemo error after add_force_split"
+        finally:
+            finalseg.Force_Split_Words.discard(word)
+            finalseg.clear_memo()
+        postokenizer = pseg.POSTokenizer(jieba.Tokenizer())
+        expected = postokenizer.lcut(sentence)
+        info = postokenizer.hmm_memo_info()
+        assert postokenizer.lcut(sentence) == expected, "Test HMMMemo error on cached pairs"
+        assert postokenizer.hmm_memo_info().hits == info.hits + 1, "Test HMMMemo error on posseg hits"
+        postokenizer.add_word("石墨烯")
+        postokenizer.lcut("石墨烯")
+        assert postokenizer.hmm_memo_info().currsize == 0, "Test HMMMemo error on dictionary change"
+        print("testHMMMemo", file=sys.stderr)
+
+    def testPossegBeam(self):
+        import jieba.posseg as pseg
+        from jieba.posseg.viterbi import viterbi
+        for content in test_contents:
+            for blk in pseg.re_han_detail.split(content):
+                if pseg.re_han_detail.match(blk):
+                    # beam寬度不小於狀態數時不會剪枝，結果與精確解碼相同
+                    expected = viterbi(blk, pseg.char_state_tab_P, pseg.start_P, pseg.trans_P, pseg.emit_P)
+                    result = viterbi(blk, pseg.char_state_tab_P, pseg.start_P, pseg.trans_P, pseg.emit_P,
+                                     len(pseg.trans_P))
+                    assert result == expected, "Test PossegBeam error on content: %s" % blk
+            words = [w for w, f in pseg.cut(content, beam=1)]
+            assert "".join(words) == content, "Test PossegBeam error on content: %s" % content
+        postokenizer = pseg.POSTokenizer(jieba.dt, beam=4)
+        assert postokenizer.lcut(test_contents[0]) == pseg.lcut(test_contents[0], beam=4), "Test PossegBeam error on POSTokenizer"
+        self.assertRaises(ValueError, pseg.POSTokenizer, jieba.dt, 0)
+        print("testPossegBeam", file=sys.stderr)
+
+    def testPossegCompiledModel(self):
+        import jieba.posseg as pseg
+        viterbi_module = sys.modules["jieba.posseg.viterbi"]
+        args = (pseg.char_state_tab_P, pseg.start_P, pseg.trans_P, pseg.emit_P)
+        model = viterbi_module._compile_model(*args)
+        # 么吒哩在emit_P中的狀態比char_state_tab_P中的多，𠀀不在模型中
+        blocks = ["么吒哩", "\U00020000中"]
+        for content in test_contents:
+            blocks.extend(blk for blk in pseg.re_han_detail.split(content) if pseg.re_han_detail.match(blk))
+        np = viterbi_module.np
+        try:
+            for use_numpy in (True, False):
+                if not use_numpy:
+                    viterbi_module.np = None
+                for blk in blocks:
+                    expected = viterbi_module.viterbi(blk, *args)
+                    assert viterbi_module._viterbi(blk, model) == expected, "Test PossegCompiledModel error on content: %s" % blk
+        finally:
+            viterbi_module.np = np
+        print("testPossegCompiledModel", file=sys.stderr)
+
+    def testPossegBeamTies(self):
+        import random
+        viterbi_module = sys.modules["jieba.posseg.viterbi"]
+        if viterbi_module.np is None:
+            return
+        # 機率只取幾個值的模型有大量平手，有無NumPy時beam search都要保留同樣的狀態
+        random.seed(0)
+        states = [(bmes, tag) for bmes in "BMES" for tag in ("a", "n", "v", "x")]
+        chars = "中文分詞標注"
+        prob = lambda: random.choice((-1.0, -2.0, -3.0))
+        np = viterbi_module.np
+        try:
+            for _ in range(20):
+                start_p = dict((y, prob()) for y in states)
+                trans_p = dict((y0, dict((y, prob()) for y in states if random.random() < 0.7)) for y0 in states)
+                emit_p = dict((y, dict((ch, prob()) for ch in chars)) for y in states)
+                model = viterbi_module._compile_model({}, start_p, trans_p, emit_p)
+                for beam in (1, 2, 3):
+                    for blk in ("中文", "分詞標注中文", chars * 3):
+                        viterbi_module.np = np
+                        expected = viterbi_module._viterbi(blk, model, beam)
+                        viterbi_module.np = None
+                        assert viterbi_module._viterbi(blk, model, beam) == expected, "Test PossegBeamTies error on beam %d: %s" % (beam, blk)
+        finally:
+            viterbi_module.np = np
+        print("testPossegBeamTies", file=sys.stderr)
+
+    def testPossegModelFile(self):
+        import jieba.posseg as pseg
+        from jieba.posseg import model as model_module
+        viterbi_module = sys.modules["jieba.posseg.viterbi"]
+        model = viterbi_module._compile_model(pseg.char_state_tab_P, pseg.start_P, pseg.trans_P, pseg.emit_P)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "posseg.model")
+            with open(path, "wb") as f:
+                model_module.save_model(model, f)
+            loaded = model_module.open_model(path)
+            quantized = model_module.quantize_model(model)
+            assert (loaded.unknown, loaded.extra) == (quantized.unknown, quantized.extra), "Test PossegModelFile error on index"
+            for name in loaded._fields:
+                if name not in ("unknown", "extra"):
+                    assert list(getattr(loaded, name)) == list(getattr(quantized, name)), "Test PossegModelFile error on %s" % name
+            for content in test_contents:
+                for blk in pseg.re_han_detail.split(content):
+                    if pseg.re_han_detail.match(blk):
+                        assert viterbi_module._viterbi(blk, loaded) == viterbi_module._viterbi(blk, quantized), "Test PossegModelFile error on content: %s" % blk
+            del loaded
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        # 匯入jieba.posseg及標注時都不應載入字典常量
+        import subprocess
+        code = "\n".join([
+            "import sys",
+            "sys.path.insert(0, %r)" % os.path.abspath(".."),
+            "import jieba.posseg",
+            "jieba.posseg.lcut('他叫鑫垚淼焱')",
+            "assert 'jieba.posseg.prob_emit' not in sys.modules",
+            "assert 'jieba.posseg.char_state_tab' not in sys.modules",
+        ])
+        subprocess.check_call([sys.executable, "-c", code])
+        print("testPossegModelFile", file=sys.stderr)
+
+    def testPossegWordTag(self):
+        import jieba.posseg as pseg
+        tokenizer = jieba.Tokenizer()
+        tokenizer.initialize()
+        # 詞性直接存在字典樹中，建立POSTokenizer時不應再讀取字典檔案
+        original = tokenizer.get_dict_file
+        tokenizer.get_dict_file = lambda: self.fail("Test PossegWordTag error on reading dict file")
+        try:
+            postokenizer = pseg.POSTokenizer(tokenizer)
+        finally:
+            tokenizer.get_dict_file = original
+        trie = tokenizer.FREQ
+        for word in ("中国", "我们", "研究"):
+            if word in trie and trie[word]:
+                assert trie.get_tag(word) == postokenizer.word_tag_tab[word], "Test PossegWordTag error on word: %s" % word
+        # 字典沒有被修改時，word_tag_tab不會重新建立
+        assert postokenizer.word_tag_tab is postokenizer.word_tag_tab, "Test PossegWordTag error on cache"
+        tokenizer.add_word("鑫垚淼焱", 1000, "nz")
+        assert tokenizer.FREQ.get_tag("鑫垚淼焱") == "nz", "Test PossegWordTag error on add_word"
+        assert postokenizer.word_tag_tab["鑫垚淼焱"] == "nz", "Test PossegWordTag error on word_tag_tab after add_word"
+        postokenizer.word_tag_tab = {"鑫垚淼焱": "nr"}
+        assert tokenizer.FREQ.get_tag("鑫垚淼焱") == "nr", "Test PossegWordTag error on assigning word_tag_tab"
+        tokenizer.add_word("鑫垚淼焱", 1000, "nz")
+        pairs = [tuple(p) for p in postokenizer.cut("他叫鑫垚淼焱")]
+        assert ("鑫垚淼焱", "nz") in pairs, "Test PossegWordTag error on cut: %s" % pairs
+        # 詞性會隨字典樹寫入快取檔案
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "jieba.cache")
+            with open(path, "wb") as f:
+                tokenizer.FREQ.save(f)
+            from jieba.trie import DoubleArrayTrie
+            loaded = DoubleArrayTrie.open(path)[0]
+            assert loaded.get_tag("鑫垚淼焱") == "nz", "Test PossegWordTag error on cache"
+            assert dict(loaded.tag_items()) == dict(tokenizer.FREQ.tag_items()), "Test PossegWordTag error on tag_items"
+            del loaded
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        print("testPossegWordTag", file=sys.stderr)
+
+    def testPossegTuples(self):
+        import pickle
+        import jieba.posseg as pseg
+        p = pseg.pair("北京", "ns")
+        assert not hasattr(p, "__dict__"), "Test PossegTuples error on __slots__"
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            assert pickle.loads(pickle.dumps(p, protocol)) == p, "Test PossegTuples error on pickle protocol %d" % protocol
+        for content in test_contents:
+            for HMM in (True, False):
+                pairs = [tuple(w) for w in pseg.cut(content, HMM)]
+                result = pseg.lcut(content, HMM, as_tuples=True)
+                assert all(type(w) is tuple for w in result), "Test PossegTuples error on type: %s" % content
+                assert result == pairs, "Test PossegTuples error on content: %s" % content
+        batch = pseg.lcut_batch(test_contents, as_tuples=True)
+        assert batch == [[tuple(w) for w in r] for r in pseg.lcut_batch(test_contents)], "Test PossegTuples error on cut_batch"
+        print("testPossegTuples", file=sys.stderr)
+
+    def testPossegTokenize(self):
+        import jieba.posseg as pseg
+        for content in test_contents:
+            for HMM in (True, False):
+                result = list(pseg.dt.tokenize(content, HMM=HMM))
+                assert [(w, f) for w, f, s, e in result] == pseg.lcut(content, HMM, as_tuples=True), "Test PossegTokenize error on content: %s" % content
+                assert "".join(w for w, f, s, e in result) == content, "Test PossegTokenize error on joined words: %s" % content
+                search = list(pseg.dt.tokenize(content, mode="search", HMM=HMM))
+                for w, f, s, e in result + search:
+                    assert content[s:e] == w, "Test PossegTokenize error on offsets: %s" % content
+                # search模式產生的詞應與對同樣的切分結果使用cut_for_search的規則相同
+                expected = list(pseg.dt.tokenizer._search_words([w for w, f, s, e in result], pseg.dt.tokenizer.FREQ))
+                assert [w for w, f, s, e in search] == expected, "Test PossegTokenize error on search mode: %s" % content
+            for tk in pseg.dt.tokenize(content, mode="search"):
+                print("word %s\t\t flag: %s\t\t start: %d \t\t end:%d" % tk, file=sys.stderr)
+        print("testPossegTokenize", file=sys.stderr)
+
+    def testPossegTag(self):
+        import jieba.posseg as pseg
+        trie = pseg.dt.tokenizer.FREQ
+        for content in test_contents:
+            for HMM in (True, False):
+                pairs = pseg.lcut(content, HMM, as_tuples=True)
+                result = pseg.tag([w for w, f in pairs], HMM, as_tuples=True)
+                assert [w for w, f in result] == [w for w, f in pairs], "Test PossegTag error on words: %s" % content
+                for (w, f), expected in zip(result, pairs):
+                    if trie.get(w):
+                        assert f == trie.get_tag(w, 'x'), "Test PossegTag error on word: %s" % w
+                # 不使用HMM時，posseg.cut的詞性也全部來自字典或規則，兩者應完全相同
+                if not HMM:
+                    assert result == pairs, "Test PossegTag error on content: %s" % content
+            tokens = jieba.lcut(content)
+            result = pseg.tag(tokens)
+            assert [p.word for p in result] == tokens, "Test PossegTag error on jieba.cut: %s" % content
+            print(" , ".join([w.word + " / " + w.flag for w in result]), file=sys.stderr)
+        # 使用另一個Tokenizer，以免新詞留在全局的字典中(del_word也會把它加入全局的Force_Split_Words)
+        postokenizer = pseg.POSTokenizer(jieba.Tokenizer())
+        postokenizer.tokenizer.add_word("鑫垚淼焱", 1000, "nz")
+        assert postokenizer.tag(["他", "叫", "鑫垚淼焱"], as_tuples=True)[-1] == ("鑫垚淼焱", "nz"), "Test PossegTag error on add_word"
+        print("testPossegTag", file=sys.stderr)
+
+    def testTokenizerPool(self):
+        import jieba.posseg as pseg
+        tokenizer = jieba.Tokenizer("foobar.txt")
+        tokenizer.add_word("鑫垚淼焱", 1000, "nz")
+        content = "\n".join(test_contents + ["他叫鑫垚淼焱"])
+        with tokenizer.parallel(2) as pool:
+            assert pool.lcut(content) == tokenizer.lcut(content), "Test TokenizerPool error on cut"
+            assert pool.lcut(content, HMM=False) == tokenizer.lcut(content, HMM=False), "Test TokenizerPool error on cut HMM=False"
+            assert pool.lcut_for_search(content) == tokenizer.lcut_for_search(content), "Test TokenizerPool error on cut_for_search"
+            for mode in ("default", "search"):
+                assert list(pool.tokenize(content, mode)) == list(tokenizer.tokenize(content, mode)), "Test TokenizerPool error on tokenize"
+            assert pool.lcut_batch(test_contents) == tokenizer.lcut_batch(test_contents), "Test TokenizerPool error on cut_batch"
+            # 字典被修改後，工作行程應以新的字典重新建立
+            tokenizer.add_word("叫鑫", 100000)
+            assert pool.lcut("他叫鑫垚淼焱") == tokenizer.lcut("他叫鑫垚淼焱"), "Test TokenizerPool error on add_word"
+        postokenizer = pseg.POSTokenizer(tokenizer)
+        with postokenizer.parallel(2) as pool:
+            assert pool.lcut(content) == postokenizer.lcut(content), "Test TokenizerPool error on posseg cut"
+            assert list(pool.tokenize(content)) == list(postokenizer.tokenize(content)), "Test TokenizerPool error on posseg tokenize"
+            tokens = tokenizer.lcut(content)
+            assert pool.tag(tokens, as_tuples=True) == postokenizer.tag(tokens, as_tuples=True), "Test TokenizerPool error on posseg tag"
+            assert pool.lcut_batch(test_contents) == postokenizer.lcut_batch(test_contents), "Test TokenizerPool error on posseg cut_batch"
+        print("testTokenizerPool", file=sys.stderr)
+
+    def testBalancedSplit(self):
+        from jieba import parallel
+        content = "".join(test_contents) * 50
+        lines = "\n".join(test_contents * 50)
+        mixed = "abc。def！中文;x1? 我爱Python。\nC++!！。。a\n" * 2000
+        for text in (content, lines, mixed, "", "中" * 100000):
+            for processnum in (1, 2, 8):
+                for cut_all in (False, True):
+                    parts = parallel._balanced_split(text, processnum, cut_all)
+                    breaks = parallel.TASK_BREAKS_CUT_ALL if cut_all else parallel.TASK_BREAKS
+                    assert "".join(parts) == text, "Test BalancedSplit error on joined parts"
+                    for part in parts[:-1]:
+                        assert part[-1] in breaks, "Test BalancedSplit error on break: %s" % part[-20:]
+                        assert len(part) <= parallel.MAX_TASK_SIZE, "Test BalancedSplit error on size"
+                    # 在切點切開不應改變分詞的結果
+                    results = [jieba.lcut(part, cut_all) for part in parts]
+                    if cut_all:
+                        words = list(parallel._join_cut_all(parts, results))
+                    else:
+                        words = [w for r in results for w in r]
+                    assert words == jieba.lcut(text, cut_all), "Test BalancedSplit error on cut_all=%r" % cut_all
+        # 只有一行的長文件也要能分給多個工作行程
+        assert len(parallel._balanced_split(content * 4, 4)) > 1, "Test BalancedSplit error on a single line"
+        assert len(parallel._balanced_split(mixed, 4, True)) > 1, "Test BalancedSplit error on cut_all"
+        print("testBalancedSplit", file=sys.stderr)
+
+    def testBatchUpdate(self):
+        from jieba.trie import DoubleArrayTrie
+        tokenizer = jieba.Tokenizer()
+        tokenizer.initialize()
+        words = ["鑫垚淼焱%d" % i for i in range(2000)]
+        copies = []
+        copy = DoubleArrayTrie.copy
+        DoubleArrayTrie.copy = lambda trie: copies.append(trie) or copy(trie)
+        try:
+            old = tokenizer.FREQ
+            with tokenizer.batch():
+                for word in words:
+                    tokenizer.add_word(word, 1000, "nz")
+                tokenizer.suggest_freq("他鑫垚淼焱0", True)
+                assert tokenizer.FREQ is old, "Test BatchUpdate error on publishing inside the batch"
+        finally:
+            DoubleArrayTrie.copy = copy
+        assert len(copies) == 1, "Test BatchUpdate error on copies: %d" % len(copies)
+        assert tokenizer.FREQ is not old, "Test BatchUpdate error on publishing"
+        assert tokenizer.lcut("他叫鑫垚淼焱1999") == ["他", "叫", "鑫垚淼焱1999"], "Test BatchUpdate error on add_word"
+        assert tokenizer.FREQ.get_tag("鑫垚淼焱1999") == "nz", "Test BatchUpdate error on tag"
+        assert tokenizer.lcut("他鑫垚淼焱0") == ["他鑫垚淼焱0"], "Test BatchUpdate error on suggest_freq"
+        # 在batch中逐一add_word的時間應與詞數成正比，而不是詞數乘上字典大小
+        def timed(n):
+            t1 = time.time()
+            with tokenizer.batch():
+                for i in range(n):
+                    tokenizer.add_word("焱淼垚鑫%d_%d" % (n, i))
+            return time.time() - t1
+        small, large = timed(500), timed(4000)
+        assert large < 8 * 4 * max(small, 0.01), "Test BatchUpdate error on linearity: %.3f %.3f" % (small, large)
+        print("testBatchUpdate", file=sys.stderr)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,38 @@
+from __future__ import print_function
+import sys
+import time
+sys.path.append("../../")
+import jieba
+
+# 比較以splitlines切成一行一個工作，及以_balanced_split切成大小相近的片段時，
+# 平行分詞隨著工作行程數目增加的速度。
+# 分別測試原本的輸入，把所有行接成一行的長文件，以及把句子拆成大量短行的文件
+url = sys.argv[1]
+content = open(url, "rb").read().decode('utf-8')
+inputs = [
+    ('original', content),
+    ('one line', content.replace('\n', '')),
+    ('short lines', content.replace('。', '。\n').replace('，', '，\n')),
+]
+jieba.initialize()
+
+
+def splitlines(sentence):
+    return sentence.splitlines(True)
+
+
+for processnum in (1, 2, 4, 8):
+    jieba.enable_parallel(processnum)
+    for name, text in inputs:
+        for split in (splitlines, jieba._split_parts):
+            parts = split(text)
+            t1 = time.time()
+            if split is splitlines:
+                # 原本的做法：由pool.map自己決定chunksize
+                result = jieba.pool.map(jieba._lcut, parts)
+            else:
+                result = jieba.pool.map(jieba._lcut, parts, 1)
+            tm_cost = time.time() - t1
+            print('processnum=%d %-11s %-12s %6d tasks, speed %.0f chars/second' % (
+                processnum, name, split.__name__, len(parts), len(text) / tm_cost))
+    jieba.disable_parallel()
@@ -0,0 +1,24 @@
+from __future__ import print_function
+import sys
+import time
+sys.path.append("../../")
+import jieba
+import jieba.posseg as pseg
+
+# 兩個使用不同字典的Tokenizer各自有自己的行程池
+url = sys.argv[1]
+content = open(url, "rb").read().decode('utf-8')
+
+tokenizers = [jieba.Tokenizer(), jieba.Tokenizer("../foobar.txt")]
+for tk in tokenizers:
+    tk.add_word("鑫垚淼焱", 1000, "nz")
+    with tk.parallel(4) as p:
+        t1 = time.time()
+        words = p.lcut(content)
+        tm_cost = time.time() - t1
+        print('%r cut speed %s chars/second' % (tk, len(content) / tm_cost))
+    with pseg.POSTokenizer(tk).parallel(4) as p:
+        t1 = time.time()
+        words = p.lcut(content, as_tuples=True)
+        tm_cost = time.time() - t1
+        print('%r posseg speed %s chars/second' % (tk, len(content) / tm_cost))
@@ -0,0 +1,38 @@
+#encoding=utf-8
+from __future__ import print_function
+import sys
+import time
+sys.path.append("../")
+import jieba
+jieba.setLogLevel(60)
+
+url = sys.argv[1] if len(sys.argv) > 1 else "test.txt"
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+content = open(url, "rb").read()
+try:
+    content = content.decode('utf-8')
+except UnicodeDecodeError:
+    content = content.decode('gbk')
+content = content * repeat
+blocks = [blk for blk in jieba.re_han_default.split(content) if jieba.re_han_default.match(blk)]
+
+scanner = jieba.Tokenizer()
+automaton = jieba.Tokenizer(automaton=True)
+scanner.initialize()
+automaton.initialize()
+
+t1 = time.time()
+automaton._get_automaton()
+print('automaton build cost %.3f' % (time.time() - t1))
+
+for name, tokenizer in (('scanner', scanner), ('automaton', automaton)):
+    t1 = time.time()
+    for blk in blocks:
+        tokenizer.get_DAG(blk)
+    tm_cost = time.time() - t1
+    print('%s get_DAG cost %.3f, speed %s chars/second' % (name, tm_cost, len(content) / tm_cost))
+    t1 = time.time()
+    words = tokenizer.lcut(content)
+    print('%s cut cost %.3f' % (name, time.time() - t1))
+
+assert scanner.lcut(content) == automaton.lcut(content)
@@ -1,3 +1,4 @@
+import os
 import time
 import sys
 sys.path.append("../")
@@ -5,17 +6,15 @@ import jieba
 jieba.initialize()
 
 url = sys.argv[1]
-content = open(url,"rb").read()
+size = os.path.getsize(url)
 t1 = time.time()
-words = "/ ".join(jieba.cut(content))
+log_f = open("1.log","wb")
+for word in jieba.cut_file(url):
+    log_f.write((word + "/ ").encode('utf-8'))
+log_f.close()
 
 t2 = time.time()
 tm_cost = t2-t1
 
-log_f = open("1.log","wb")
-log_f.write(words.encode('utf-8'))
-log_f.close()
-
 print('cost ' + str(tm_cost))
-print('speed %s bytes/second' % (len(content)/tm_cost))
-
+print('speed %s bytes/second' % (size/tm_cost))
@@ -0,0 +1,81 @@
+#encoding=utf-8
+from __future__ import print_function
+import sys
+import time
+sys.path.append("../")
+from jieba import finalseg
+
+# 比較原本以巢狀字典表示的模型(viterbi)及緊湊的模型(_viterbi)的速度，
+# 在Python3上另外以tracemalloc比較兩者所佔的記憶體
+url = sys.argv[1] if len(sys.argv) > 1 else "test.txt"
+content = open(url, "rb").read()
+try:
+    content = content.decode('utf-8')
+except UnicodeDecodeError:
+    content = content.decode('gbk')
+blocks = [blk for blk in finalseg.re_han.split(content) if finalseg.re_han.match(blk)]
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from jieba.finalseg.prob_start import P as start_p
+from jieba.finalseg.prob_trans import P as trans_p
+if tracemalloc:
+    tracemalloc.start()
+t1 = time.time()
+from jieba.finalseg.prob_emit import P as emit_p
+print('import prob_emit cost %.3f' % (time.time() - t1))
+if tracemalloc:
+    dict_size = tracemalloc.get_traced_memory()[0]
+t1 = time.time()
+model = finalseg._compile_model(start_p, trans_p, emit_p)
+print('compile model cost %.3f' % (time.time() - t1))
+if tracemalloc:
+    del emit_p
+    del sys.modules['jieba.finalseg.prob_emit']
+    del finalseg.prob_emit
+    compact_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('emit_P dicts %.1f KB, compact model %.1f KB' % (dict_size / 1024.0, compact_size / 1024.0))
+    emit_p = finalseg._emit_dict(model)
+
+for name, decode in (
+        ('dict', lambda blk: finalseg.viterbi(blk, 'BMES', start_p, trans_p, emit_p)),
+        ('compact', lambda blk: finalseg._viterbi(blk, model))):
+    t1 = time.time()
+    for blk in blocks:
+        decode(blk)
+    tm_cost = time.time() - t1
+    print('%s viterbi cost %.3f, speed %s chars/second' % (name, tm_cost, len(content) / tm_cost))
+
+# 把所有漢字接成一個很長的未登錄詞緩衝區，原本的viterbi每一步都要複製路徑，成本是長度的平方
+long_blk = "".join(blocks)
+for name, decode in (
+        ('dict', lambda blk: finalseg.viterbi(blk, 'BMES', start_p, trans_p, emit_p)),
+        ('compact', lambda blk: finalseg._viterbi(blk, model))):
+    t1 = time.time()
+    decode(long_blk)
+    print('%s viterbi on a %d-character buffer cost %.3f' % (name, len(long_blk), time.time() - t1))
+
+# 批次解碼：所有區塊一起交給_viterbi_batch，有NumPy時會以向量化的方式同時解碼
+np = finalseg.np
+for name in ('numpy', 'python'):
+    if name == 'numpy' and np is None:
+        continue
+    finalseg.np = np if name == 'numpy' else None
+    t1 = time.time()
+    finalseg._viterbi_batch(blocks, model)
+    tm_cost = time.time() - t1
+    print('%s batch viterbi cost %.3f, speed %s chars/second' % (name, tm_cost, len(content) / tm_cost))
+finalseg.np = np
+
+# 未登錄詞快取：第二次切分同樣的區塊時直接由memo取得結果
+finalseg.clear_memo()
+for name in ('cold', 'warm'):
+    t1 = time.time()
+    for blk in blocks:
+        list(finalseg.cut(blk))
+    print('%s memo cut cost %.3f' % (name, time.time() - t1))
+print(finalseg.memo_info())
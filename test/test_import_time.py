@@ -0,0 +1,36 @@
+#encoding=utf-8
+from __future__ import print_function
+import os
+import sys
+import subprocess
+
+# 比較匯入jieba的時間：finalseg的HMM模型延遲到第一次呼叫finalseg.cut時才載入，
+# eager則是在匯入後立刻載入模型，相當於原本的行為
+# posseg開頭的則是匯入jieba.posseg並載入詞性標注模型的時間
+repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+template = """
+import sys, time
+sys.path.insert(0, %r)
+t1 = time.time()
+import jieba
+%s
+print(time.time() - t1)
+"""
+
+cases = (
+    ("lazy", ""),
+    ("eager", "jieba.finalseg._get_model()"),
+    # posseg的模型：由編譯好的模型檔以mmap載入，或是像原本一樣匯入字典常量再編譯
+    ("posseg", "import jieba.posseg"),
+    ("posseg model", "import jieba.posseg; jieba.posseg._get_model()"),
+    ("posseg dicts", "import jieba.posseg; jieba.posseg._compile_model(*jieba.posseg._load_dicts())"),
+)
+
+for name, code in cases:
+    costs = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, "-c", template % (root, code)])
+        costs.append(float(out.decode().strip()))
+    print("%s import cost: best %.3f, mean %.3f seconds" % (name, min(costs), sum(costs) / len(costs)))
@@ -0,0 +1,66 @@
+#encoding=utf-8
+from __future__ import print_function
+import sys
+import time
+sys.path.append("../")
+import jieba
+import jieba.posseg as pseg
+from jieba.posseg.viterbi import viterbi
+
+# 比較beam search與精確的維特比算法的速度及準確度
+# 準確度是beam search的結果中，與精確解碼相同的(起點，終點，詞性)所佔的比例
+files = sys.argv[1:] or ["test.txt", "lyric.txt", "foobar.txt"]
+content = ""
+for url in files:
+    data = open(url, "rb").read()
+    try:
+        content += data.decode('utf-8')
+    except UnicodeDecodeError:
+        content += data.decode('gbk')
+blocks = [blk for blk in pseg.re_han_detail.split(content) if pseg.re_han_detail.match(blk)]
+jieba.initialize()
+
+
+def spans(pairs):
+    result = set()
+    start = 0
+    for word, flag in pairs:
+        result.add((start, start + len(word), flag))
+        start += len(word)
+    return result
+
+
+def accuracy(expected, result):
+    correct = total = 0
+    for e, r in zip(expected, result):
+        e = spans(e)
+        correct += len(e & spans(r))
+        total += len(e)
+    return float(correct) / total
+
+
+# 直接對每個漢字區塊解碼，這是beam寬度影響最大的部份
+expected = None
+for beam in (None, 64, 32, 16, 8, 4, 2, 1):
+    t1 = time.time()
+    routes = [viterbi(blk, pseg.char_state_tab_P, pseg.start_P, pseg.trans_P, pseg.emit_P, beam)[1]
+              for blk in blocks]
+    tm_cost = time.time() - t1
+    if expected is None:
+        expected = routes
+    agree = sum(r == e for r, e in zip(routes, expected)) / float(len(blocks))
+    print('viterbi beam=%s cost %.3f, speed %.0f chars/second, identical blocks %.2f%%' % (
+        beam, tm_cost, len(content) / tm_cost, agree * 100))
+
+# 完整的詞性標注，只有未登錄詞才會使用維特比算法
+lines = content.splitlines()
+expected = None
+for beam in (None, 16, 4, 1):
+    tokenizer = pseg.POSTokenizer(jieba.dt, beam=beam)
+    t1 = time.time()
+    result = [[tuple(p) for p in tokenizer.cut(line)] for line in lines]
+    tm_cost = time.time() - t1
+    if expected is None:
+        expected = result
+    print('posseg beam=%s cost %.3f, speed %.0f chars/second, accuracy %.2f%%' % (
+        beam, tm_cost, len(content) / tm_cost, accuracy(expected, result) * 100))
@@ -0,0 +1,44 @@
+#encoding=utf-8
+from __future__ import print_function
+import sys
+import time
+sys.path.append("../")
+import jieba
+import jieba.posseg as pseg
+
+# 比較為己經分好的詞標注詞性時，把詞接回句子再以posseg.cut重新分詞，
+# 及直接以posseg.tag標注的速度
+files = sys.argv[1:] or ["test.txt", "lyric.txt", "foobar.txt"]
+content = ""
+for url in files:
+    data = open(url, "rb").read()
+    try:
+        content += data.decode('utf-8')
+    except UnicodeDecodeError:
+        content += data.decode('gbk')
+lines = content.splitlines()
+jieba.initialize()
+tokens = [jieba.lcut(line) for line in lines]
+# 先各跑一次，讓兩種方式都使用己暖好的未登錄詞快取
+for words in tokens:
+    pseg.lcut("".join(words), as_tuples=True)
+    pseg.tag(words, as_tuples=True)
+
+t1 = time.time()
+for words in tokens:
+    pseg.lcut("".join(words), as_tuples=True)
+tm_cost = time.time() - t1
+print('posseg.cut cost %.3f, speed %.0f chars/second' % (tm_cost, len(content) / tm_cost))
+
+t1 = time.time()
+for words in tokens:
+    pseg.tag(words, as_tuples=True)
+tm_cost = time.time() - t1
+print('posseg.tag cost %.3f, speed %.0f chars/second' % (tm_cost, len(content) / tm_cost))
+
+# 整批標注：所有文檔的詞一起交給tag，重複的未登錄詞只標注一次
+pseg.clear_hmm_memo()
+t1 = time.time()
+pseg.tag([w for words in tokens for w in words], as_tuples=True)
+tm_cost = time.time() - t1
+print('posseg.tag on all tokens at once cost %.3f, speed %.0f chars/second' % (tm_cost, len(content) / tm_cost))
@@ -0,0 +1,38 @@
+#encoding=utf-8
+from __future__ import print_function
+import sys
+import time
+sys.path.append("../")
+import jieba
+import jieba.posseg as pseg
+
+# 比較建立索引時以jieba.tokenize取得位置再以posseg.cut取得詞性(切兩次)，
+# 及以posseg.tokenize一次取得(詞彙，詞性，起點，終點)的速度
+files = sys.argv[1:] or ["test.txt", "lyric.txt", "foobar.txt"]
+content = ""
+for url in files:
+    data = open(url, "rb").read()
+    try:
+        content += data.decode('utf-8')
+    except UnicodeDecodeError:
+        content += data.decode('gbk')
+lines = content.splitlines()
+jieba.initialize()
+# 先各跑一次，讓兩種方式都使用己暖好的未登錄詞快取
+for line in lines:
+    list(jieba.tokenize(line))
+    list(pseg.tokenize(line))
+
+for mode in ("default", "search"):
+    t1 = time.time()
+    for line in lines:
+        list(jieba.tokenize(line, mode=mode))
+        list(pseg.cut(line, as_tuples=True))
+    tm_cost = time.time() - t1
+    print('%s mode, tokenize + posseg.cut cost %.3f, speed %.0f chars/second' % (mode, tm_cost, len(content) / tm_cost))
+
+    t1 = time.time()
+    for line in lines:
+        list(pseg.tokenize(line, mode=mode))
+    tm_cost = time.time() - t1
+    print('%s mode, posseg.tokenize cost %.3f, speed %.0f chars/second' % (mode, tm_cost, len(content) / tm_cost))
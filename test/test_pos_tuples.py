@@ -0,0 +1,49 @@
+#encoding=utf-8
+from __future__ import print_function
+import sys
+import time
+sys.path.append("../")
+import jieba
+import jieba.posseg as pseg
+
+# 比較詞性標注輸出pair物件及(詞彙，詞性)tuple時的速度，
+# 在Python3上另外以tracemalloc比較保留整個標注結果所需的記憶體
+files = sys.argv[1:] or ["test.txt", "lyric.txt", "foobar.txt"]
+content = ""
+for url in files:
+    data = open(url, "rb").read()
+    try:
+        content += data.decode('utf-8')
+    except UnicodeDecodeError:
+        content += data.decode('gbk')
+lines = content.splitlines()
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+jieba.initialize()
+tokenizer = pseg.POSTokenizer(jieba.dt)
+# 先標注一次，讓未登錄詞的快取在兩種輸出下都處於相同的狀態
+for line in lines:
+    tokenizer.lcut(line)
+
+# 交替量測兩次，減少未登錄詞快取及垃圾回收對先後次序的影響
+for as_tuples in (False, True) * 2:
+    t1 = time.time()
+    for line in lines:
+        for word, flag in tokenizer.cut(line, as_tuples=as_tuples):
+            pass
+    tm_cost = time.time() - t1
+    print('as_tuples=%s cost %.3f, speed %.0f chars/second' % (as_tuples, tm_cost, len(content) / tm_cost))
+
+if tracemalloc:
+    for as_tuples in (False, True):
+        tracemalloc.start()
+        result = [tokenizer.lcut(line, as_tuples=as_tuples) for line in lines]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print('as_tuples=%s %d tokens hold %.1f KB' % (
+            as_tuples, sum(len(r) for r in result), size / 1024.0))
+        del result
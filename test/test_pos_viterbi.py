@@ -0,0 +1,46 @@
+#encoding=utf-8
+from __future__ import print_function
+import sys
+import time
+sys.path.append("../")
+import jieba
+import jieba.posseg as pseg
+import jieba.analyse
+
+# 比較以字典運算的viterbi及在POSModel上運算的_viterbi(純Python及NumPy)的速度，
+# 最後以textrank量測詞性標注變快後對關鍵詞提取的影響
+files = sys.argv[1:] or ["test.txt", "lyric.txt", "foobar.txt"]
+content = ""
+for url in files:
+    data = open(url, "rb").read()
+    try:
+        content += data.decode('utf-8')
+    except UnicodeDecodeError:
+        content += data.decode('gbk')
+blocks = [blk for blk in pseg.re_han_detail.split(content) if pseg.re_han_detail.match(blk)]
+viterbi_module = sys.modules["jieba.posseg.viterbi"]
+
+t1 = time.time()
+model = pseg._get_model()
+print('compile model cost %.3f' % (time.time() - t1))
+
+args = (pseg.char_state_tab_P, pseg.start_P, pseg.trans_P, pseg.emit_P)
+np = viterbi_module.np
+for name, decode in (
+        ('dict', lambda blk: viterbi_module.viterbi(blk, *args)),
+        ('python', lambda blk: viterbi_module._viterbi(blk, model)),
+        ('numpy', lambda blk: viterbi_module._viterbi(blk, model))):
+    if name == 'numpy' and np is None:
+        continue
+    viterbi_module.np = np if name == 'numpy' else None
+    t1 = time.time()
+    for blk in blocks:
+        decode(blk)
+    tm_cost = time.time() - t1
+    print('%s viterbi cost %.3f, speed %.0f chars/second' % (name, tm_cost, len(content) / tm_cost))
+viterbi_module.np = np
+
+jieba.initialize()
+t1 = time.time()
+jieba.analyse.textrank(content, topK=20)
+print('textrank cost %.3f' % (time.time() - t1))